@@ -1,14 +1,30 @@
-from flask import Flask, render_template, Response, jsonify, request
+from flask import Flask, render_template, Response, jsonify, request, abort, g
 import cv2
-import numpy as np
-from ultralytics import YOLO
 import threading
 import time
-import json
-from collections import deque
 import logging
-import random
 import os
+import copy
+
+from frame_pipeline import FrameProducer
+from processor import DirectionalCameraProcessor
+from roi import CameraROI
+from config import load_config
+from push import EventHub
+from state_store import StateStore
+from junctions import Junction, JunctionEngine, load_junction_specs
+from workers import ProcessFrameProducer
+from encoder import VariantEncoder, mjpeg_stream, parse_stream_options
+from buffers import FramePool, CompositeCanvas, read_into
+from history import HistoryStore
+from inference import configure_inference_engine, start_inference_engine, inference_status
+from incidents import IncidentStore, IncidentDetector, DEFAULT_INCIDENTS
+from corridor import CorridorCoordinator
+from signal_control import DEFAULT_GREEN_TIME, make_controller
+from capture import CameraCapture, DecoderPool, normalize_source, ACTIVE, CONNECTING, RECONNECTING
+from simulator import TrafficSimulator, stream_seed
+from metrics import (REGISTRY, CONTENT_TYPE, STAGE_SECONDS, HTTP_REQUEST_SECONDS, CAMERA_READ_FAILURES,
+                     SIMULATED_FALLBACKS, STREAM_CLIENTS, DECODER_LAG)
 
 # Get the current directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -22,8 +38,17 @@ app = Flask(__name__,
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Global variables for traffic data
-traffic_data = {
+# Process start, for /healthz and /readyz uptimes
+STARTED_AT = time.time()
+
+# Seconds of history the traffic reduction baseline averages over
+BASELINE_WINDOW = 3600
+
+# Newest incidents mirrored into the dashboard state
+DASHBOARD_INCIDENTS = 50
+
+# Initial traffic data for each junction, published as immutable snapshots
+DEFAULT_TRAFFIC_DATA = {
     'ns_queue_length': 0,
     'sn_queue_length': 0,
     'ns_avg_speed': 1.0,
@@ -33,12 +58,89 @@ traffic_data = {
     'current_signal': 'NS',
     'signal_timer': 0,
     'traffic_reduction': 0.0,
+    'ns_emergency': False,
+    'sn_emergency': False,
     'camera_status': 'simulated'
 }
 
+# Built-in junctions, used when the config doesn't define any
+DEFAULT_JUNCTIONS = {
+    'anna-salai-mount': {
+        'name': 'Anna Salai - Mount Road',
+        'density': 65,
+        'queueLength': 8,
+        'waitTime': 45,
+        'status': 'medium',
+        'phase': 'NS Green',
+        'timeLeft': 25,
+        'emergencyVehicle': False,
+        'accident': False,
+        'coordinates': [13.0827, 80.2707],
+        'signalState': {
+            'NS': { 'red': False, 'yellow': False, 'green': True },
+            'EW': { 'red': True, 'yellow': False, 'green': False }
+        }
+    },
+    'omr-sholinganallur': {
+        'name': 'OMR - Sholinganallur',
+        'density': 82,
+        'queueLength': 12,
+        'waitTime': 75,
+        'status': 'high',
+        'phase': 'EW Green',
+        'timeLeft': 18,
+        'emergencyVehicle': True,
+        'accident': False,
+        'coordinates': [12.8992, 80.2289],
+        'signalState': {
+            'NS': { 'red': True, 'yellow': False, 'green': False },
+            'EW': { 'red': False, 'yellow': False, 'green': True }
+        }
+    },
+    'ecr-mahabalipuram': {
+        'name': 'ECR - Mahabalipuram Rd',
+        'density': 35,
+        'queueLength': 3,
+        'waitTime': 20,
+        'status': 'low',
+        'phase': 'NS Red',
+        'timeLeft': 10,
+        'emergencyVehicle': False,
+        'accident': True,
+        'coordinates': [12.6208, 80.1944],
+        'signalState': {
+            'NS': { 'red': True, 'yellow': False, 'green': False },
+            'EW': { 'red': False, 'yellow': False, 'green': True }
+        }
+    }
+}
+
+config = load_config()
+junction_specs = load_junction_specs(config, DEFAULT_JUNCTIONS)
+
+def dashboard_junction(spec):
+    """Dashboard entry for a junction, seeded from the built-in values when it has any"""
+    junction = copy.deepcopy(DEFAULT_JUNCTIONS.get(spec['id'], {
+        'density': 0,
+        'queueLength': 0,
+        'waitTime': 0,
+        'status': 'low',
+        'phase': 'NS Green',
+        'timeLeft': DEFAULT_GREEN_TIME,
+        'emergencyVehicle': False,
+        'accident': False,
+        'signalState': {
+            'NS': { 'red': False, 'yellow': False, 'green': True },
+            'EW': { 'red': True, 'yellow': False, 'green': False }
+        }
+    }))
+    junction['name'] = spec['name']
+    junction['coordinates'] = spec['coordinates']
+    return junction
+
 # Dashboard state
-dashboard_state = {
-    'selectedJunction': 'anna-salai-mount',
+dashboard_store = StateStore({
+    'selectedJunction': junction_specs[0]['id'],
     'emergencyMode': False,
     'manualOverride': False,
     'aiRecommendation': {
@@ -47,504 +149,451 @@ dashboard_state = {
         'reason': 'High density detected, queue length increasing',
         'accepted': None
     },
-    'junctions': {
-        'anna-salai-mount': {
-            'name': 'Anna Salai - Mount Road',
-            'density': 65,
-            'queueLength': 8,
-            'waitTime': 45,
-            'status': 'medium',
-            'phase': 'NS Green',
-            'timeLeft': 25,
-            'emergencyVehicle': False,
-            'accident': False,
-            'coordinates': [13.0827, 80.2707],
-            'signalState': {
-                'NS': { 'red': False, 'yellow': False, 'green': True },
-                'EW': { 'red': True, 'yellow': False, 'green': False }
-            }
-        },
-        'omr-sholinganallur': {
-            'name': 'OMR - Sholinganallur',
-            'density': 82,
-            'queueLength': 12,
-            'waitTime': 75,
-            'status': 'high',
-            'phase': 'EW Green',
-            'timeLeft': 18,
-            'emergencyVehicle': True,
-            'accident': False,
-            'coordinates': [12.8992, 80.2289],
-            'signalState': {
-                'NS': { 'red': True, 'yellow': False, 'green': False },
-                'EW': { 'red': False, 'yellow': False, 'green': True }
-            }
-        },
-        'ecr-mahabalipuram': {
-            'name': 'ECR - Mahabalipuram Rd',
-            'density': 35,
-            'queueLength': 3,
-            'waitTime': 20,
-            'status': 'low',
-            'phase': 'NS Red',
-            'timeLeft': 10,
-            'emergencyVehicle': False,
-            'accident': True,
-            'coordinates': [12.6208, 80.1944],
-            'signalState': {
-                'NS': { 'red': True, 'yellow': False, 'green': False },
-                'EW': { 'red': False, 'yellow': False, 'green': True }
-            }
-        }
-    },
-    'incidents': [
-        {
-            'id': 1,
-            'type': 'emergency',
-            'location': 'OMR Junction',
-            'message': 'Ambulance approaching from south',
-            'time': '14:23',
-            'priority': 'high',
-            'details': 'Emergency vehicle detected via OpenCV. Estimated arrival: 2 minutes.',
-            'actions': ['Clear traffic signal', 'Alert nearby junctions', 'Contact emergency services'],
-            'resolved': False,
-            'vehicleType': 'Ambulance',
-            'direction': 'South to North',
-            'estimatedArrival': '2 min',
-            'junctionId': 'omr-sholinganallur'
-        }
-    ],
+    'junctions': {spec['id']: dashboard_junction(spec) for spec in junction_specs},
+    # Mirrors the newest incidents in incident_store, refreshed whenever one opens, clears or is resolved
+    'incidents': [],
     'resolvedIncidents': {}
-}
-
-# Traffic signal constants
-MIN_GREEN_TIME = 10
-MAX_GREEN_TIME = 45
-DEFAULT_GREEN_TIME = 20
-VEHICLE_THRESHOLD = 3
-
-class VehicleTracker:
-    def __init__(self):
-        self.tracks = {}
-        self.next_id = 0
-        self.max_disappeared = 5
-    
-    def update(self, detections):
-        if len(detections) == 0:
-            for track_id in list(self.tracks.keys()):
-                self.tracks[track_id]['disappeared'] += 1
-                if self.tracks[track_id]['disappeared'] > self.max_disappeared:
-                    del self.tracks[track_id]
-            return []
-        
-        current_centroids = []
-        for detection in detections:
-            x1, y1, x2, y2 = detection
-            cx = (x1 + x2) // 2
-            cy = (y1 + y2) // 2
-            current_centroids.append((cx, cy))
-        
-        if len(self.tracks) == 0:
-            for centroid in current_centroids:
-                self.tracks[self.next_id] = {
-                    'centroid': centroid, 
-                    'disappeared': 0, 
-                    'positions': deque(maxlen=10), 
-                    'speed': 0.0
-                }
-                self.tracks[self.next_id]['positions'].append(centroid)
-                self.next_id += 1
-        else:
-            track_ids = list(self.tracks.keys())
-            for i, centroid in enumerate(current_centroids):
-                if i < len(track_ids):
-                    track_id = track_ids[i]
-                    self.tracks[track_id]['centroid'] = centroid
-                    self.tracks[track_id]['positions'].append(centroid)
-                    self.tracks[track_id]['disappeared'] = 0
-                    if len(self.tracks[track_id]['positions']) >= 2:
-                        pos1 = self.tracks[track_id]['positions'][-2]
-                        pos2 = self.tracks[track_id]['positions'][-1]
-                        distance = np.sqrt((pos2[0]-pos1[0])**2 + (pos2[1]-pos1[1])**2)
-                        self.tracks[track_id]['speed'] = distance * 30 / 100.0
-        
-        return list(self.tracks.values())
-
-class DirectionalCameraProcessor:
-    def __init__(self, camera_id, direction_name):
-        self.camera_id = camera_id
-        self.direction_name = direction_name
-        try:
-            self.model = YOLO("yolov8n.pt")
-            self.model_loaded = True
-        except Exception as e:
-            logger.error(f"Failed to load YOLO model: {e}")
-            self.model_loaded = False
-        self.vehicle_classes = [2, 3, 5, 7]
-        self.tracker = VehicleTracker()
-        self.last_data = {'queue_length': 0, 'avg_speed': 1.0, 'vehicle_count': 0}
-
-    def process_frame(self, frame):
-        if frame is None:
-            return self.last_data, frame
-        
-        try:
-            detections = []
-            
-            if self.model_loaded:
-                results = self.model(frame, stream=True, verbose=False)
-                
-                for r in results:
-                    if hasattr(r, 'boxes') and r.boxes is not None:
-                        for box in r.boxes:
-                            cls = int(box.cls[0]) if hasattr(box, 'cls') else None
-                            conf = float(box.conf[0]) if hasattr(box, 'conf') else 0
-                            coords = box.xyxy[0] if hasattr(box, 'xyxy') else None
-                            
-                            if cls in self.vehicle_classes and coords is not None and conf > 0.3:
-                                x1, y1, x2, y2 = map(int, coords)
-                                detections.append((x1, y1, x2, y2))
-                                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                cv2.putText(frame, f'Vehicle {conf:.2f}', (x1, y1-10), 
-                                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            else:
-                # Simulate detections if model not loaded
-                height, width = frame.shape[:2]
-                for i in range(random.randint(0, 5)):
-                    x1 = random.randint(0, width-100)
-                    y1 = random.randint(0, height-100)
-                    x2 = x1 + random.randint(50, 150)
-                    y2 = y1 + random.randint(30, 80)
-                    detections.append((x1, y1, x2, y2))
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(frame, 'Vehicle Sim', (x1, y1-10), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            
-            tracked = self.tracker.update(detections)
-            avg_speed = np.mean([v['speed'] for v in tracked if v['speed'] > 0]) if tracked else 1.0
-            
-            self.last_data = {
-                'queue_length': len(detections), 
-                'avg_speed': max(0.1, avg_speed), 
-                'vehicle_count': len(tracked)
-            }
-            
-            # Add info text to frame
-            status_text = "SIMULATED" if not self.model_loaded else "YOLO ACTIVE"
-            cv2.putText(frame, f'{self.direction_name}: {len(detections)} vehicles ({status_text})', 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(frame, f'Avg speed: {avg_speed:.1f}', 
-                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            
-            return self.last_data, frame
-            
-        except Exception as e:
-            logger.error(f"Error processing frame: {e}")
-            return self.last_data, frame
+})
 
 class SmartTrafficSystem:
-    def __init__(self):
-        self.ns_processor = DirectionalCameraProcessor(0, "N→S")
-        self.sn_processor = DirectionalCameraProcessor(1, "S→N")
+    def __init__(self, junction_id=None, cameras=None, worker_mode='thread', simulation=None, seed=None,
+                 decoder_pool=None, history=None, controller=None, incidents=None):
+        self.junction_id = junction_id
+        self.decoder_pool = decoder_pool
+        self.history = history
+        self.incidents = incidents
+        self.cameras = cameras or {'NS': {'source': 0}, 'SN': {'source': 1}}
+        self.worker_mode = worker_mode
+        self.state = StateStore(DEFAULT_TRAFFIC_DATA)
+        # In process mode detection runs in the camera workers, so this process has no processors
+        self.ns_processor = None
+        self.sn_processor = None
+        
+        # Stands in for missing or failed cameras; seeded per junction so runs are reproducible
+        self.simulator = TrafficSimulator(simulation, seed=seed, stream=junction_id)
         self.cap_ns = None
         self.cap_sn = None
-        self.baseline_total_queue = 1
+        # Phase decisions are pluggable: 'heuristic' (default) or 'predictive'
+        self.controller = make_controller(controller, junction=junction_id)
         self.ns_green = True
         self.sn_green = False
-        self.signal_timer = time.time()
-        self.current_green_time = DEFAULT_GREEN_TIME
+        self.signal_timer = self.controller.phase_started
+        self.current_green_time = self.controller.green_time
         self.running = True
         self.use_simulated_camera = False
         
-        self.initialize_cameras()
+        # Preallocated frames reused round-robin instead of allocating per frame
+        self.capture_pools = {'NS': FramePool((480, 640, 3)), 'SN': FramePool((480, 640, 3))}
+        self.canvas = CompositeCanvas((400, 300))
+        
+        # One capture + inference producer per camera, plus one compositor that
+        # encodes the combined stream once for all /video_feed viewers
+        self.stream_producer = FrameProducer('stream', self.compose_latest_frame, fps=15, idle_fps=0,
+                                             junction=junction_id)
+        self.encoder = VariantEncoder(junction=junction_id)
+        if worker_mode == 'process' and self.cameras.get('NS', {}).get('source') is not None:
+            # Capture and process_frame run in worker processes, frames come back via shared memory
+            self.ns_producer = self.process_producer('NS')
+            self.sn_producer = self.process_producer('SN')
+        else:
+            self.ns_processor = self.camera_processor(0, "N→S", 'NS', seed)
+            self.sn_processor = self.camera_processor(1, "S→N", 'SN', seed)
+            self.initialize_cameras()
+            self.ns_producer = FrameProducer(
+                'NS', lambda: self.get_camera_frame(self.cap_ns, self.ns_processor, "NS", annotate=self.has_viewers()),
+                fps=15, idle_fps=2, demand=self.has_viewers, junction=junction_id)
+            self.sn_producer = FrameProducer(
+                'SN', lambda: self.get_camera_frame(self.cap_sn, self.sn_processor, "SN", annotate=self.has_viewers()),
+                fps=15, idle_fps=2, demand=self.has_viewers, junction=junction_id)
+    
+    def camera_processor(self, camera_id, name, direction, seed):
+        camera = self.cameras.get(direction, {})
+        return DirectionalCameraProcessor(
+            camera_id, name, roi=CameraROI.from_config(camera), seed=stream_seed(seed, self.junction_id, direction),
+            junction=self.junction_id, camera=direction, emergency_classes=camera.get('emergency_classes'))
+    
+    def process_producer(self, direction):
+        camera = self.cameras.get(direction, {})
+        if camera.get('source') is None:
+            # Same fallback as initialize_cameras: reuse the NS source for a missing SN camera
+            camera = dict(camera, source=self.cameras['NS']['source'])
+        return ProcessFrameProducer(direction, camera['source'], camera, fps=15, demand=self.has_viewers,
+                                    inference=config.get('inference'))
+    
+    def inference_stats(self, direction):
+        """Scheduler stats of a camera, from its processor here or its worker process"""
+        processor = self.ns_processor if direction == 'NS' else self.sn_processor
+        if processor is not None:
+            return processor.scheduler.stats()
+        producer = self.ns_producer if direction == 'NS' else self.sn_producer
+        return getattr(producer, 'inference_stats', None)
+    
+    def start(self):
+        """Start the capture threads and the shared frame producers"""
+        self.running = True
+        for capture in self.captures():
+            capture.start()
+        self.ns_producer.start()
+        self.sn_producer.start()
+        self.stream_producer.start()
+    
+    def stop(self):
+        self.running = False
+        for producer in (self.stream_producer, self.ns_producer, self.sn_producer):
+            producer.stop()
+        for capture in self.captures():
+            capture.stop()
+    
+    @property
+    def needs_model(self):
+        """Whether this process runs detection for the junction: real cameras processed in threads"""
+        return not self.use_simulated_camera and not isinstance(self.ns_producer, ProcessFrameProducer)
+    
+    def has_viewers(self):
+        return any(self.stream_buffer(camera).readers > 0 for camera in ('combined', 'NS', 'SN'))
+    
+    def stream_buffer(self, camera='combined'):
+        """Ring buffer a /video_feed client reads from: the composite or a single camera"""
+        if camera == 'NS':
+            return self.ns_producer.buffer
+        if camera == 'SN':
+            return self.sn_producer.buffer
+        return self.stream_producer.buffer
     
     def initialize_cameras(self):
-        """Initialize cameras with better error handling"""
-        try:
-            # Try different backends
-            backends = [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
-            
-            for backend in backends:
-                try:
-                    self.cap_ns = cv2.VideoCapture(0, backend)
-                    if self.cap_ns.isOpened():
-                        logger.info(f"NS Camera opened with backend: {backend}")
-                        break
-                except Exception as e:
-                    logger.warning(f"Backend {backend} failed: {e}")
-                    continue
-            
-            if self.cap_ns is None or not self.cap_ns.isOpened():
-                logger.warning("Could not open NS camera, using simulated data")
-                self.use_simulated_camera = True
-                traffic_data['camera_status'] = 'simulated'
-                return
-            
-            # Try to set camera properties
-            self.cap_ns.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap_ns.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            self.cap_ns.set(cv2.CAP_PROP_FPS, 15)  # Lower FPS for stability
-            
-            # Try second camera
-            try:
-                self.cap_sn = cv2.VideoCapture(1, cv2.CAP_DSHOW)
-                if self.cap_sn.isOpened():
-                    self.cap_sn.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                    self.cap_sn.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                    self.cap_sn.set(cv2.CAP_PROP_FPS, 15)
-                    logger.info("SN Camera opened successfully")
-                else:
-                    logger.warning("Could not open SN camera, using NS camera for both")
-                    self.cap_sn = self.cap_ns
-            except:
-                logger.warning("Could not open SN camera, using NS camera for both")
-                self.cap_sn = self.cap_ns
-                
-            traffic_data['camera_status'] = 'active'
-            
-        except Exception as e:
-            logger.error(f"Error initializing cameras: {e}")
+        """Create the capture threads; they keep reconnecting on their own, so nothing is final here"""
+        ns_source = self.cameras.get('NS', {}).get('source')
+        sn_source = self.cameras.get('SN', {}).get('source')
+        if ns_source is None:
+            logger.info(f"No cameras configured for {self.junction_id}, using simulated data")
             self.use_simulated_camera = True
-            traffic_data['camera_status'] = 'simulated'
-    
-    def get_simulated_frame(self):
-        """Generate a simulated traffic frame"""
-        width, height = 800, 300
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
+            self.state.update({'camera_status': 'simulated'})
+            return
         
-        # Create road background
-        cv2.rectangle(frame, (0, height//3), (width, 2*height//3), (50, 50, 50), -1)
+        if sn_source is None:
+            logger.warning(f"No SN camera configured for {self.junction_id}, the NS camera serves both directions")
+            sn_source = ns_source
         
-        # Add road markings
-        for i in range(0, width, 40):
-            cv2.rectangle(frame, (i, height//2-5), (i+20, height//2+5), (255, 255, 255), -1)
-        
-        # Add simulated vehicles
-        vehicle_count = random.randint(2, 8)
-        for i in range(vehicle_count):
-            x = random.randint(50, width-100)
-            y = random.randint(height//3+20, 2*height//3-50)
-            w, h = random.randint(40, 80), random.randint(20, 40)
-            color = (random.randint(100, 255), random.randint(100, 255), random.randint(100, 255))
-            
-            cv2.rectangle(frame, (x, y), (x+w, y+h), color, -1)
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
-        
-        # Add info text
-        cv2.putText(frame, "SIMULATED TRAFFIC FEED", (width//4, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        cv2.putText(frame, f"Vehicles detected: {vehicle_count}", (width//4, 70), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(frame, "Connect camera for real feed", (width//4, height-20), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        return frame
+        self.cap_ns = self.camera_capture(ns_source, 'NS')
+        if normalize_source(sn_source) == normalize_source(ns_source):
+            # Both directions watch the same source through one capture
+            self.cap_sn = self.cap_ns
+        else:
+            self.cap_sn = self.camera_capture(sn_source, 'SN')
+        self.state.update({'camera_status': CONNECTING})
+    
+    def camera_capture(self, source, direction):
+        camera = self.cameras.get(direction, {})
+        return CameraCapture(source, junction=self.junction_id, camera=direction,
+                             fps=camera.get('fps', 15), pool=self.decoder_pool)
+    
+    def captures(self):
+        """Distinct captures of this junction"""
+        captures = []
+        for capture in (self.cap_ns, self.cap_sn):
+            if capture is not None and capture not in captures:
+                captures.append(capture)
+        return captures
+    
+    def capture_status(self):
+        """'active' when every capture delivers fresh frames, otherwise the first lagging capture's status"""
+        for capture in self.captures():
+            if not capture.isOpened():
+                return RECONNECTING if capture.status == ACTIVE else capture.status
+        return ACTIVE
     
-    def get_camera_frame(self, camera, processor, direction):
+    def get_simulated_frame(self, direction='NS'):
+        """Generate a simulated traffic frame"""
+        return self.simulated_reading(direction)[1]
+    
+    def simulated_reading(self, direction, annotate=True):
+        """Ground-truth data and frame for a direction from the junction's simulator"""
+        self.simulator.set_signal('NS' if self.ns_green else 'SN')
+        self.simulator.sync()
+        return self.simulator.observe(direction, render=annotate)
+    
+    def get_camera_frame(self, camera, processor, direction, annotate=True):
         """Get frame from camera with error handling"""
+        with STAGE_SECONDS.time(stage='get_camera_frame', junction=self.junction_id, camera=direction):
+            return self._get_camera_frame(camera, processor, direction, annotate)
+    
+    def _get_camera_frame(self, camera, processor, direction, annotate):
         try:
             if self.use_simulated_camera:
-                frame = self.get_simulated_frame()
-                # Simulate realistic data
-                simulated_data = {
-                    'queue_length': random.randint(2, 10),
-                    'avg_speed': 1.0 + random.random() * 2,
-                    'vehicle_count': random.randint(1, 8)
-                }
-                return simulated_data, frame
+                return self.simulated_reading(direction, annotate)
             
             if camera and camera.isOpened():
-                ret, frame = camera.read()
+                # Copies the capture thread's newest frame, never waits for the camera
+                with STAGE_SECONDS.time(stage='capture', junction=self.junction_id, camera=direction):
+                    ret, frame = read_into(camera, self.capture_pools[direction])
                 if ret and frame is not None:
-                    data, processed_frame = processor.process_frame(frame)
+                    data, processed_frame = processor.process_frame(frame, annotate=annotate)
                     return data, processed_frame
                 else:
                     logger.warning(f"Failed to read frame from {direction} camera")
+                    CAMERA_READ_FAILURES.inc(junction=self.junction_id, camera=direction)
+                    SIMULATED_FALLBACKS.inc(junction=self.junction_id, camera=direction, reason='read_failed')
                     # Return simulated frame if camera fails
-                    frame = self.get_simulated_frame()
-                    simulated_data = {
-                        'queue_length': random.randint(1, 5),
-                        'avg_speed': 1.0 + random.random(),
-                        'vehicle_count': random.randint(1, 5)
-                    }
-                    return simulated_data, frame
+                    return self.simulated_reading(direction, annotate)
             else:
                 # Camera not available, return simulated data
-                frame = self.get_simulated_frame()
-                simulated_data = {
-                    'queue_length': random.randint(1, 5),
-                    'avg_speed': 1.0 + random.random(),
-                    'vehicle_count': random.randint(1, 5)
-                }
-                return simulated_data, frame
+                SIMULATED_FALLBACKS.inc(junction=self.junction_id, camera=direction, reason='camera_closed')
+                return self.simulated_reading(direction, annotate)
                 
         except Exception as e:
             logger.error(f"Error getting frame from {direction} camera: {e}")
-            frame = self.get_simulated_frame()
-            simulated_data = {
-                'queue_length': random.randint(1, 5),
-                'avg_speed': 1.0 + random.random(),
-                'vehicle_count': random.randint(1, 5)
-            }
-            return simulated_data, frame
-    
-    def calculate_optimal_timing(self):
-        ns_demand = traffic_data['ns_queue_length'] / max(0.1, traffic_data['ns_avg_speed'])
-        sn_demand = traffic_data['sn_queue_length'] / max(0.1, traffic_data['sn_avg_speed'])
-        total_demand = ns_demand + sn_demand
-        
-        if total_demand > 0:
-            if self.ns_green:
-                ns_ratio = ns_demand / total_demand
-                next_green_time = MIN_GREEN_TIME + (ns_ratio * (MAX_GREEN_TIME - MIN_GREEN_TIME))
-            else:
-                sn_ratio = sn_demand / total_demand
-                next_green_time = MIN_GREEN_TIME + (sn_ratio * (MAX_GREEN_TIME - MIN_GREEN_TIME))
-            
-            return max(MIN_GREEN_TIME, min(MAX_GREEN_TIME, next_green_time))
-        
-        return DEFAULT_GREEN_TIME
+            CAMERA_READ_FAILURES.inc(junction=self.junction_id, camera=direction)
+            SIMULATED_FALLBACKS.inc(junction=self.junction_id, camera=direction, reason='error')
+            return self.simulated_reading(direction, annotate)
     
-    def update_signals(self):
+    def update_signals(self, data):
         current_time = time.time()
-        elapsed = current_time - self.signal_timer
-
-        if self.ns_green and traffic_data['sn_vehicle_count'] >= VEHICLE_THRESHOLD and traffic_data['ns_vehicle_count'] < VEHICLE_THRESHOLD:
-            self.ns_green = False
-            self.sn_green = True
-            self.current_green_time = self.calculate_optimal_timing()
-            self.signal_timer = current_time
-            traffic_data['current_signal'] = 'SN'
-        elif self.sn_green and traffic_data['ns_vehicle_count'] >= VEHICLE_THRESHOLD and traffic_data['sn_vehicle_count'] < VEHICLE_THRESHOLD:
-            self.sn_green = False
-            self.ns_green = True
-            self.current_green_time = self.calculate_optimal_timing()
-            self.signal_timer = current_time
-            traffic_data['current_signal'] = 'NS'
-        elif elapsed >= self.current_green_time:
-            self.ns_green = not self.ns_green
-            self.sn_green = not self.sn_green
-            self.current_green_time = self.calculate_optimal_timing()
-            self.signal_timer = current_time
-            traffic_data['current_signal'] = 'NS' if self.ns_green else 'SN'
-        
-        traffic_data['signal_timer'] = max(0, self.current_green_time - elapsed)
+        self.controller.decide(data, current_time)
+        self.ns_green = self.controller.phase == 'NS'
+        self.sn_green = not self.ns_green
+        self.signal_timer = self.controller.phase_started
+        self.current_green_time = self.controller.green_time
+        data['current_signal'] = self.controller.phase
+        data['signal_timer'] = self.controller.remaining(current_time)
+    
+    def latest_camera_data(self, producer, camera, processor, direction):
+        """Latest published data for a camera, capturing directly if its producer has nothing yet"""
+        packet = producer.latest()
+        if packet is not None:
+            return packet['data']
+        data, _ = self.get_camera_frame(camera, processor, direction)
+        return data
     
     def process_frames(self):
         try:
+            # Build the whole reading first and publish it as one snapshot, so
+            # readers never see NS values from one cycle and SN from another
+            data = self.state.snapshot().to_dict()
+            
             # Process NS camera
-            ns_data, _ = self.get_camera_frame(self.cap_ns, self.ns_processor, "NS")
-            traffic_data.update({
+            ns_data = self.latest_camera_data(self.ns_producer, self.cap_ns, self.ns_processor, "NS")
+            data.update({
                 'ns_queue_length': ns_data['queue_length'],
                 'ns_avg_speed': ns_data['avg_speed'],
-                'ns_vehicle_count': ns_data['vehicle_count']
+                'ns_vehicle_count': ns_data['vehicle_count'],
+                'ns_emergency': ns_data.get('emergency', False)
             })
             
             # Process SN camera  
-            sn_data, _ = self.get_camera_frame(self.cap_sn, self.sn_processor, "SN")
-            traffic_data.update({
+            sn_data = self.latest_camera_data(self.sn_producer, self.cap_sn, self.sn_processor, "SN")
+            data.update({
                 'sn_queue_length': sn_data['queue_length'],
                 'sn_avg_speed': sn_data['avg_speed'],
-                'sn_vehicle_count': sn_data['vehicle_count']
+                'sn_vehicle_count': sn_data['vehicle_count'],
+                'sn_emergency': sn_data.get('emergency', False)
             })
-            
-            # Calculate traffic reduction
-            total_queue = traffic_data['ns_queue_length'] + traffic_data['sn_queue_length']
-            if self.baseline_total_queue == 1:
-                self.baseline_total_queue = max(1, total_queue)
-            reduction_percent = max(0, (self.baseline_total_queue - total_queue) / self.baseline_total_queue * 100)
-            traffic_data['traffic_reduction'] = reduction_percent
-            
-            self.update_signals()
+            data['fps'] = self.stream_producer.measured_fps
+            if self.worker_mode == 'process' and isinstance(self.ns_producer, ProcessFrameProducer):
+                data['camera_status'] = 'active' if self.ns_producer.status == 'active' else 'simulated'
+            elif not self.use_simulated_camera:
+                data['camera_status'] = self.capture_status()
+            
+            # Traffic reduction against the rolling average queue from the history store
+            total_queue = data['ns_queue_length'] + data['sn_queue_length']
+            baseline = self.history.mean(self.junction_id, 'total_queue', BASELINE_WINDOW) if self.history else None
+            if baseline:
+                data['traffic_reduction'] = max(0, (baseline - total_queue) / baseline * 100)
+            
+            with STAGE_SECONDS.time(stage='update_signals', junction=self.junction_id, camera=''):
+                self.update_signals(data)
+            if self.history is not None:
+                self.history.record(self.junction_id, data, self.current_green_time)
+            if self.incidents is not None:
+                with STAGE_SECONDS.time(stage='incidents', junction=self.junction_id, camera=''):
+                    self.incidents.observe(self.junction_id, data, {'NS': ns_data, 'SN': sn_data})
+            snapshot = self.state.update(data)
             
             # Update dashboard state with real traffic data
-            self.update_dashboard_state()
+            dashboard_store.modify(lambda dashboard: self.update_dashboard_state(dashboard, snapshot))
             
         except Exception as e:
             logger.error(f"Error processing frames: {e}")
     
-    def update_dashboard_state(self):
-        """Update the dashboard state with real traffic data"""
-        total_vehicles = traffic_data['ns_vehicle_count'] + traffic_data['sn_vehicle_count']
+    def update_dashboard_state(self, dashboard, data):
+        """Update this junction's dashboard entry with its own traffic data"""
+        junction = dashboard['junctions'].get(self.junction_id)
+        if junction is None:
+            return
+        total_vehicles = data['ns_vehicle_count'] + data['sn_vehicle_count']
         
-        for junction_id in dashboard_state['junctions']:
-            junction = dashboard_state['junctions'][junction_id]
-            
-            # Simulate realistic traffic patterns based on real data
-            base_density = min(100, total_vehicles * 8 + random.randint(-10, 10))
-            junction['density'] = max(5, min(100, base_density))
-            junction['queueLength'] = traffic_data['ns_queue_length'] + traffic_data['sn_queue_length']
-            junction['waitTime'] = max(5, junction['density'] * 0.8 + random.randint(-5, 5))
-            
-            # Update status based on density
-            if junction['density'] > 70:
-                junction['status'] = 'high'
-            elif junction['density'] > 40:
-                junction['status'] = 'medium'
-            else:
-                junction['status'] = 'low'
-            
-            # Update emergency status based on real conditions
-            junction['emergencyVehicle'] = traffic_data['current_signal'] == 'SN' and traffic_data['sn_vehicle_count'] > 8
+        junction['density'] = max(5, min(100, total_vehicles * 8))
+        junction['queueLength'] = data['ns_queue_length'] + data['sn_queue_length']
+        junction['waitTime'] = max(5, junction['density'] * 0.8)
+        junction['timeLeft'] = int(data['signal_timer'])
+        junction['phase'] = f"{data['current_signal']} Green"
+        junction['coordinated'] = self.controller.plan is not None
+        junction['priority'] = self.controller.preempt is not None
+        
+        # Update status based on density
+        if junction['density'] > 70:
+            junction['status'] = 'high'
+        elif junction['density'] > 40:
+            junction['status'] = 'medium'
+        else:
+            junction['status'] = 'low'
+        
+        # Emergency and accident flags follow the cameras and the open incidents
+        junction['emergencyVehicle'] = bool(data.get('ns_emergency') or data.get('sn_emergency'))
+        if self.incidents is not None:
+            is_open = self.incidents.store.is_open
+            junction['emergencyVehicle'] |= any(is_open(self.junction_id, d, 'emergency_vehicle') for d in ('NS', 'SN'))
+            junction['accident'] = any(is_open(self.junction_id, d, 'stalled_vehicle') for d in ('NS', 'SN'))
     
     def get_combined_frame(self):
         """Get a combined frame from both cameras for streaming"""
+        return self.compose_latest_frame()[1]
+    
+    def compose_latest_frame(self):
+        """Combine the latest published camera frames without re-running capture or inference"""
         try:
+            ns_packet = self.ns_producer.latest()
+            sn_packet = self.sn_producer.latest()
+            
             # Get NS frame
-            ns_data, frame_ns = self.get_camera_frame(self.cap_ns, self.ns_processor, "NS")
-            frame_ns = cv2.resize(frame_ns, (400, 300))
+            if ns_packet is not None:
+                ns_data, frame_ns = ns_packet['data'], ns_packet['frame']
+            else:
+                ns_data, frame_ns = self.get_camera_frame(self.cap_ns, self.ns_processor, "NS")
             
             # Get SN frame  
-            sn_data, frame_sn = self.get_camera_frame(self.cap_sn, self.sn_processor, "SN")
-            frame_sn = cv2.resize(frame_sn, (400, 300))
+            if sn_packet is not None:
+                sn_data, frame_sn = sn_packet['data'], sn_packet['frame']
+            else:
+                sn_data, frame_sn = self.get_camera_frame(self.cap_sn, self.sn_processor, "SN")
             
-            # Combine frames
-            combined = np.hstack([frame_ns, frame_sn])
+            # Resize both frames straight into the halves of a pooled canvas
+            combined = self.canvas.compose([frame_ns, frame_sn])
             
             # Add overall status text
             status = "SIMULATED" if self.use_simulated_camera else "LIVE"
             cv2.putText(combined, f"TRAFFIC MONITORING - {status}", (10, 20), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
             
-            return combined
+            return {'ns': ns_data, 'sn': sn_data}, combined
             
         except Exception as e:
             logger.error(f"Error getting combined frame: {e}")
-            return self.get_simulated_frame()
+            return {}, self.get_simulated_frame()
 
-# Global traffic system instance
-traffic_system = SmartTrafficSystem()
+# One traffic system per junction, ticked on a bounded worker pool. In 'process'
+# worker mode each camera's capture and inference runs in its own process.
+worker_mode = os.environ.get('TRAFFIC_WORKER_MODE', config.get('worker_mode', 'thread'))
+# Simulated cameras follow the configured scenario; a fixed seed makes runs reproducible
+simulation = config.get('simulation', {})
+simulation_seed = os.environ.get('TRAFFIC_SIM_SEED', simulation.get('seed'))
+simulation_seed = int(simulation_seed) if simulation_seed is not None else None
+# Rolling per-junction history; closed minutes are kept on disk when history_dir is set
+history_store = HistoryStore(config.get('history_dir'))
+# Detector backend, input size, precision and threads of the shared model; forked workers inherit it
+configure_inference_engine(config.get('inference'))
 
-def generate_frames():
-    """Generate video frames for streaming"""
-    frame_count = 0
-    last_time = time.time()
-    
-    while traffic_system.running:
-        try:
-            frame = traffic_system.get_combined_frame()
-            
-            # Calculate FPS
-            frame_count += 1
-            current_time = time.time()
-            if current_time - last_time >= 1.0:
-                fps = frame_count
-                frame_count = 0
-                last_time = current_time
-                traffic_data['fps'] = fps
-            
-            # Encode frame as JPEG
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            frame_bytes = buffer.tobytes()
-            
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            time.sleep(0.067)  # ~15 FPS for stability
-            
-        except Exception as e:
-            logger.error(f"Error in frame generation: {e}")
-            time.sleep(1)
+# Incidents detected from every junction's readings, mirrored into the dashboard as they change
+incident_options = dict(DEFAULT_INCIDENTS, **config.get('incidents', {}))
+incident_store = IncidentStore(incident_options['capacity'], incident_options['clear_after'],
+                               incident_options['retain_resolved'])
+incident_detector = IncidentDetector(incident_store, {spec['id']: spec['name'] for spec in junction_specs},
+                                     incident_options)
+
+def sync_dashboard_incidents(event, incident):
+    # Refreshes of an open incident show up with the next change; everything else is pushed right away
+    if event == 'updated':
+        return
+    incidents = incident_store.query(limit=DASHBOARD_INCIDENTS)
+    dashboard_store.update({
+        'incidents': incidents,
+        'resolvedIncidents': {item['id']: True for item in incidents if item['resolved']}
+    })
+
+incident_store.subscribe(sync_dashboard_incidents)
+
+# Recorded sources (files, image directories) are decoded on one bounded pool; live ones have a thread each
+decoder_pool = DecoderPool(int(config.get('decoder_workers', max(4, os.cpu_count() or 1))))
+junction_engine = JunctionEngine([
+    Junction(spec, SmartTrafficSystem(spec['id'], spec['cameras'], worker_mode=worker_mode,
+                                      simulation={k: v for k, v in simulation.items() if k != 'seed'},
+                                      seed=simulation_seed, decoder_pool=decoder_pool, history=history_store,
+                                      incidents=incident_detector,
+                                      controller=spec.get('signal_controller')))
+    for spec in junction_specs
+])
+# Green waves along chains of nearby junctions and emergency priority routes
+corridor_coordinator = CorridorCoordinator(junction_engine, config.get('corridor'))
+junction_engine.coordinator = corridor_coordinator
+
+# The first junction serves the legacy single-junction endpoints
+traffic_system = junction_engine.get(junction_specs[0]['id']).system
+traffic_store = traffic_system.state
+
+# Push channel shared by all /events subscribers
+event_hub = EventHub()
+traffic_store.subscribe(lambda snapshot: event_hub.publish_snapshot('traffic', snapshot))
+dashboard_store.subscribe(lambda snapshot: event_hub.publish_snapshot('dashboard', snapshot))
+event_hub.publish_snapshot('traffic', traffic_store.snapshot())
+event_hub.publish_snapshot('dashboard', dashboard_store.snapshot())
+
+# Connected clients are read at scrape time
+STREAM_CLIENTS.set_function(lambda: sum(junction.system.stream_buffer(camera).readers
+                                        for junction in junction_engine
+                                        for camera in ('combined', 'NS', 'SN')), kind='mjpeg')
+STREAM_CLIENTS.set_function(lambda: event_hub.subscribers, kind='sse')
+DECODER_LAG.set_function(lambda: decoder_pool.lag)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route,
+                                     method=request.method, status=response.status_code)
+    return response
+
+def junction_system():
+    """Traffic system picked by the ?junction= query parameter, the first junction by default"""
+    junction_id = request.args.get('junction')
+    if junction_id is None:
+        return traffic_system
+    junction = junction_engine.get(junction_id)
+    if junction is None:
+        abort(404)
+    return junction.system
+
+def camera_status_payload(system=None):
+    system = system or traffic_system
+    return {
+        'status': system.state.get('camera_status'),
+        'fps': system.stream_producer.measured_fps,
+        'inference': {direction: system.inference_stats(direction) for direction in ('NS', 'SN')},
+        'captures': {direction: capture.stats()
+                     for direction, capture in (('NS', system.cap_ns), ('SN', system.cap_sn))
+                     if capture is not None}
+    }
+
+def publish_state():
+    """Push changed camera fields to /events subscribers; traffic and dashboard publish on update"""
+    event_hub.publish('camera', camera_status_payload())
+
+def cached_state_response(name, store):
+    """Serve the current snapshot's shared encoding, answering 304 when the client is current"""
+    snapshot = store.snapshot()
+    response = Response(snapshot.json_bytes(), mimetype='application/json')
+    response.set_etag(f"{name}-{snapshot.version}")
+    return response.make_conditional(request)
+
+def generate_frames(system, options=None):
+    """Generate video frames for streaming from the shared producers"""
+    options = options or parse_stream_options({})
+    return mjpeg_stream(system.stream_buffer(options['camera']), system.encoder, options['camera'],
+                        lambda: system.running, quality=options['quality'], width=options['width'],
+                        height=options['height'], fps=options['fps'])
 
 @app.route('/')
 def index():
@@ -552,28 +601,41 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(),
+    try:
+        options = parse_stream_options(request.args)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return Response(generate_frames(junction_system(), options),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/events')
+def events():
+    return Response(event_hub.stream(lambda: traffic_system.running),
+                   mimetype='text/event-stream',
+                   headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/traffic_data')
 def get_traffic_data():
-    return json.dumps(traffic_data)
+    return cached_state_response('traffic', junction_system().state)
 
 @app.route('/dashboard_data')
 def get_dashboard_data():
-    return jsonify(dashboard_state)
+    return cached_state_response('dashboard', dashboard_store)
 
 @app.route('/select_junction', methods=['POST'])
 def select_junction():
     junction_id = request.json.get('junctionId')
-    if junction_id in dashboard_state['junctions']:
-        dashboard_state['selectedJunction'] = junction_id
+    if junction_id in dashboard_store.get('junctions'):
+        dashboard_store.update({'selectedJunction': junction_id})
     return jsonify({'success': True})
 
 @app.route('/toggle_emergency', methods=['POST'])
 def toggle_emergency():
-    dashboard_state['emergencyMode'] = not dashboard_state['emergencyMode']
-    return jsonify({'emergencyMode': dashboard_state['emergencyMode']})
+    def toggle(dashboard):
+        dashboard['emergencyMode'] = not dashboard['emergencyMode']
+    
+    snapshot = dashboard_store.modify(toggle)
+    return jsonify({'emergencyMode': snapshot['emergencyMode']})
 
 @app.route('/manual_control', methods=['POST'])
 def manual_control():
@@ -584,41 +646,152 @@ def manual_control():
 def resolve_incident():
     incident_id = request.json.get('incidentId')
     action = request.json.get('action')
+    incident = incident_store.get(incident_id)
+    if incident is None:
+        return jsonify({'success': False, 'error': 'unknown incident'}), 404
     
-    for incident in dashboard_state['incidents']:
-        if incident['id'] == incident_id:
-            incident['resolved'] = True
-            incident['resolvedAction'] = action
-            incident['resolvedTime'] = time.strftime('%H:%M')
-            dashboard_state['resolvedIncidents'][incident_id] = True
-            break
+    fields = {}
+    if action == 'Alert nearby junctions':
+        try:
+            windows = corridor_coordinator.priority_route(incident['junctionId'], incident['approach'])
+            fields['alertedJunctions'] = list(windows)
+        except ValueError as e:
+            logger.warning(f"Incident {incident_id}: {e}")
+    incident_store.resolve(incident_id, action, fields=fields)
     
     return jsonify({'success': True})
 
-@app.route('/camera_status')
-def get_camera_status():
+@app.route('/incidents')
+def get_incidents():
+    """Incidents newest first: ?junction=&since=&active=1|0&limit=
+
+    since is epoch seconds; negative values are relative to now.
+    """
+    try:
+        since = float(request.args['since']) if 'since' in request.args else None
+        if since is not None and since <= 0:
+            since += time.time()
+        active = request.args['active'] not in ('0', 'false') if 'active' in request.args else None
+        limit = int(request.args.get('limit', 100))
+    except ValueError as e:
+        abort(400, description=str(e))
     return jsonify({
-        'status': traffic_data['camera_status'],
-        'fps': traffic_data.get('fps', 0)
+        'incidents': incident_store.query(request.args.get('junction'), since, active, limit),
+        'store': incident_store.stats()
     })
 
-def run_traffic_processing():
-    """Background thread for traffic processing"""
-    while traffic_system.running:
-        traffic_system.process_frames()
+@app.route('/camera_status')
+def get_camera_status():
+    response = jsonify(camera_status_payload(junction_system()))
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/junctions')
+def get_junctions():
+    return jsonify(dict(junction_engine.stats(), decoder=decoder_pool.stats()))
+
+@app.route('/corridors')
+def get_corridors():
+    return jsonify(corridor_coordinator.stats())
+
+@app.route('/history')
+def get_history():
+    """Downsampled time series of a junction: ?junction=&fields=a,b&start=&end=&step=
+
+    start and end are epoch seconds; negative values are relative to now.
+    """
+    junction_id = request.args.get('junction', junction_specs[0]['id'])
+    if junction_engine.get(junction_id) is None:
+        abort(404)
+    try:
+        now = time.time()
+        start = float(request.args.get('start', -3600))
+        end = float(request.args.get('end', 0))
+        start = now + start if start <= 0 else start
+        end = now + end if end <= 0 else end
+        step = float(request.args['step']) if 'step' in request.args else None
+        fields = [name for name in request.args.get('fields', '').split(',') if name] or None
+        if end <= start:
+            raise ValueError("end must be after start")
+        return jsonify(history_store.query(junction_id, fields, start, end, step))
+    except ValueError as e:
+        abort(400, description=str(e))
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def run_status_publisher():
+    """Background thread pushing camera status to /events subscribers"""
+    while junction_engine.running:
+        publish_state()
         time.sleep(2)  # Update every 2 seconds
 
+services_lock = threading.Lock()
+
+def start_services():
+    """Start loading the model, every junction's producers and control ticks, then the status publisher.
+
+    Returns right away: the model loads and warms up and the cameras connect
+    on their own threads, with detections simulated until the model is ready.
+    """
+    with services_lock:
+        if junction_engine.running:
+            return
+        if any(junction.system.needs_model for junction in junction_engine):
+            start_inference_engine()
+        junction_engine.start()
+        publisher_thread = threading.Thread(target=run_status_publisher, daemon=True)
+        publisher_thread.start()
+
+def stop_services():
+    junction_engine.stop()
+    decoder_pool.shutdown()
+
+def create_app():
+    """Application factory for WSGI servers (e.g. `gunicorn 'app:create_app()'`): the app with its services starting"""
+    start_services()
+    return app
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok', 'uptime': round(time.time() - STARTED_AT, 1)})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: services running, the model settled if any junction needs it, and every junction has ticked.
+
+    A model that failed to load leaves the system ready but degraded, on simulated detections.
+    """
+    model = inference_status()
+    model['needed'] = any(junction.system.needs_model for junction in junction_engine)
+    checks = {
+        'services': junction_engine.running,
+        'model': not model['needed'] or model['state'] in ('ready', 'failed'),
+        'junctions': all(junction.ticks > 0 for junction in junction_engine)
+    }
+    ready = all(checks.values())
+    payload = {
+        'status': 'ready' if ready else 'starting',
+        'degraded': model['needed'] and model['state'] == 'failed',
+        'checks': checks,
+        'model': model,
+        'cameras': {junction.id: junction.system.state.get('camera_status') for junction in junction_engine},
+        'uptime': round(time.time() - STARTED_AT, 1)
+    }
+    return jsonify(payload), 200 if ready else 503
+
 if __name__ == '__main__':
-    # Start background processing thread
-    processing_thread = threading.Thread(target=run_traffic_processing, daemon=True)
-    processing_thread.start()
+    create_app()
     
     print("\n" + "="*60)
     print("🚦 Smart Traffic Control System Starting...")
     print("="*60)
     print("📊 Dashboard available at: http://localhost:5000")
-    print("📹 Camera status:", traffic_data['camera_status'])
-    if traffic_data['camera_status'] == 'simulated':
+    print(f"🚥 Junctions: {len(junction_engine.junctions)} on {junction_engine.workers} workers")
+    print("📹 Camera status:", traffic_store.get('camera_status'))
+    if traffic_store.get('camera_status') == 'simulated':
         print("💡 Tip: Connect a webcam for live video processing")
     print("="*60 + "\n")
     
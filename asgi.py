@@ -0,0 +1,510 @@
+"""Asyncio serving mode for many stream viewers and pollers.
+
+Every /video_feed viewer on the threaded Flask server holds an OS thread for
+as long as it watches. Here the streaming and polled endpoints are served on
+one event loop instead, where an idle viewer costs a coroutine:
+
+  /video_feed      the newest encoded frame from a FrameBroadcast per variant
+  /events          EventHub.stream_async
+  /traffic_data, /dashboard_data, /camera_status
+                   the state store snapshots, with the same ETag/304 handling
+
+Everything else (the page, static files, POST controls, /history, /metrics,
+...) goes to the Flask app on a small thread pool, so both modes serve the
+same routes.
+
+Usage: python asgi.py [--host 0.0.0.0] [--port 5000] [--builtin]
+       uvicorn asgi:application   (uvicorn runs the startup/shutdown lifespan)
+
+The built-in HTTP/1.1 server is used when uvicorn isn't installed.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import sys
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote
+
+import app as traffic_app
+from encoder import parse_stream_options
+from metrics import HTTP_REQUEST_SECONDS, FRAMES_DROPPED, STREAM_CLIENTS
+
+logger = logging.getLogger(__name__)
+
+# Threads for the routes handed to Flask; none of them block for long
+WSGI_WORKERS = traffic_app.config.get('wsgi_workers', 8)
+
+
+class FrameBroadcast:
+    """Newest MJPEG part of one stream variant, shared by every async viewer.
+
+    While anyone watches, a bridge thread waits on the producer's ring buffer,
+    encodes each new packet once through the system's VariantEncoder and hands
+    the finished multipart chunk to the event loop. Viewers only ever see the
+    newest chunk, so a slow viewer skips frames instead of queueing them.
+    """
+
+    def __init__(self, system, options, loop, linger=2.0):
+        self.system = system
+        self.options = options
+        self.loop = loop
+        self.linger = linger
+        self.seq = 0
+        self.chunk = None
+        self.viewers = 0
+        self._changed = asyncio.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._thread is not None
+
+    def _subscribe(self):
+        with self._lock:
+            self.viewers += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"broadcast-{self.options['camera']}",
+                                                daemon=True)
+                self._thread.start()
+
+    def _unsubscribe(self):
+        with self._lock:
+            self.viewers -= 1
+
+    def _run(self):
+        options = self.options
+        buffer = self.system.stream_buffer(options['camera'])
+        last_seq = 0
+        idle_since = None
+        with buffer.reader():
+            while self.system.running:
+                with self._lock:
+                    if self.viewers > 0:
+                        idle_since = None
+                    elif idle_since is None:
+                        idle_since = time.monotonic()
+                    elif time.monotonic() - idle_since > self.linger:
+                        self._thread = None
+                        return
+                try:
+                    packet = buffer.wait_for(last_seq, timeout=0.5)
+                    if packet is None:
+                        continue
+                    last_seq = packet['seq']
+                    jpeg = self.system.encoder.encode(options['camera'], packet, options['quality'],
+                                                      options['width'], options['height'])
+                    if jpeg is None:
+                        continue
+                    chunk = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+                    self.loop.call_soon_threadsafe(self._publish, last_seq, chunk)
+                except RuntimeError:
+                    break  # Event loop closed
+                except Exception as e:
+                    logger.error(f"Error in frame broadcast: {e}")
+                    time.sleep(1)
+        with self._lock:
+            self._thread = None
+
+    def _publish(self, seq, chunk):
+        self.seq = seq
+        self.chunk = chunk
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def frames(self, fps):
+        """MJPEG parts for one viewer, paced to fps and always the newest frame"""
+        interval = 1.0 / fps
+        last_seq = 0
+        dropped = FRAMES_DROPPED.labels('mjpeg')
+        next_frame = self.loop.time()
+        self._subscribe()
+        try:
+            while self.system.running:
+                if self.seq <= last_seq:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if last_seq and self.seq > last_seq + 1:
+                    dropped.inc(self.seq - last_seq - 1)
+                last_seq = self.seq
+                yield self.chunk
+
+                next_frame = max(next_frame + interval, self.loop.time())
+                delay = next_frame - self.loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        finally:
+            self._unsubscribe()
+
+
+class Broadcasts:
+    """FrameBroadcast per (junction, camera, quality, size), created on first viewer"""
+
+    def __init__(self):
+        self._broadcasts = {}
+
+    def get(self, system, options):
+        key = (id(system), options['camera'], options['quality'], options['width'], options['height'])
+        broadcast = self._broadcasts.get(key)
+        if broadcast is None:
+            # Drop variants nobody watches any more before adding one
+            for stale in [k for k, b in self._broadcasts.items() if not b.viewers and not b.active]:
+                del self._broadcasts[stale]
+            broadcast = self._broadcasts[key] = FrameBroadcast(system, options, asyncio.get_running_loop())
+        return broadcast
+
+    @property
+    def viewers(self):
+        return sum(broadcast.viewers for broadcast in list(self._broadcasts.values()))
+
+
+broadcasts = Broadcasts()
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_WORKERS, thread_name_prefix='asgi-wsgi')
+STREAM_CLIENTS.set_function(lambda: broadcasts.viewers, kind='mjpeg_async')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=''):
+        super().__init__(message)
+        self.status = status
+
+
+def request_headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def junction_system(query):
+    """Traffic system picked by ?junction=, the first junction by default"""
+    junction_id = query.get('junction')
+    if junction_id is None:
+        return traffic_app.traffic_system
+    junction = traffic_app.junction_engine.get(junction_id)
+    if junction is None:
+        raise HTTPError(404)
+    return junction.system
+
+
+async def start_response(send, status, headers, timing):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+    route, method, started = timing
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=method, status=status)
+
+
+async def send_body(scope, send, status, body, content_type, timing, etag=None):
+    """Whole response, answering 304 when If-None-Match already has the etag"""
+    headers = [('Content-Type', content_type)]
+    if etag is not None:
+        headers.append(('ETag', f'"{etag}"'))
+        if f'"{etag}"' in request_headers(scope).get('if-none-match', ''):
+            status, body = 304, b''
+    headers.append(('Content-Length', str(len(body))))
+    await start_response(send, status, headers, timing)
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_stream(receive, send, chunks, content_type, timing, headers=()):
+    """Stream an async iterator of chunks until it ends or the client goes away"""
+    await start_response(send, 200, [('Content-Type', content_type), ('Cache-Control', 'no-cache')] + list(headers),
+                         timing)
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        finally:
+            await chunks.aclose()
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    pumping = asyncio.ensure_future(pump())
+    watching = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait([pumping, watching], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pumping, watching):
+            task.cancel()
+        await asyncio.gather(pumping, watching, return_exceptions=True)
+    if pumping.done() and not pumping.cancelled() and pumping.exception() is None:
+        try:
+            await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            pass
+
+
+async def video_feed(scope, receive, send, query, timing):
+    try:
+        options = parse_stream_options(query)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    system = junction_system(query)
+    broadcast = broadcasts.get(system, options)
+    await send_stream(receive, send, broadcast.frames(options['fps']),
+                      'multipart/x-mixed-replace; boundary=frame', timing)
+
+
+async def events(scope, receive, send, query, timing):
+    system = traffic_app.traffic_system
+    await send_stream(receive, send, traffic_app.event_hub.stream_async(lambda: system.running),
+                      'text/event-stream', timing, headers=[('X-Accel-Buffering', 'no')])
+
+
+async def traffic_data(scope, receive, send, query, timing):
+    snapshot = junction_system(query).state.snapshot()
+    await send_body(scope, send, 200, snapshot.json_bytes(), 'application/json', timing,
+                    etag=f"traffic-{snapshot.version}")
+
+
+async def dashboard_data(scope, receive, send, query, timing):
+    snapshot = traffic_app.dashboard_store.snapshot()
+    await send_body(scope, send, 200, snapshot.json_bytes(), 'application/json', timing,
+                    etag=f"dashboard-{snapshot.version}")
+
+
+async def camera_status(scope, receive, send, query, timing):
+    body = json.dumps(traffic_app.camera_status_payload(junction_system(query))).encode()
+    await send_body(scope, send, 200, body, 'application/json', timing, etag=hashlib.sha1(body).hexdigest())
+
+
+ROUTES = {
+    '/video_feed': video_feed,
+    '/events': events,
+    '/traffic_data': traffic_data,
+    '/dashboard_data': dashboard_data,
+    '/camera_status': camera_status
+}
+
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in request_headers(scope).items():
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+def call_flask(environ):
+    """Run one request through the Flask app, buffering its (non-streaming) response"""
+    response = {}
+
+    def start(status, headers, exc_info=None):
+        response['status'] = int(status.split()[0])
+        response['headers'] = headers
+
+    result = traffic_app.app(environ, start)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+async def flask_fallback(scope, receive, send):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    loop = asyncio.get_running_loop()
+    status, headers, body = await loop.run_in_executor(wsgi_executor, call_flask, wsgi_environ(scope, body))
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            traffic_app.start_services()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            traffic_app.stop_services()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    handler = ROUTES.get(scope['path'])
+    if handler is None or scope['method'] not in ('GET', 'HEAD'):
+        await flask_fallback(scope, receive, send)
+        return
+    timing = (scope['path'], scope['method'], time.perf_counter())
+    try:
+        await handler(scope, receive, send, dict(parse_qsl(scope['query_string'].decode('latin-1'))), timing)
+    except HTTPError as e:
+        body = json.dumps({'error': str(e) or None}).encode()
+        await send_body(scope, send, e.status, body, 'application/json', timing)
+
+
+class HTTPServer:
+    """Minimal HTTP/1.1 server driving an ASGI app on asyncio streams.
+
+    Enough for this app's traffic: keep-alive for responses with a length,
+    close-delimited bodies for streams, no chunked request bodies, no TLS.
+    """
+
+    def __init__(self, app, host='0.0.0.0', port=5000, backlog=2048):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port, backlog=self.backlog)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            while await self.handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except Exception as e:
+            logger.error(f"Error serving request: {e}")
+        finally:
+            writer.close()
+
+    async def handle_request(self, reader, writer):
+        """Serve one request, returns whether the connection stays open"""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return False
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            return False
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+        fields = dict(headers)
+        length = int(fields.get(b'content-length', 0))
+        body = await reader.readexactly(length) if length else b''
+        connection = fields.get(b'connection', b'').lower()
+        keep_alive = connection != b'close' if version == 'HTTP/1.1' else connection == b'keep-alive'
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': version.partition('/')[2] or '1.0',
+            'method': method.upper(),
+            'scheme': 'http',
+            'path': unquote(path),
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'client': writer.get_extra_info('peername')[:2],
+            'server': writer.get_extra_info('sockname')[:2]
+        }
+        state = {'body_sent': False, 'keep_alive': keep_alive}
+
+        async def receive():
+            if not state['body_sent']:
+                state['body_sent'] = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Only streams wait here; the client closing the socket ends them
+            while await reader.read(65536):
+                pass
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                response_headers = list(message.get('headers', []))
+                if not any(name.lower() == b'content-length' for name, _ in response_headers):
+                    state['keep_alive'] = False
+                response_headers.append((b'Connection', b'keep-alive' if state['keep_alive'] else b'close'))
+                head = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}".encode('latin-1')]
+                head += [name + b': ' + value for name, value in response_headers]
+                writer.write(b'\r\n'.join(head) + b'\r\n\r\n')
+            elif method.upper() != 'HEAD':
+                writer.write(message.get('body', b''))
+            await writer.drain()
+
+        await self.app(scope, receive, send)
+        return state['keep_alive']
+
+
+STATUS_REASONS = {200: 'OK', 204: 'No Content', 301: 'Moved Permanently', 302: 'Found', 304: 'Not Modified',
+                  400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def serve(host='0.0.0.0', port=5000, builtin=False):
+    """Run the services and serve them with uvicorn when installed, otherwise the built-in server"""
+    if not builtin:
+        try:
+            import uvicorn
+        except ImportError:
+            logger.info("uvicorn not installed, using the built-in HTTP server")
+        else:
+            uvicorn.run(application, host=host, port=port, log_level='warning')
+            return
+    traffic_app.start_services()
+    try:
+        asyncio.run(HTTPServer(application, host, port).serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        traffic_app.stop_services()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--builtin', action='store_true', help='use the built-in server even if uvicorn is installed')
+    args = parser.parse_args()
+    print(f"🚦 Smart Traffic Control System (asyncio) on http://{args.host}:{args.port}")
+    serve(args.host, args.port, args.builtin)
+
+
+if __name__ == '__main__':
+    main()
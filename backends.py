@@ -0,0 +1,250 @@
+import os
+import time
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = {
+    'backend': 'torch',
+    'weights': 'yolov8n.pt',
+    'imgsz': 640,
+    'precision': 'fp32',
+    'threads': None,
+    'device': 'cpu',
+    # Same defaults as ultralytics predict, so the backends agree out of the box
+    'conf': 0.25,
+    'iou': 0.7,
+    'max_det': 300
+}
+
+# Letterbox padding value, as in ultralytics
+PAD_VALUE = 114
+
+
+class Boxes:
+    """Detections of one frame: (N, 4) xyxy in frame pixels, (N,) conf and (N,) cls"""
+    __slots__ = ('xyxy', 'conf', 'cls')
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class Result:
+    __slots__ = ('boxes',)
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def letterbox(frame, size):
+    """Resize keeping the aspect ratio and pad to size x size; returns the image, scale and (x, y) padding"""
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    resized_w, resized_h = int(round(width * scale)), int(round(height * scale))
+    pad_x, pad_y = (size - resized_w) // 2, (size - resized_h) // 2
+    image = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+    image[pad_y:pad_y + resized_h, pad_x:pad_x + resized_w] = cv2.resize(
+        frame, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+    return image, scale, (pad_x, pad_y)
+
+
+def decode_yolo(output, scale, pad, shape, conf=0.25, iou=0.7, max_det=300):
+    """Boxes from one image's raw YOLOv8 head output (4 + classes, anchors), class-aware NMS included"""
+    predictions = output.T
+    scores = predictions[:, 4:]
+    cls = scores.argmax(axis=1)
+    confidence = scores[np.arange(len(scores)), cls]
+    keep = confidence > conf
+    if not keep.any():
+        return Boxes(np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32), np.empty(0))
+    centre, size = predictions[keep, :2], predictions[keep, 2:4]
+    cls, confidence = cls[keep], confidence[keep]
+
+    # Offsetting each class keeps NMS from suppressing boxes of other classes
+    offset = cls[:, None] * 4096.0
+    corners = np.concatenate([centre - size / 2 + offset, size], axis=1)
+    chosen = cv2.dnn.NMSBoxes(corners.tolist(), confidence.tolist(), conf, iou, top_k=max_det)
+    chosen = np.asarray(chosen, dtype=np.int64).reshape(-1)[:max_det]
+
+    xyxy = np.concatenate([centre[chosen] - size[chosen] / 2, centre[chosen] + size[chosen] / 2], axis=1)
+    xyxy -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=xyxy.dtype)
+    xyxy /= scale
+    height, width = shape[:2]
+    np.clip(xyxy[:, 0::2], 0, width, out=xyxy[:, 0::2])
+    np.clip(xyxy[:, 1::2], 0, height, out=xyxy[:, 1::2])
+    return Boxes(xyxy.astype(np.float32), confidence[chosen].astype(np.float32), cls[chosen].astype(np.float32))
+
+
+def export_onnx(weights, imgsz, dynamic=False):
+    """Path of an ONNX export of .pt weights at imgsz, exporting it with ultralytics if it isn't cached"""
+    if weights.endswith('.onnx'):
+        return weights
+    stem = os.path.splitext(weights)[0]
+    path = f"{stem}-{imgsz}{'-dynamic' if dynamic else ''}.onnx"
+    if not os.path.exists(path):
+        from ultralytics import YOLO
+        logger.info(f"Exporting {weights} to ONNX at {imgsz}px")
+        exported = YOLO(weights).export(format='onnx', imgsz=imgsz, dynamic=dynamic, verbose=False)
+        os.replace(exported, path)
+    return path
+
+
+class DetectorBackend:
+    """A detector behind the ultralytics predict() interface.
+
+    predict() takes a list of BGR frames and returns one result per frame
+    whose .boxes has xyxy, conf and cls arrays in frame pixels, so
+    BatchInferenceEngine and extract_vehicle_boxes work the same on every
+    backend:
+
+      torch   the .pt model through ultralytics (PyTorch); fp16 needs a GPU device
+      onnx    an ONNX export on onnxruntime's CPU provider; int8 quantizes the
+              weights with onnxruntime's dynamic quantization
+      opencv  an ONNX export on OpenCV's DNN module; fp16 uses its CPU_FP16 target
+
+    onnx and opencv export .pt weights on first use, which needs ultralytics,
+    and cache the export next to them; an .onnx path is used as is. threads
+    caps the backend's intra-op threads. For torch and opencv that setting is
+    process-wide, because both libraries only have a global one.
+    """
+    name = None
+    precisions = ('fp32',)
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.imgsz = int(spec['imgsz'])
+        self.precision = spec['precision']
+        self.threads = spec['threads']
+        if self.precision not in self.precisions:
+            raise ValueError(f"{self.name} backend supports {', '.join(self.precisions)}, not {self.precision}")
+
+    def describe(self):
+        return {'backend': self.name, 'weights': self.spec['weights'], 'imgsz': self.imgsz,
+                'precision': self.precision, 'threads': self.threads}
+
+    def decode(self, output, frame, scale, pad):
+        spec = self.spec
+        return Result(decode_yolo(output, scale, pad, frame.shape, spec['conf'], spec['iou'], spec['max_det']))
+
+
+class TorchBackend(DetectorBackend):
+    """The .pt model through ultralytics, as before backends existed"""
+    name = 'torch'
+    precisions = ('fp32', 'fp16')
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        from ultralytics import YOLO
+        if self.threads:
+            import torch
+            torch.set_num_threads(int(self.threads))
+        self.model = YOLO(spec['weights'])
+
+    def predict(self, frames, device=None, **kwargs):
+        spec = self.spec
+        return self.model.predict(frames, imgsz=self.imgsz, half=self.precision == 'fp16',
+                                  device=device or spec['device'], conf=spec['conf'], iou=spec['iou'],
+                                  max_det=spec['max_det'], verbose=False)
+
+
+class OnnxBackend(DetectorBackend):
+    """ONNX export on onnxruntime's CPU provider; batches in one call when the export has a dynamic batch"""
+    name = 'onnx'
+    precisions = ('fp32', 'int8')
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        import onnxruntime
+        path = export_onnx(spec['weights'], self.imgsz, dynamic=True)
+        if self.precision == 'int8':
+            path = self.quantize(path)
+        options = onnxruntime.SessionOptions()
+        if self.threads:
+            options.intra_op_num_threads = int(self.threads)
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.path = path
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, _ = model_input.shape
+        self.batched = not isinstance(batch, int)
+        # A static export fixes the input size whatever the spec says
+        if isinstance(height, int):
+            self.imgsz = height
+
+    @staticmethod
+    def quantize(path):
+        quantized = path.replace('.onnx', '.int8.onnx')
+        if not os.path.exists(quantized):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            logger.info(f"Quantizing {path} to INT8")
+            quantize_dynamic(path, quantized, weight_type=QuantType.QUInt8)
+        return quantized
+
+    def predict(self, frames, **kwargs):
+        prepared = [letterbox(frame, self.imgsz) for frame in frames]
+        blob = cv2.dnn.blobFromImages([image for image, _, _ in prepared], 1 / 255.0, swapRB=True)
+        if self.batched:
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+        else:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: blob[i:i + 1]})[0]
+                                      for i in range(len(frames))])
+        return [self.decode(output, frame, scale, pad)
+                for output, frame, (_, scale, pad) in zip(outputs, frames, prepared)]
+
+
+class OpenCVBackend(DetectorBackend):
+    """ONNX export on OpenCV's DNN module, one frame at a time"""
+    name = 'opencv'
+    precisions = ('fp32', 'fp16')
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        if self.precision == 'fp16' and not hasattr(cv2.dnn, 'DNN_TARGET_CPU_FP16'):
+            raise ValueError(f"OpenCV {cv2.__version__} has no CPU FP16 target")
+        if self.threads:
+            cv2.setNumThreads(int(self.threads))
+        self.path = export_onnx(spec['weights'], self.imgsz, dynamic=False)
+        self.net = cv2.dnn.readNetFromONNX(self.path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU_FP16 if self.precision == 'fp16'
+                                     else cv2.dnn.DNN_TARGET_CPU)
+
+    def predict(self, frames, **kwargs):
+        results = []
+        for frame in frames:
+            image, scale, pad = letterbox(frame, self.imgsz)
+            self.net.setInput(cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True))
+            results.append(self.decode(self.net.forward()[0], frame, scale, pad))
+        return results
+
+
+BACKENDS = {backend.name: backend for backend in (TorchBackend, OnnxBackend, OpenCVBackend)}
+
+
+def backend_spec(spec=None):
+    """Full backend spec from None, weights path or backend name, or a dict of overrides"""
+    if isinstance(spec, str):
+        spec = {'backend': spec} if spec in BACKENDS else {'weights': spec}
+    spec = dict(DEFAULT_BACKEND, **(spec or {}))
+    if spec['backend'] not in BACKENDS:
+        raise ValueError(f"unknown inference backend {spec['backend']}")
+    return spec
+
+
+def make_backend(spec=None):
+    """Load the detector a spec describes"""
+    spec = backend_spec(spec)
+    started = time.perf_counter()
+    backend = BACKENDS[spec['backend']](spec)
+    logger.info(f"Loaded {spec['backend']} backend {spec['weights']} at {backend.imgsz}px {spec['precision']} "
+                f"in {time.perf_counter() - started:.2f} s")
+    return backend
@@ -0,0 +1,206 @@
+"""Detector backend comparison: per-frame latency and agreement with the default model.
+
+Runs every backend in --backends over the same frames, one frame per call as
+the cameras submit them, and reports mean, p50 and p95 latency and frames per
+second. The vehicle boxes each backend finds (the classes and confidence
+threshold the processors use) are compared with the reference backend's: the
+mean absolute difference in vehicle count per frame, and precision, recall
+and F1 of boxes matched at IoU >= --match-iou. The recommendation is the
+fastest backend within --min-f1 and --max-count-error of the reference.
+
+Backends are given as backend[:imgsz[:precision]], e.g. onnx:416:int8 or
+opencv:640:fp16; the reference defaults to torch:640:fp32, the model the
+service used before backends were selectable. A backend that can't load here
+(its library isn't installed, say) is reported and skipped.
+
+Frames come from --video (a file or an image directory); without one the
+seeded simulator is used, whose drawn vehicles tell nothing about accuracy,
+so only its latency figures are meaningful.
+
+Usage: python benchmarks/bench_backends.py [--video clip.mp4] [--frames 200]
+                                           [--backends torch,onnx,onnx:416:int8,opencv,opencv:416:fp16]
+                                           [--threads 4] [--output results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import backend_spec, make_backend  # noqa: E402
+from inference import extract_vehicle_boxes, VEHICLE_CLASSES  # noqa: E402
+from tracker import iou_matrix, greedy_assignment, INVALID_COST  # noqa: E402
+
+# Confidence the processors keep vehicle boxes above
+MIN_CONF = 0.3
+
+
+def parse_spec(text, args):
+    """backend[:imgsz[:precision]] -> a full backend spec"""
+    parts = text.strip().split(':')
+    spec = {'backend': parts[0], 'weights': args.weights, 'threads': args.threads}
+    if len(parts) > 1 and parts[1]:
+        spec['imgsz'] = int(parts[1])
+    if len(parts) > 2 and parts[2]:
+        spec['precision'] = parts[2]
+    return backend_spec(spec)
+
+
+def label(spec):
+    return f"{spec['backend']}:{spec['imgsz']}:{spec['precision']}"
+
+
+def load_frames(args):
+    if args.video:
+        from capture import open_capture
+        capture = open_capture(args.video)
+        if capture is None:
+            sys.exit(f"can't open {args.video}")
+        frames = []
+        while len(frames) < args.frames:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(frame)
+        capture.release()
+        if not frames:
+            sys.exit(f"no frames in {args.video}")
+        return frames
+
+    from simulator import TrafficSimulator
+    print("warning: no --video, using simulator frames; only the latency figures are meaningful", file=sys.stderr)
+    simulator = TrafficSimulator(args.scenario, seed=args.seed, stream='bench')
+    frames = []
+    for index in range(args.frames):
+        simulator.run(1 / 15)
+        frames.append(simulator.observe('NS' if index % 2 == 0 else 'SN')[1].copy())
+    return frames
+
+
+def run_backend(spec, frames, warmup):
+    """Per-frame latencies in ms and the vehicle boxes found in every frame"""
+    started = time.perf_counter()
+    backend = make_backend(spec)
+    load_seconds = time.perf_counter() - started
+    for frame in frames[:warmup]:
+        backend.predict([frame])
+    latencies = np.empty(len(frames))
+    boxes = []
+    for index, frame in enumerate(frames):
+        started = time.perf_counter()
+        result = backend.predict([frame])[0]
+        latencies[index] = (time.perf_counter() - started) * 1000
+        boxes.append(extract_vehicle_boxes(result, list(VEHICLE_CLASSES), MIN_CONF)[0])
+    return backend, load_seconds, latencies, boxes
+
+
+def agreement(boxes, reference, match_iou):
+    """Count error and box precision/recall/F1 against the reference detections"""
+    matched = found = expected = 0
+    count_errors = []
+    for mine, theirs in zip(boxes, reference):
+        found += len(mine)
+        expected += len(theirs)
+        count_errors.append(abs(len(mine) - len(theirs)))
+        if not len(mine) or not len(theirs):
+            continue
+        iou = iou_matrix(mine.astype(np.float32), theirs.astype(np.float32))
+        cost = 1 - iou
+        cost[iou < match_iou] = INVALID_COST
+        rows, _ = greedy_assignment(cost)
+        matched += len(rows)
+    precision = matched / found if found else 1.0
+    recall = matched / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'count_mae': float(np.mean(count_errors)), 'precision': precision, 'recall': recall, 'f1': f1,
+            'mean_vehicles': found / len(boxes)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='video file or image directory to take frames from')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=5, help='untimed frames per backend')
+    parser.add_argument('--backends', default='torch,onnx,onnx:416,onnx:640:int8,opencv,opencv:640:fp16',
+                        help='comma-separated backend[:imgsz[:precision]] specs')
+    parser.add_argument('--reference', default='torch:640:fp32', help='spec the others are compared with')
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--threads', type=int, help='intra-op threads per backend (default: library default)')
+    parser.add_argument('--match-iou', type=float, default=0.5)
+    parser.add_argument('--min-f1', type=float, default=0.9, help='agreement a recommended backend must keep')
+    parser.add_argument('--max-count-error', type=float, default=0.5,
+                        help='mean vehicles-per-frame difference a recommended backend may have')
+    parser.add_argument('--scenario', default='rush_hour')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    frames = load_frames(args)
+    reference_spec = parse_spec(args.reference, args)
+    specs = [parse_spec(text, args) for text in args.backends.split(',') if text.strip()]
+    specs = [reference_spec] + [spec for spec in specs if label(spec) != label(reference_spec)]
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, reference {label(reference_spec)}")
+
+    results = []
+    reference = None
+    for spec in specs:
+        name = label(spec)
+        try:
+            backend, load_seconds, latencies, boxes = run_backend(spec, frames, args.warmup)
+        except Exception as e:
+            print(f"{name}: skipped ({type(e).__name__}: {e})")
+            results.append({'backend': name, 'error': str(e)})
+            if spec is reference_spec:
+                print("reference backend unavailable; agreement can't be measured", file=sys.stderr)
+            continue
+        result = {
+            'backend': name,
+            'describe': backend.describe(),
+            'load_seconds': load_seconds,
+            'mean_ms': float(latencies.mean()),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'fps': float(1000 / latencies.mean())
+        }
+        if spec is reference_spec:
+            reference = (boxes, result['mean_ms'])
+        if reference is not None:
+            result.update(agreement(boxes, reference[0], args.match_iou))
+            result['speedup'] = reference[1] / result['mean_ms']
+        results.append(result)
+
+    print(f"{'backend':<20} {'load s':>7} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'fps':>7} "
+          f"{'speedup':>8} {'cnt MAE':>8} {'prec':>6} {'recall':>6} {'F1':>6}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['backend']:<20} unavailable")
+            continue
+        line = (f"{result['backend']:<20} {result['load_seconds']:>7.2f} {result['mean_ms']:>8.1f} "
+                f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['fps']:>7.1f}")
+        if 'f1' in result:
+            line += (f" {result['speedup']:>7.2f}x {result['count_mae']:>8.2f} {result['precision']:>6.3f} "
+                     f"{result['recall']:>6.3f} {result['f1']:>6.3f}")
+        print(line)
+
+    eligible = [result for result in results
+                if 'f1' in result and result['f1'] >= args.min_f1 and result['count_mae'] <= args.max_count_error]
+    recommended = min(eligible, key=lambda result: result['mean_ms']) if eligible else None
+    if recommended is not None:
+        print(f"recommended: {recommended['backend']} ({recommended['speedup']:.2f}x the reference, "
+              f"F1 {recommended['f1']:.3f}, count MAE {recommended['count_mae']:.2f})")
+    else:
+        print("recommended: none measured within tolerance of the reference")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'args': vars(args), 'frames': len(frames),
+                       'results': results, 'recommended': recommended and recommended['backend']}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Allocation churn of frame compositing with and without the buffer pools.
+
+Compares the original per-call allocations (fresh simulated frame, two
+cv2.resize outputs, np.hstack) with the pooled path (background copy into a
+pooled frame, resize straight into a pooled canvas). Reports time per frame,
+bytes allocated per frame and how much the traced heap grew over the run.
+
+Usage: python benchmarks/bench_buffers.py [--frames 500]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buffers import FramePool, CompositeCanvas, simulated_background
+
+
+def draw_vehicles(frame, rng):
+    height, width = frame.shape[:2]
+    for _ in range(5):
+        x = int(rng.integers(50, width - 100))
+        y = int(rng.integers(height // 3 + 20, 2 * height // 3 - 50))
+        cv2.rectangle(frame, (x, y), (x + 60, y + 30), (180, 120, 90), -1)
+
+
+def unpooled(camera_frames, rng):
+    width, height = 800, 300
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (0, height // 3), (width, 2 * height // 3), (50, 50, 50), -1)
+    for i in range(0, width, 40):
+        cv2.rectangle(frame, (i, height // 2 - 5), (i + 20, height // 2 + 5), (255, 255, 255), -1)
+    draw_vehicles(frame, rng)
+    frame_ns = cv2.resize(camera_frames[0], (400, 300))
+    frame_sn = cv2.resize(camera_frames[1], (400, 300))
+    return np.hstack([frame_ns, frame_sn])
+
+
+def make_pooled():
+    simulated_pool = FramePool((300, 800, 3), count=16)
+    canvas = CompositeCanvas((400, 300))
+
+    def pooled(camera_frames, rng):
+        frame = simulated_pool.next()
+        np.copyto(frame, simulated_background(800, 300))
+        draw_vehicles(frame, rng)
+        return canvas.compose(camera_frames)
+
+    return pooled
+
+
+def measure(step, frames):
+    rng = np.random.default_rng(0)
+    camera_frames = [np.random.default_rng(i).integers(0, 255, (480, 640, 3), dtype=np.uint8) for i in range(2)]
+    for _ in range(10):
+        step(camera_frames, rng)
+
+    tracemalloc.start()
+    start_current, _ = tracemalloc.get_traced_memory()
+    allocated = 0
+    started = time.perf_counter()
+    for _ in range(frames):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step(camera_frames, rng)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    elapsed = time.perf_counter() - started
+    end_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'ms_per_frame': elapsed / frames * 1000,
+        'kib_allocated_per_frame': allocated / frames / 1024,
+        'heap_growth_kib': (end_current - start_current) / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'path':>9} {'ms/frame':>9} {'KiB alloc/frame':>16} {'heap growth KiB':>16}")
+    for name, step in (('unpooled', unpooled), ('pooled', make_pooled())):
+        r = measure(step, args.frames)
+        print(f"{name:>9} {r['ms_per_frame']:>9.3f} {r['kib_allocated_per_frame']:>16.1f} {r['heap_growth_kib']:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
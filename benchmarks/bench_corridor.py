@@ -0,0 +1,165 @@
+"""Corridor coordination cost on city grids against the control tick.
+
+Lays out square grids of junctions at --spacing metres with lightly jittered
+positions and synthetic readings, then times, for each size: building the
+spatial index, links and corridors; one measurement round over every
+junction; a full solve of cycles, splits and offsets; and routing an
+emergency vehicle from every junction in turn. The coordinator runs once per
+engine round, so measurement plus solve must fit well inside the tick.
+
+The neighbour queries the build makes are also timed against the same
+queries answered by scanning every junction, which is what the index avoids.
+
+Usage: python benchmarks/bench_corridor.py [--sizes 100,400,1000] [--spacing 400] [--repeat 5]
+                                           [--output results.json]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corridor import CorridorCoordinator, EARTH_RADIUS  # noqa: E402
+from signal_control import make_controller  # noqa: E402
+
+
+class Readings:
+    """Stands in for a junction's state store with a fixed random reading"""
+
+    def __init__(self, rng):
+        counts = rng.integers(0, 15, size=2)
+        queues = np.minimum(counts, rng.integers(0, 8, size=2))
+        self.data = {}
+        for index, prefix in enumerate(('ns', 'sn')):
+            self.data[f'{prefix}_vehicle_count'] = int(counts[index])
+            self.data[f'{prefix}_queue_length'] = int(queues[index])
+            self.data[f'{prefix}_avg_speed'] = float(rng.uniform(1.0, 6.0))
+            self.data[f'{prefix}_emergency'] = False
+
+    def snapshot(self):
+        return self.data
+
+
+class System:
+    def __init__(self, rng):
+        self.state = Readings(rng)
+        self.controller = make_controller('heuristic', now=0.0)
+
+
+class GridJunction:
+    def __init__(self, key, coordinates, rng):
+        self.id = key
+        self.coordinates = coordinates
+        self.system = System(rng)
+
+
+def make_grid(count, spacing, seed):
+    rng = np.random.default_rng(seed)
+    side = int(math.ceil(math.sqrt(count)))
+    step = math.degrees(spacing / EARTH_RADIUS)
+    origin = (13.0, 80.2)
+    junctions = []
+    for index in range(count):
+        row, column = divmod(index, side)
+        jitter = rng.normal(0, step * 0.05, size=2)
+        latitude = origin[0] - row * step + jitter[0]
+        longitude = origin[1] + column * step / math.cos(math.radians(origin[0])) + jitter[1]
+        junctions.append(GridJunction(f'j{index}', [latitude, longitude], rng))
+    return junctions
+
+
+def indexed_neighbours(coordinator, radius):
+    return [coordinator.index.near(x, y, radius) for x, y in coordinator.positions.values()]
+
+
+def scanned_neighbours(coordinator, radius):
+    """The same queries as indexed_neighbours by checking every junction"""
+    found = []
+    for x, y in coordinator.positions.values():
+        near = []
+        for key, (px, py) in coordinator.positions.items():
+            distance = math.hypot(px - x, py - y)
+            if distance <= radius:
+                near.append((key, distance))
+        near.sort(key=lambda item: item[1])
+        found.append(near)
+    return found
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return float(np.median(times) * 1000)
+
+
+def run_size(count, args):
+    junctions = make_grid(count, args.spacing, args.seed)
+    coordinator = CorridorCoordinator(junctions)
+    now = time.time()
+    build_ms = timed(coordinator.build, args.repeat)
+    radius = coordinator.config['link_distance']
+    indexed_ms = timed(lambda: indexed_neighbours(coordinator, radius), args.repeat)
+    scanned_ms = timed(lambda: scanned_neighbours(coordinator, radius), args.repeat)
+    measure_ms = timed(lambda: [coordinator.measure(key) for key in coordinator.junctions], args.repeat)
+    solve_ms = timed(lambda: coordinator.solve(now), args.repeat)
+    keys = list(coordinator.junctions)
+    started = time.perf_counter()
+    hops = 0
+    for key in keys:
+        hops += len(coordinator.priority_route(key, 'NS', now)) - 1
+    route_ms = (time.perf_counter() - started) * 1000 / len(keys)
+    round_ms = measure_ms + solve_ms
+    return {
+        'junctions': count,
+        'corridors': len(coordinator.corridors),
+        'coordinated': sum(len(members) for members in coordinator.corridors),
+        'build_ms': build_ms,
+        'neighbours_indexed_ms': indexed_ms,
+        'neighbours_scanned_ms': scanned_ms,
+        'measure_ms': measure_ms,
+        'solve_ms': solve_ms,
+        'round_ms': round_ms,
+        'tick_share': round_ms / (args.tick * 1000),
+        'route_ms': route_ms,
+        'mean_route_hops': hops / len(keys)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,400,1000', help='comma-separated junction counts')
+    parser.add_argument('--spacing', type=float, default=400.0, help='grid spacing in metres')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tick', type=float, default=2.0, help='control tick the round must fit in, seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    print(f"{'junctions':>9} {'corridors':>9} {'build ms':>9} {'index ms':>9} {'scan ms':>9} {'measure ms':>10} "
+          f"{'solve ms':>9} {'round ms':>9} {'% tick':>7} {'route ms':>9} {'hops':>5}")
+    results = []
+    for count in (int(size) for size in args.sizes.split(',')):
+        result = run_size(count, args)
+        results.append(result)
+        print(f"{count:>9} {result['corridors']:>9} {result['build_ms']:>9.1f} "
+              f"{result['neighbours_indexed_ms']:>9.1f} {result['neighbours_scanned_ms']:>9.1f} "
+              f"{result['measure_ms']:>10.1f} "
+              f"{result['solve_ms']:>9.1f} {result['round_ms']:>9.1f} {result['tick_share']:>7.1%} "
+              f"{result['route_ms']:>9.3f} {result['mean_route_hops']:>5.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'args': vars(args),
+                       'results': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
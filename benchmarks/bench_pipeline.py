@@ -0,0 +1,267 @@
+"""End-to-end benchmark of the processing pipeline and the HTTP endpoints.
+
+Runs each stage on synthetic frames from the seeded simulator, or on a
+recorded video with --video, and reports p50/p95/p99 latency, throughput and
+RSS per stage. Stages:
+
+  capture          next frame from the simulator or the video
+  process_frame    DirectionalCameraProcessor.process_frame
+  tracker_update   VehicleTracker.update on the processor's detections
+  produce          one camera FrameProducer cycle with no viewers attached
+  combined_frame   SmartTrafficSystem.get_combined_frame
+  jpeg_encode      cv2.imencode of the combined frame
+  variant_encode   VariantEncoder re-encode of a new packet at 320px, q50
+  process_frames   one junction tick: readings, signal logic, state publish
+  GET <endpoint>   Flask test client requests, including a 304 revalidation
+
+--output saves the results as JSON; --compare takes an earlier JSON file,
+prints the p95 change per stage and exits non-zero when a stage got slower
+than --tolerance allows.
+
+Usage: python benchmarks/bench_pipeline.py [--iterations 300] [--video clip.mp4]
+                                           [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_mib():
+    """Current resident set size"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return peak_rss_mib()
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def measure(name, fn, iterations, warmup):
+    for _ in range(warmup):
+        fn()
+    rss_before = rss_mib()
+    timings = np.empty(iterations)
+    for index in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings[index] = time.perf_counter() - started
+    timings *= 1000
+    result = {
+        'stage': name,
+        'iterations': iterations,
+        'mean_ms': float(timings.mean()),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'max_ms': float(timings.max()),
+        'throughput_per_s': float(iterations / (timings.sum() / 1000)) if timings.sum() > 0 else 0.0,
+        'rss_mib': rss_mib(),
+        'rss_delta_mib': rss_mib() - rss_before
+    }
+    print(f"{name:<28} {result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+          f"{result['throughput_per_s']:>10.1f} {result['rss_mib']:>8.1f}")
+    return result
+
+
+class VideoFrames:
+    """Frames of a recorded video, rewinding at the end"""
+
+    def __init__(self, path):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise SystemExit(f"cannot open video {path}")
+
+    def __call__(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return frame
+
+
+def write_config(args):
+    """Single-junction config for the app: the video as both cameras, or simulated cameras"""
+    source = os.path.abspath(args.video) if args.video else None
+    config = {
+        'junctions': [{'id': 'bench', 'name': 'Benchmark',
+                       'cameras': {'NS': {'source': source}, 'SN': {'source': source}}}],
+        'simulation': {'scenario': args.scenario, 'seed': args.seed}
+    }
+    handle, path = tempfile.mkstemp(suffix='.json', prefix='bench-config-')
+    with os.fdopen(handle, 'w') as f:
+        json.dump(config, f)
+    return path
+
+
+def metadata(args):
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                  capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        revision = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'source': args.video or f"simulator:{args.scenario}:{args.seed}",
+        'iterations': args.iterations
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print the p95 change per stage against a saved run; True when nothing regressed"""
+    with open(baseline_path) as f:
+        baseline = {stage['stage']: stage for stage in json.load(f)['stages']}
+    ok = True
+    print(f"\nagainst {baseline_path} (p95, tolerance {tolerance:.0%})")
+    for stage in results['stages']:
+        previous = baseline.get(stage['stage'])
+        if previous is None or previous['p95_ms'] <= 0:
+            continue
+        change = stage['p95_ms'] / previous['p95_ms'] - 1
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f"{stage['stage']:<28} {previous['p95_ms']:>8.3f} -> {stage['p95_ms']:>8.3f} "
+              f"{change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--video', help='recorded video to use instead of simulated frames')
+    parser.add_argument('--scenario', default='rush_hour')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown, 0.2 = 20%%')
+    args = parser.parse_args()
+
+    os.environ['TRAFFIC_CONFIG'] = write_config(args)
+    os.environ.pop('TRAFFIC_SIM_SEED', None)
+    os.environ['TRAFFIC_WORKER_MODE'] = 'thread'
+
+    import logging
+    import app as traffic_app
+    from inference import get_inference_engine
+    from processor import DirectionalCameraProcessor
+    from simulator import TrafficSimulator
+    from tracker import VehicleTracker
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rss_start = rss_mib()
+    system = traffic_app.traffic_system
+    if args.video:
+        frames = VideoFrames(args.video)
+    else:
+        simulator = TrafficSimulator(args.scenario, seed=args.seed, stream='bench')
+
+        def frames():
+            simulator.run(1 / 15)
+            return simulator.observe('NS')[1]
+
+    # Wait for the model here so the timed frames never fall back to simulated detections
+    processor = DirectionalCameraProcessor(0, 'bench', engine=get_inference_engine(), seed=args.seed)
+    tracker = VehicleTracker()
+    detections = []
+
+    def process():
+        data, _ = processor.process_frame(frames(), annotate=False)
+        detections.append(data['detections'])
+
+    replay = {'index': 0}
+
+    def track():
+        # Replays the processor's detections in order
+        tracker.update(detections[replay['index'] % len(detections)])
+        replay['index'] += 1
+
+    combined = {}
+
+    def compose():
+        combined['frame'] = system.get_combined_frame()
+
+    def encode_variant():
+        packet = system.stream_producer.produce_once()
+        system.encoder.encode('combined', packet, quality=50, width=320)
+
+    client = traffic_app.app.test_client()
+    etag = {}
+
+    def revalidate():
+        response = client.get('/traffic_data', headers={'If-None-Match': etag['traffic']})
+        assert response.status_code == 304
+
+    def video_feed():
+        response = client.get('/video_feed?fps=30')
+        next(iter(response.response))
+        response.close()
+
+    print(f"{'stage':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ops/s':>10} {'RSS MiB':>8}")
+    n, w = args.iterations, args.warmup
+    stages = [
+        measure('capture', frames, n, w),
+        measure('process_frame', process, n, w),
+        measure('tracker_update', track, n, w),
+        measure('produce', system.ns_producer.produce_once, n, w),
+        measure('combined_frame', compose, n, w),
+        measure('jpeg_encode', lambda: cv2.imencode('.jpg', combined['frame'], [cv2.IMWRITE_JPEG_QUALITY, 80]), n, w),
+        measure('variant_encode', encode_variant, n, w),
+        measure('process_frames', system.process_frames, n, w),
+        measure('GET /traffic_data', lambda: client.get('/traffic_data'), n, w),
+    ]
+    etag['traffic'] = client.get('/traffic_data').headers['ETag']
+    stages += [
+        measure('GET /traffic_data (304)', revalidate, n, w),
+        measure('GET /dashboard_data', lambda: client.get('/dashboard_data'), n, w),
+        measure('GET /camera_status', lambda: client.get('/camera_status'), n, w),
+        measure('GET /junctions', lambda: client.get('/junctions'), n, w),
+    ]
+    # Streaming needs the producers running; each request waits for its first frame
+    traffic_app.junction_engine.start()
+    stages.append(measure('GET /video_feed first frame', video_feed, max(1, n // 10), 2))
+    traffic_app.junction_engine.stop()
+
+    results = {
+        'meta': metadata(args),
+        'rss_mib': {'start': rss_start, 'end': rss_mib(), 'peak': peak_rss_mib()},
+        'stages': stages
+    }
+    print(f"\nRSS {results['rss_mib']['start']:.1f} -> {results['rss_mib']['end']:.1f} MiB, "
+          f"peak {results['rss_mib']['peak']:.1f} MiB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+    os.unlink(os.environ['TRAFFIC_CONFIG'])
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Offline run of the detection pipeline against the seeded traffic simulator.
+
+Renders both approaches at --fps simulated frames per second, feeds them
+through DirectionalCameraProcessor and compares its counts with the
+simulator's ground truth. The signal follows a fixed --cycle. Reports the
+speed-up over real time, per-frame pipeline cost, count error, throughput
+and waits, and a digest of the ground truth: two runs with the same seed and
+scenario print the same digest.
+
+Usage: python benchmarks/bench_simulation.py [--scenario rush_hour] [--seed 0] [--minutes 10]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import get_inference_engine
+from processor import DirectionalCameraProcessor
+from simulator import TrafficSimulator, SCENARIOS, DIRECTIONS, stream_seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scenario', default='rush_hour', choices=sorted(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--minutes', type=float, default=10)
+    parser.add_argument('--fps', type=float, default=2, help='simulated frames per second fed to the pipeline')
+    parser.add_argument('--cycle', type=float, default=30, help='fixed green time per direction in seconds')
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=300)
+    args = parser.parse_args()
+
+    simulator = TrafficSimulator({'scenario': args.scenario, 'resolution': [args.width, args.height]},
+                                 seed=args.seed, stream='bench')
+    engine = get_inference_engine()
+    processors = {direction: DirectionalCameraProcessor(index, direction, engine=engine,
+                                                        seed=stream_seed(args.seed, direction))
+                  for index, direction in enumerate(DIRECTIONS)}
+    digest = hashlib.sha1()
+    timings, errors = [], []
+    interval = 1.0 / args.fps
+    frames = int(args.minutes * 60 * args.fps)
+
+    start_clock = simulator.clock
+    started = time.perf_counter()
+    for _ in range(frames):
+        simulator.set_signal(DIRECTIONS[int(simulator.clock // args.cycle) % 2])
+        simulator.run(interval)
+        for direction, processor in processors.items():
+            truth, frame = simulator.observe(direction)
+            digest.update(truth['detections'].tobytes())
+            frame_started = time.perf_counter()
+            data, _ = processor.process_frame(frame, annotate=False)
+            timings.append(time.perf_counter() - frame_started)
+            errors.append(abs(data['vehicle_count'] - truth['vehicle_count']))
+    elapsed = time.perf_counter() - started
+
+    timings = np.array(timings) * 1000
+    summary = simulator.summary()
+    simulated = summary['clock'] - start_clock
+    print(f"scenario {args.scenario} seed {args.seed}: {simulated:.0f} simulated s in {elapsed:.2f} s "
+          f"({simulated / elapsed:.0f}x real time)")
+    print(f"pipeline: {len(timings)} frames, mean {timings.mean():.2f} ms, p95 {np.percentile(timings, 95):.2f} ms, "
+          f"model {'loaded' if processors['NS'].model_loaded else 'simulated'}")
+    print(f"vehicle count error vs ground truth: mean {np.mean(errors):.2f}, max {max(errors)}")
+    for direction in DIRECTIONS:
+        stats = summary[direction]
+        print(f"{direction}: arrived {stats['arrived']}, crossed {stats['crossed']}, "
+              f"emergencies {stats['emergencies']}, mean wait {stats['mean_wait']:.1f} s")
+    print(f"ground truth digest {digest.hexdigest()[:16]}")
+
+
+if __name__ == '__main__':
+    main()
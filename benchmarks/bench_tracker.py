@@ -0,0 +1,62 @@
+"""Per-frame VehicleTracker.update cost at different scene sizes.
+
+Usage: python benchmarks/bench_tracker.py [--frames 200] [--seed 0]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracker import VehicleTracker
+
+
+def synthetic_scene(count, frames, rng, width=1920, height=1080):
+    """Boxes drifting across the frame, with a few vehicles entering and leaving"""
+    positions = rng.uniform([0, 0], [width, height], size=(count, 2))
+    velocity = rng.uniform(-4, 4, size=(count, 2))
+    sizes = rng.uniform([30, 20], [80, 50], size=(count, 2))
+    for _ in range(frames):
+        positions += velocity + rng.normal(0, 0.5, size=(count, 2))
+        positions %= (width, height)
+        visible = rng.random(count) > 0.05
+        boxes = np.concatenate([positions, positions + sizes], axis=1)[visible]
+        yield boxes.astype(np.int32)
+
+
+def run(count, frames, seed):
+    rng = np.random.default_rng(seed)
+    scene = list(synthetic_scene(count, frames, rng))
+    tracker = VehicleTracker()
+    timings = []
+    for boxes in scene:
+        started = time.perf_counter()
+        tracker.update(boxes)
+        timings.append(time.perf_counter() - started)
+    timings = np.array(timings[5:]) * 1000
+    return {
+        'objects': count,
+        'mean_ms': float(timings.mean()),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'tracks': len(tracker),
+        'ids_issued': tracker.next_id
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'objects':>8} {'mean ms':>9} {'p95 ms':>9} {'tracks':>7} {'ids':>7}")
+    for count in (10, 100, 1000):
+        r = run(count, args.frames, args.seed)
+        print(f"{r['objects']:>8} {r['mean_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['tracks']:>7} {r['ids_issued']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""Load test of concurrent stream viewers: threaded Flask server vs. the asyncio server.
+
+Starts the app in each serving mode on simulated cameras, then ramps the
+number of concurrent /video_feed viewers while a fixed set of pollers hits
+/traffic_data once a second. For every level it reports the frame rate each
+viewer actually received, the time to first frame, polling latency, and the
+server's thread count, CPU and RSS. A level is sustained when the median
+viewer gets at least --min-ratio of the requested fps and the p95 poll stays
+under --max-latency; the summary prints the highest sustained level per mode.
+
+All viewers and pollers run in this process on one event loop, so the client
+side costs one thread however many connections it holds. Client and server
+share the machine's CPUs; run on an otherwise idle machine.
+
+Usage: python benchmarks/bench_viewers.py [--levels 10,25,50,100,200,400] [--duration 10]
+                                          [--fps 10] [--width 320] [--modes threaded,asgi]
+                                          [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    # Same app and routes; only the serving layer differs
+    'threaded': "import app; app.start_services(); "
+                "app.app.run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)",
+    'asgi': "import asgi; asgi.serve('127.0.0.1', {port}, builtin={builtin})"
+}
+
+
+def write_config(args):
+    config = {
+        'junctions': [{'id': 'bench', 'name': 'Benchmark',
+                       'cameras': {'NS': {'source': None}, 'SN': {'source': None}}}],
+        'simulation': {'scenario': args.scenario, 'seed': args.seed}
+    }
+    handle, path = tempfile.mkstemp(suffix='.json', prefix='bench-config-')
+    with os.fdopen(handle, 'w') as f:
+        json.dump(config, f)
+    return path
+
+
+def start_server(mode, args, config_path):
+    env = dict(os.environ, TRAFFIC_CONFIG=config_path)
+    code = SERVERS[mode].format(port=args.port, builtin=not args.uvicorn)
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{mode} server exited with {process.returncode}")
+        try:
+            status, _ = asyncio.run(poll_once(args.port, '/traffic_data'))
+            if status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise SystemExit(f"{mode} server did not come up")
+
+
+def process_stats(pid):
+    """Thread count, CPU seconds and RSS of a process from /proc"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            status = dict(line.split(':', 1) for line in f if ':' in line)
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        return {'threads': int(status['Threads']),
+                'cpu_seconds': (int(fields[11]) + int(fields[12])) / ticks,
+                'rss_mib': int(status['VmRSS'].split()[0]) / 1024}
+    except (OSError, KeyError, IndexError):
+        return {'threads': None, 'cpu_seconds': None, 'rss_mib': None}
+
+
+async def poll_once(port, path):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        head = await reader.readline()
+        await reader.read()
+        return int(head.split()[1]), time.perf_counter() - started
+    finally:
+        writer.close()
+
+
+async def viewer(port, path, stop, result):
+    """One MJPEG client counting the frames it receives"""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        result['error'] = 'connect'
+        return
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        tail = b''
+        while not stop.is_set():
+            try:
+                data = await asyncio.wait_for(reader.read(65536), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            if not data:
+                result['error'] = 'closed'
+                break
+            data = tail + data
+            frames = data.count(b'--frame\r\n')
+            if frames:
+                if result['first_frame'] is None:
+                    result['first_frame'] = time.perf_counter() - started
+                result['frames'] += frames
+            tail = data[-9:]
+    except OSError:
+        result['error'] = 'reset'
+    finally:
+        writer.close()
+
+
+async def poller(port, path, stop, latencies, errors):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            status, latency = await asyncio.wait_for(poll_once(port, path), 10)
+            if status == 200:
+                latencies.append(latency)
+            else:
+                errors.append(status)
+        except (OSError, asyncio.TimeoutError):
+            errors.append('timeout')
+        await asyncio.sleep(max(0.0, 1.0 - (time.perf_counter() - started)))
+
+
+async def run_level(args, pid, viewers):
+    stop = asyncio.Event()
+    path = f"/video_feed?fps={args.fps}&w={args.width}"
+    results = [{'frames': 0, 'first_frame': None, 'error': None} for _ in range(viewers)]
+    latencies, poll_errors = [], []
+    tasks = [asyncio.ensure_future(viewer(args.port, path, stop, result)) for result in results]
+    tasks += [asyncio.ensure_future(poller(args.port, '/traffic_data', stop, latencies, poll_errors))
+              for _ in range(args.pollers)]
+
+    # Let every viewer connect and reach steady state before measuring
+    await asyncio.sleep(args.warmup)
+    frames_before = [result['frames'] for result in results]
+    latencies.clear()
+    before = process_stats(pid)
+    started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - started
+    after = process_stats(pid)
+    fps = np.array([(result['frames'] - count) / elapsed for result, count in zip(results, frames_before)])
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    first = [result['first_frame'] for result in results if result['first_frame'] is not None]
+    cpu = None
+    if before['cpu_seconds'] is not None and after['cpu_seconds'] is not None:
+        cpu = (after['cpu_seconds'] - before['cpu_seconds']) / elapsed * 100
+    return {
+        'viewers': viewers,
+        'fps_p50': float(np.median(fps)),
+        'fps_p5': float(np.percentile(fps, 5)),
+        'first_frame_p95_ms': float(np.percentile(first, 95) * 1000) if first else None,
+        'viewer_errors': sum(1 for result in results if result['error']),
+        'poll_p50_ms': float(np.percentile(latencies, 50) * 1000) if latencies else None,
+        'poll_p95_ms': float(np.percentile(latencies, 95) * 1000) if latencies else None,
+        'poll_errors': len(poll_errors),
+        'server_threads': after['threads'],
+        'server_cpu_percent': cpu,
+        'server_rss_mib': after['rss_mib']
+    }
+
+
+def sustained(level, args):
+    return (level['fps_p50'] >= args.fps * args.min_ratio and not level['viewer_errors']
+            and level['poll_p95_ms'] is not None and level['poll_p95_ms'] <= args.max_latency * 1000)
+
+
+def fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def run_mode(mode, args, config_path):
+    print(f"\n{mode}")
+    print(f"{'viewers':>8} {'fps p50':>8} {'fps p5':>7} {'first p95':>10} {'poll p50':>9} {'poll p95':>9} "
+          f"{'errors':>7} {'threads':>8} {'cpu %':>7} {'rss MiB':>8}")
+    process = start_server(mode, args, config_path)
+    levels = []
+    try:
+        failures = 0
+        for viewers in args.levels:
+            level = asyncio.run(run_level(args, process.pid, viewers))
+            level['sustained'] = sustained(level, args)
+            levels.append(level)
+            print(f"{viewers:>8} {level['fps_p50']:>8.1f} {level['fps_p5']:>7.1f} "
+                  f"{fmt(level['first_frame_p95_ms'], '>10.0f')} {fmt(level['poll_p50_ms'], '>9.1f')} "
+                  f"{fmt(level['poll_p95_ms'], '>9.1f')} {level['viewer_errors'] + level['poll_errors']:>7} "
+                  f"{fmt(level['server_threads'], '>8')} {fmt(level['server_cpu_percent'], '>7.0f')} "
+                  f"{fmt(level['server_rss_mib'], '>8.0f')}{'' if level['sustained'] else '  *'}")
+            failures = 0 if level['sustained'] else failures + 1
+            if failures >= 2 and not args.keep_going:
+                break
+            time.sleep(args.cooldown)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    supported = max((level['viewers'] for level in levels if level['sustained']), default=0)
+    return {'mode': mode, 'levels': levels, 'supported_viewers': supported}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='threaded,asgi')
+    parser.add_argument('--levels', default='10,25,50,100,200,400',
+                        help='comma-separated concurrent viewer counts')
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds per level')
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--cooldown', type=float, default=2.0)
+    parser.add_argument('--fps', type=float, default=10, help='fps each viewer asks for')
+    parser.add_argument('--width', type=int, default=320, help='stream width each viewer asks for')
+    parser.add_argument('--pollers', type=int, default=20, help='clients polling /traffic_data every second')
+    parser.add_argument('--min-ratio', type=float, default=0.8,
+                        help='fraction of the requested fps the median viewer must get')
+    parser.add_argument('--max-latency', type=float, default=0.5, help='p95 poll latency limit in seconds')
+    parser.add_argument('--keep-going', action='store_true', help="don't stop a mode after two failed levels")
+    parser.add_argument('--uvicorn', action='store_true', help='serve the asgi mode with uvicorn')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--scenario', default='rush_hour')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+    args.levels = [int(level) for level in args.levels.split(',')]
+
+    # Every viewer is a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, 65536) if hard > 0 else 65536, hard))
+    except (ValueError, OSError):
+        pass
+
+    config_path = write_config(args)
+    try:
+        results = [run_mode(mode, args, config_path) for mode in args.modes.split(',')]
+    finally:
+        os.unlink(config_path)
+
+    print(f"\nhighest sustained level (median >= {args.min_ratio:.0%} of {args.fps:g} fps, "
+          f"poll p95 <= {args.max_latency * 1000:.0f} ms):")
+    for result in results:
+        print(f"  {result['mode']:<10} {result['supported_viewers']} viewers")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'cpus': os.cpu_count(),
+                       'args': {key: value for key, value in vars(args).items()}, 'modes': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
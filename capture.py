@@ -0,0 +1,417 @@
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+import logging
+
+import cv2
+import numpy as np
+
+from metrics import CAMERA_READ_FAILURES, CAMERA_RECONNECTS, CAPTURE_FPS, CAPTURE_STALENESS
+
+logger = logging.getLogger(__name__)
+
+CONNECTING = 'connecting'
+ACTIVE = 'active'
+RECONNECTING = 'reconnecting'
+STOPPED = 'stopped'
+
+
+def normalize_source(source):
+    """Device indices may come from JSON or the environment as strings"""
+    if isinstance(source, str) and source.strip().isdigit():
+        return int(source)
+    return source
+
+
+def source_kind(source):
+    source = normalize_source(source)
+    if isinstance(source, int):
+        return 'device'
+    if '://' in source:
+        return 'stream'
+    if os.path.isdir(source):
+        return 'images'
+    return 'file'
+
+
+def capture_backends(source):
+    """OpenCV backends worth trying for a source on this platform, most specific first"""
+    kind = source_kind(source)
+    if kind == 'device':
+        if sys.platform.startswith('win'):
+            return [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_ANY]
+        if sys.platform == 'darwin':
+            return [cv2.CAP_AVFOUNDATION, cv2.CAP_ANY]
+        return [cv2.CAP_V4L2, cv2.CAP_ANY]
+    if kind == 'stream':
+        return [cv2.CAP_FFMPEG, cv2.CAP_ANY]
+    return [cv2.CAP_ANY]
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+# Source kinds read on a DecoderPool; devices and streams block in read(), so they keep their own thread
+POOLED_KINDS = ('file', 'images')
+
+
+class ImageDirectoryCapture:
+    """cv2.VideoCapture look-alike over the images of a directory, in file name order"""
+
+    def __init__(self, path, fps=15):
+        self.path = path
+        self.fps = fps
+        self.files = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.position = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self, image=None):
+        while self.position < len(self.files):
+            frame = cv2.imread(self.files[self.position])
+            self.position += 1
+            if frame is not None:
+                if image is not None and image.shape == frame.shape:
+                    np.copyto(image, frame)
+                    return True, image
+                return True, frame
+            logger.warning(f"Skipping unreadable image {self.files[self.position - 1]}")
+        return False, None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.files))
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.position * 1000.0 / self.fps
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = max(0, min(len(self.files), int(value)))
+            return True
+        return False
+
+    def release(self):
+        pass
+
+
+def open_capture(source, width=640, height=480, fps=15):
+    """Open a device index, file, image directory or stream URL, or return None"""
+    source = normalize_source(source)
+    kind = source_kind(source)
+    if kind == 'images':
+        capture = ImageDirectoryCapture(source, fps)
+        return capture if capture.isOpened() else None
+    if kind == 'file' and not os.path.exists(source):
+        return None
+    for backend in capture_backends(source):
+        try:
+            capture = cv2.VideoCapture(source, backend)
+        except Exception as e:
+            logger.warning(f"Backend {backend} failed for {source}: {e}")
+            continue
+        if capture.isOpened():
+            if kind == 'device':
+                capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+                capture.set(cv2.CAP_PROP_FPS, fps)
+            # Keep the driver's own queue short, the reader thread drains it anyway
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            logger.info(f"Opened {kind} {source} with backend {backend}")
+            return capture
+        capture.release()
+    return None
+
+
+class CameraCapture:
+    """One reader per source that only ever keeps the newest frame.
+
+    The thread reads as fast as the source delivers, which drains OpenCV's
+    internal queue, so read() never blocks and never returns a backlogged
+    frame. Files are paced at their own frame rate and loop. On failure the
+    source is reopened with exponential backoff instead of being given up.
+    read() mirrors cv2.VideoCapture.read(image=...) so callers can keep using
+    read_into with their frame pools. Given a DecoderPool, recordings (files and
+    image directories) are read on the pool's bounded workers instead of a
+    dedicated thread; live devices and streams always get their own thread.
+    """
+
+    def __init__(self, source, junction=None, camera=None, width=640, height=480, fps=15,
+                 stale_after=2.0, max_backoff=30.0, pool=None):
+        self.source = normalize_source(source)
+        self.kind = source_kind(self.source)
+        self.name = f"{junction or ''}/{camera or self.source}"
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.stale_after = stale_after
+        self.max_backoff = max_backoff
+        self.pool = pool if self.kind in POOLED_KINDS else None
+        self.status = CONNECTING
+        self.measured_fps = 0
+        self.reconnects = 0
+        self.failures = 0
+        self.seq = 0
+        self.last_frame_time = None
+        self._front = None
+        self._back = None
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._capture = None
+        self._backoff = 1.0
+        self._interval = 0.0
+        self._frame_count = 0
+        self._fps_time = time.time()
+        labels = (junction or '', camera or str(self.source))
+        self._failure_counter = CAMERA_READ_FAILURES.labels(*labels)
+        self._reconnect_counter = CAMERA_RECONNECTS.labels(*labels)
+        CAPTURE_FPS.labels(*labels).set_function(lambda: self.measured_fps)
+        CAPTURE_STALENESS.labels(*labels).set_function(
+            lambda: self.staleness if self.staleness is not None else float('nan'))
+
+    def start(self):
+        if self.pool is not None:
+            self._stop.clear()
+            self.pool.submit(self)
+            return self
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self.pool is not None:
+            self.pool.remove(self)
+            self._close()
+        self.status = STOPPED
+
+    release = stop
+
+    def isOpened(self):
+        """True while recent frames are coming in"""
+        return self.status == ACTIVE and not self.stale
+
+    @property
+    def staleness(self):
+        if self.last_frame_time is None:
+            return None
+        return time.time() - self.last_frame_time
+
+    @property
+    def stale(self):
+        staleness = self.staleness
+        return staleness is None or staleness > self.stale_after
+
+    def read(self, image=None):
+        """Newest frame, copied into `image` when its shape fits; (False, None) when stale"""
+        with self._lock:
+            if self._front is None or self.stale:
+                return False, None
+            if image is not None and image.shape == self._front.shape:
+                np.copyto(image, self._front)
+                return True, image
+            return True, self._front.copy()
+
+    def wait_for(self, after_seq, timeout=1.0):
+        """Block until a frame newer than after_seq arrives, return its seq or None"""
+        with self._lock:
+            self._lock.wait_for(lambda: self.seq > after_seq, timeout)
+            return self.seq if self.seq > after_seq else None
+
+    def stats(self):
+        staleness = self.staleness
+        return {
+            'source': str(self.source),
+            'kind': self.kind,
+            'status': self.status,
+            'fps': self.measured_fps,
+            'staleness': round(staleness, 3) if staleness is not None else None,
+            'reconnects': self.reconnects,
+            'failures': self.failures
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self.step()
+            if delay is None:
+                break
+            if delay > 0:
+                self._stop.wait(delay)
+        self._close()
+
+    def _close(self):
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def step(self):
+        """One open or read attempt; returns the seconds until the next step, None once stopped"""
+        if self._stop.is_set():
+            return None
+        if self._capture is None:
+            self._capture = open_capture(self.source, self.width, self.height, self.fps)
+            if self._capture is None:
+                self.status = RECONNECTING
+                self.failures += 1
+                self._failure_counter.inc()
+                logger.warning(f"Capture {self.name} unavailable, retrying in {self._backoff:.0f}s")
+                return self._back_off()
+            if self.status == RECONNECTING:
+                self.reconnects += 1
+                self._reconnect_counter.inc()
+            self.status = ACTIVE
+            self._interval = 1.0 / self.fps if self.kind == 'device' else 0.0
+            if self.kind in ('file', 'images'):
+                # Replay recordings at their recorded rate rather than as fast as they decode
+                file_fps = self._capture.get(cv2.CAP_PROP_FPS)
+                self._interval = 1.0 / file_fps if 0 < file_fps < 240 else 1.0 / self.fps
+
+        started = time.time()
+        capture = self._capture
+        ret, frame = capture.read(self._back) if self._back is not None else capture.read()
+        if not ret or frame is None:
+            if self.kind in ('file', 'images') and capture.get(cv2.CAP_PROP_POS_FRAMES) > 0:
+                # End of a recording: start over
+                capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                return 0.0
+            self.failures += 1
+            self._failure_counter.inc()
+            logger.warning(f"Capture {self.name} read failed, reconnecting in {self._backoff:.0f}s")
+            self._close()
+            self.status = RECONNECTING
+            return self._back_off()
+        self._backoff = 1.0
+
+        with self._lock:
+            # Double buffering: the frame just read becomes the front, the old front is read into next
+            self._back, self._front = self._front, frame
+            if self._back is not None and self._back.shape != frame.shape:
+                self._back = None
+            self.seq += 1
+            self.last_frame_time = time.time()
+            self._lock.notify_all()
+
+        self._frame_count += 1
+        current_time = time.time()
+        if current_time - self._fps_time >= 1.0:
+            self.measured_fps = self._frame_count
+            self._frame_count = 0
+            self._fps_time = current_time
+
+        return max(0.0, self._interval - (time.time() - started))
+
+    def _back_off(self):
+        delay = self._backoff
+        self._backoff = min(self.max_backoff, self._backoff * 2)
+        return delay
+
+
+class DecoderPool:
+    """Bounded set of decoder threads shared by any number of sources.
+
+    A job is anything with step() returning the seconds until it wants to run
+    again, or None when it is finished. Workers always take the job that is
+    due soonest and a job never runs on two workers at once, so a few threads
+    serve many recordings. Live cameras block in read() until their next
+    frame, which would tie up a worker each, so CameraCapture keeps them off
+    the pool.
+    """
+
+    def __init__(self, workers=4, name='decoder'):
+        self.workers = workers
+        self.name = name
+        self.lag = 0.0
+        self.steps = 0
+        self._heap = []
+        self._jobs = {}
+        self._running = set()
+        self._tokens = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def submit(self, job, delay=0.0):
+        with self._cond:
+            if job in self._jobs:
+                return
+            token = next(self._tokens)
+            self._jobs[job] = token
+            heapq.heappush(self._heap, (time.time() + delay, token, job))
+            if not self._threads:
+                for index in range(self.workers):
+                    thread = threading.Thread(target=self._work, name=f"{self.name}-{index}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            self._cond.notify()
+
+    def remove(self, job, timeout=5.0):
+        """Unschedule a job and wait until no worker is running it"""
+        with self._cond:
+            self._jobs.pop(job, None)
+            self._cond.wait_for(lambda: job not in self._running, timeout)
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    def stats(self):
+        return {'workers': self.workers, 'jobs': len(self._jobs), 'running': len(self._running),
+                'steps': self.steps, 'lag_ms': round(self.lag * 1000, 2)}
+
+    def _next_job(self):
+        with self._cond:
+            while not self._closed:
+                # Entries of removed or resubmitted jobs are dropped lazily
+                while self._heap and self._jobs.get(self._heap[0][2]) != self._heap[0][1]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, token, job = self._heap[0]
+                wait = due - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                self._running.add(job)
+                # Exponential average of how late jobs start, a saturation signal
+                self.lag = 0.95 * self.lag + 0.05 * -wait
+                return job, token
+            return None, None
+
+    def _work(self):
+        while True:
+            job, token = self._next_job()
+            if job is None:
+                return
+            try:
+                delay = job.step()
+            except Exception as e:
+                logger.error(f"Decoder job {job} failed: {e}")
+                delay = 1.0
+            with self._cond:
+                self._running.discard(job)
+                self.steps += 1
+                if delay is None:
+                    if self._jobs.get(job) == token:
+                        del self._jobs[job]
+                elif self._jobs.get(job) == token:
+                    heapq.heappush(self._heap, (time.time() + delay, token, job))
+                self._cond.notify_all()
@@ -0,0 +1,27 @@
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG_PATH = os.path.join(current_dir, 'traffic_config.json')
+
+
+def load_config(path=None):
+    """Load the deployment config (TRAFFIC_CONFIG or traffic_config.json), empty if there is none"""
+    path = path or os.environ.get('TRAFFIC_CONFIG', DEFAULT_CONFIG_PATH)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            config = json.load(f)
+        logger.info(f"Loaded config from {path}")
+        return config
+    except Exception as e:
+        logger.error(f"Failed to load config {path}: {e}")
+        return {}
+
+
+def camera_config(config, direction):
+    return config.get('cameras', {}).get(direction, {})
@@ -0,0 +1,316 @@
+import math
+import threading
+import time
+import logging
+from collections import defaultdict, deque
+
+import numpy as np
+
+from signal_control import DIRECTIONS, MIN_GREEN_TIME
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371000.0
+
+DEFAULT_CORRIDOR = {
+    # Junctions further apart than this aren't coordinated; platoons disperse
+    'link_distance': 1500.0,
+    # Webster cycle bounds and the lost time per phase change it assumes
+    'min_cycle': 40.0,
+    'max_cycle': 120.0,
+    'lost_time': 4.0,
+    'saturation_flow': 1.0,
+    # Seconds between re-solving cycles and offsets; plans stay fixed in between
+    'replan_interval': 60.0,
+    # Speed used until a junction has measured one, and the plausible range, m/s
+    'design_speed': 11.0,
+    'speed_range': [2.0, 25.0],
+    'smoothing': 0.2,
+    # Converts readings (px/frame over a view_length px view of view_meters) to flows and m/s
+    'view_length': 800.0,
+    'view_meters': 120.0,
+    'frame_rate': 15.0,
+    # Emergency priority: how far ahead along the route, how fast, and the green window around the ETA
+    'priority_hops': 6,
+    'priority_distance': 5000.0,
+    'emergency_speedup': 1.3,
+    'priority_lead': 10.0,
+    'priority_clear': 10.0
+}
+
+
+def project(coordinates, origin_lat):
+    """Equirectangular projection of (lat, lon) to metres: x east, y north"""
+    lat, lon = map(math.radians, coordinates)
+    return (EARTH_RADIUS * lon * math.cos(math.radians(origin_lat)), EARTH_RADIUS * lat)
+
+
+class SpatialIndex:
+    """Uniform grid of points; a radius query only visits the cells the radius overlaps"""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self.points = {}
+
+    def _cell(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def insert(self, key, x, y):
+        self.points[key] = (x, y)
+        self.cells[self._cell(x, y)].append(key)
+
+    def near(self, x, y, radius):
+        """(key, distance) of every point within radius, nearest first"""
+        cx, cy = self._cell(x, y)
+        reach = int(math.ceil(radius / self.cell_size))
+        found = []
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                for key in self.cells.get((i, j), ()):
+                    px, py = self.points[key]
+                    distance = math.hypot(px - x, py - y)
+                    if distance <= radius:
+                        found.append((key, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+
+class CorridorPlan:
+    """Fixed-cycle timing of one coordinated junction: NS green starts at offset + k * cycle"""
+
+    def __init__(self, corridor, cycle, offset, ns_green):
+        self.corridor = corridor
+        self.cycle = cycle
+        self.offset = offset
+        self.ns_green = ns_green
+
+    def phase_at(self, now):
+        """Phase the plan wants at `now` and the seconds it has left"""
+        position = (now - self.offset) % self.cycle
+        if position < self.ns_green:
+            return 'NS', self.ns_green - position
+        return 'SN', self.cycle - position
+
+    def to_dict(self):
+        return {'corridor': self.corridor, 'cycle': round(self.cycle, 1),
+                'offset': round(self.offset % self.cycle, 1), 'ns_green': round(self.ns_green, 1)}
+
+
+class CorridorCoordinator:
+    """Green waves along chains of nearby junctions on the same north-south road.
+
+    Every junction links to its nearest neighbour to the north and to the south
+    within link_distance, found through a SpatialIndex, and the connected
+    groups are the corridors. Each replan gives a corridor one Webster cycle
+    from its busiest member's measured flows, per-junction splits from their
+    own flows, and offsets propagated along a spanning tree so the corridor's
+    dominant direction gets its green exactly one measured travel time after
+    the junction upstream. Junctions follow their plan through their signal
+    controller; isolated junctions keep deciding alone.
+
+    Emergency vehicles seen by a junction's camera, or announced through
+    priority_route(), get green at every junction ahead along their route for
+    a window around their estimated arrival.
+    """
+
+    def __init__(self, junctions, options=None):
+        self.config = dict(DEFAULT_CORRIDOR, **(options or {}))
+        self.junctions = {junction.id: junction for junction in junctions}
+        self.flows = {key: np.zeros(len(DIRECTIONS)) for key in self.junctions}
+        self.speeds = {key: np.full(len(DIRECTIONS), self.config['design_speed']) for key in self.junctions}
+        self.positions = {}
+        self.links = defaultdict(dict)
+        self.corridors = []
+        self.plans = {}
+        self.routes = {}
+        self.last_solve = None
+        self.solve_ms = 0.0
+        self._lock = threading.Lock()
+        self.build()
+
+    def build(self):
+        """Project the junctions, index them and derive the links and corridors"""
+        if not self.junctions:
+            return
+        origin = float(np.mean([junction.coordinates[0] for junction in self.junctions.values()]))
+        self.positions = {key: project(junction.coordinates, origin) for key, junction in self.junctions.items()}
+        radius = self.config['link_distance']
+        self.index = SpatialIndex(radius)
+        for key, (x, y) in self.positions.items():
+            self.index.insert(key, x, y)
+
+        # Nearest neighbour to the north and to the south on a mostly north-south bearing
+        for key, (x, y) in self.positions.items():
+            nearest = {}
+            for other, distance in self.index.near(x, y, radius):
+                if other == key:
+                    continue
+                ox, oy = self.positions[other]
+                if abs(oy - y) < abs(ox - x):
+                    continue
+                side = 'north' if oy > y else 'south'
+                nearest.setdefault(side, (other, distance))
+            for other, distance in nearest.values():
+                self.links[key][other] = distance
+                self.links[other][key] = distance
+
+        self.corridors = []
+        seen = set()
+        for key in self.junctions:
+            if key in seen or key not in self.links:
+                continue
+            members, queue = [], deque([key])
+            seen.add(key)
+            while queue:
+                current = queue.popleft()
+                members.append(current)
+                for other in self.links[current]:
+                    if other not in seen:
+                        seen.add(other)
+                        queue.append(other)
+            self.corridors.append(members)
+        logger.info(f"Corridor coordination: {len(self.corridors)} corridors over "
+                    f"{sum(len(c) for c in self.corridors)} of {len(self.junctions)} junctions")
+
+    def measure(self, key):
+        """Fold a junction's latest reading into its smoothed flows (veh/s) and moving speeds (m/s)"""
+        cfg = self.config
+        data = self.junctions[key].system.state.snapshot()
+        flows, speeds = self.flows[key], self.speeds[key]
+        low, high = cfg['speed_range']
+        alpha = cfg['smoothing']
+        for column, direction in enumerate(DIRECTIONS):
+            prefix = direction.lower()
+            count = data.get(f'{prefix}_vehicle_count', 0)
+            speed = data.get(f'{prefix}_avg_speed', 0.0)
+            flow = count * speed * cfg['frame_rate'] / cfg['view_length']
+            flows[column] += alpha * (flow - flows[column])
+            moving = count - data.get(f'{prefix}_queue_length', 0)
+            if moving > 0:
+                metres = speed * count / moving * cfg['frame_rate'] * cfg['view_meters'] / cfg['view_length']
+                speeds[column] += alpha * (min(high, max(low, metres)) - speeds[column])
+        return data
+
+    def travel_time(self, upstream, downstream, column):
+        speed = (self.speeds[upstream][column] + self.speeds[downstream][column]) / 2
+        return float(self.links[upstream][downstream] / speed)
+
+    def solve(self, now):
+        """New cycle, splits and offsets for every corridor"""
+        cfg = self.config
+        started = time.perf_counter()
+        plans = {}
+        lost = 2 * cfg['lost_time']
+        for index, members in enumerate(self.corridors):
+            ratios = np.array([self.flows[key] for key in members]) / cfg['saturation_flow']
+            critical = min(0.9, float(ratios.sum(axis=1).max()))
+            cycle = float(np.clip((1.5 * lost + 5) / (1 - critical), cfg['min_cycle'], cfg['max_cycle']))
+            effective = cycle - lost
+            splits = {}
+            for key, ratio in zip(members, ratios):
+                share = ratio[0] / ratio.sum() if ratio.sum() > 0 else 0.5
+                splits[key] = float(np.clip(lost / 2 + effective * share, MIN_GREEN_TIME, cycle - MIN_GREEN_TIME))
+
+            # Progression favours the direction carrying most traffic along the corridor
+            column = int(ratios.sum(axis=0).argmax())
+            southbound = DIRECTIONS[column] == 'NS'
+            # Offsets are relative, so any member can anchor them; keeping the
+            # same one keeps the corridor's cycle in place across replans
+            root = members[0]
+            previous = self.plans.get(root)
+            if previous is not None:
+                root_offset = previous.offset
+            else:
+                controller = self.junctions[root].system.controller
+                root_offset = controller.phase_started - (0 if controller.phase == 'NS' else splits[root])
+            # Green of the progressed direction starts at offset (NS) or offset + ns_green (SN)
+            starts = {root: root_offset + (0 if column == 0 else splits[root])}
+            queue = deque([root])
+            while queue:
+                current = queue.popleft()
+                for other in self.links[current]:
+                    if other in starts:
+                        continue
+                    downstream = (self.positions[other][1] < self.positions[current][1]) == southbound
+                    travel = self.travel_time(current, other, column) if downstream else \
+                        -self.travel_time(other, current, column)
+                    starts[other] = starts[current] + travel
+                    queue.append(other)
+            for key in members:
+                offset = starts[key] - (0 if column == 0 else splits[key])
+                plans[key] = CorridorPlan(index, cycle, offset, splits[key])
+        self.plans = plans
+        self.last_solve = now
+        self.solve_ms = (time.perf_counter() - started) * 1000
+
+    def route(self, origin, direction):
+        """Junctions ahead of a vehicle leaving `origin` in `direction`, with the distance to each"""
+        cfg = self.config
+        southbound = direction == 'NS'
+        path, travelled, current = [], 0.0, origin
+        while len(path) < cfg['priority_hops']:
+            y = self.positions[current][1]
+            ahead = [(distance, other) for other, distance in self.links.get(current, {}).items()
+                     if (self.positions[other][1] < y) == southbound and other not in path and other != origin]
+            if not ahead:
+                break
+            distance, current = min(ahead)
+            travelled += distance
+            if travelled > cfg['priority_distance']:
+                break
+            path.append(current)
+            yield current, travelled
+
+    def priority_route(self, origin, direction, now=None):
+        """Preempt `origin` and the junctions ahead for an emergency vehicle travelling in `direction`"""
+        if origin not in self.junctions or direction not in DIRECTIONS:
+            raise ValueError(f"no junction {origin} or direction {direction}")
+        cfg = self.config
+        now = time.time() if now is None else now
+        column = DIRECTIONS.index(direction)
+        speed = self.speeds[origin][column] * cfg['emergency_speedup']
+        windows = {origin: {'phase': direction, 'from': now, 'until': now + cfg['priority_clear']}}
+        for key, distance in self.route(origin, direction):
+            eta = now + distance / float(speed)
+            windows[key] = {'phase': direction, 'from': eta - cfg['priority_lead'],
+                            'until': eta + cfg['priority_clear']}
+        with self._lock:
+            self.routes[(origin, direction)] = {'junctions': list(windows), 'until': max(
+                window['until'] for window in windows.values())}
+        for key, window in windows.items():
+            self.junctions[key].system.controller.preempt = window
+        logger.info(f"Emergency priority from {origin} heading {direction}: {len(windows)} junctions")
+        return windows
+
+    def update(self, now=None):
+        """Once per engine round: measure, start routes for detected emergencies, replan when due"""
+        now = time.time() if now is None else now
+        for key in self.junctions:
+            data = self.measure(key)
+            for direction in DIRECTIONS:
+                active = self.routes.get((key, direction))
+                if data.get(f'{direction.lower()}_emergency') and (active is None or active['until'] - now < 5):
+                    self.priority_route(key, direction, now)
+        with self._lock:
+            for route, state in list(self.routes.items()):
+                if state['until'] < now:
+                    del self.routes[route]
+        if self.last_solve is None or now - self.last_solve >= self.config['replan_interval']:
+            self.solve(now)
+            for key, junction in self.junctions.items():
+                junction.system.controller.plan = self.plans.get(key)
+
+    def stats(self):
+        with self._lock:
+            routes = [{'origin': origin, 'direction': direction, 'junctions': state['junctions'],
+                       'until': round(state['until'], 1)} for (origin, direction), state in self.routes.items()]
+        return {
+            'corridors': [{'junctions': members,
+                           'cycle': round(self.plans[members[0]].cycle, 1) if members[0] in self.plans else None,
+                           'offsets': {key: self.plans[key].to_dict()['offset'] for key in members if key in self.plans}}
+                          for members in self.corridors],
+            'priority_routes': routes,
+            'solve_ms': round(self.solve_ms, 3),
+            'last_solve': self.last_solve
+        }
@@ -0,0 +1,145 @@
+import threading
+import time
+import logging
+
+import cv2
+
+from metrics import STAGE_SECONDS, FRAMES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUALITY = 80
+DEFAULT_FPS = 15
+
+
+def parse_stream_options(args, cameras=('combined', 'NS', 'SN')):
+    """Validate /video_feed query parameters, raising ValueError on bad input"""
+    camera = args.get('camera', 'combined')
+    if camera not in cameras:
+        raise ValueError(f"unknown camera {camera}")
+    quality = int(args.get('quality', args.get('q', DEFAULT_QUALITY)))
+    fps = float(args.get('fps', DEFAULT_FPS))
+    width = args.get('width', args.get('w'))
+    height = args.get('height', args.get('h'))
+    width = int(width) if width is not None else None
+    height = int(height) if height is not None else None
+    if not 10 <= quality <= 95:
+        raise ValueError("quality must be between 10 and 95")
+    if not 0.5 <= fps <= 30:
+        raise ValueError("fps must be between 0.5 and 30")
+    for size in (width, height):
+        if size is not None and not 32 <= size <= 1920:
+            raise ValueError("width and height must be between 32 and 1920")
+    return {'camera': camera, 'quality': quality, 'fps': fps, 'width': width, 'height': height}
+
+
+class VariantEncoder:
+    """Encodes each distinct (source, size, quality) variant of a frame at most once.
+
+    All clients asking for the same variant of the same packet share one JPEG.
+    The packet's own JPEG is reused when the variant matches what the producer
+    already encoded.
+    """
+
+    def __init__(self, max_variants=64, junction=None):
+        self.max_variants = max_variants
+        self.junction = junction or ''
+        self._entries = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.encodes = 0
+        self.hits = 0
+
+    def _lock_for(self, key):
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                if len(self._locks) >= 2 * self.max_variants:
+                    # Keys are client-chosen; drop idle locks of variants that aren't cached
+                    self._locks = {k: v for k, v in self._locks.items() if k in self._entries or v.locked()}
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    @staticmethod
+    def target_size(frame, width, height):
+        frame_height, frame_width = frame.shape[:2]
+        if width is None and height is None:
+            return frame_width, frame_height
+        if width is None:
+            width = max(1, round(frame_width * height / frame_height))
+        elif height is None:
+            height = max(1, round(frame_height * width / frame_width))
+        return width, height
+
+    def encode(self, source, packet, quality=DEFAULT_QUALITY, width=None, height=None):
+        frame = packet['frame']
+        size = self.target_size(frame, width, height)
+        native = size == (frame.shape[1], frame.shape[0])
+        if native and quality == DEFAULT_QUALITY and packet.get('jpeg') is not None:
+            self.hits += 1
+            return packet['jpeg']
+
+        key = (source, size, quality)
+        with self._lock_for(key):
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == packet['seq']:
+                self.hits += 1
+                return entry[1]
+            with STAGE_SECONDS.time(stage='variant_encode', junction=self.junction, camera=source):
+                if not native:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ret:
+                return None
+            jpeg = buffer.tobytes()
+            with self._guard:
+                if key not in self._entries and len(self._entries) >= self.max_variants:
+                    # Forget the least recently added variant, and its lock with it
+                    evicted = next(iter(self._entries))
+                    del self._entries[evicted]
+                    self._locks.pop(evicted, None)
+                self._entries[key] = (packet['seq'], jpeg)
+            self.encodes += 1
+            return jpeg
+
+    def stats(self):
+        return {'variants': len(self._entries), 'encodes': self.encodes, 'hits': self.hits}
+
+
+def mjpeg_stream(buffer, encoder, source, running, quality=DEFAULT_QUALITY, width=None,
+                 height=None, fps=DEFAULT_FPS):
+    """MJPEG generator for one client.
+
+    Always jumps to the newest packet, so a slow client skips frames instead of
+    working through a backlog, and paces itself to the requested fps.
+    """
+    interval = 1.0 / fps
+    last_seq = 0
+    dropped = FRAMES_DROPPED.labels('mjpeg')
+    next_frame = time.time()
+
+    with buffer.reader():
+        while running():
+            try:
+                packet = buffer.wait_for(last_seq, timeout=1.0)
+                if packet is None:
+                    continue
+                if last_seq and packet['seq'] > last_seq + 1:
+                    dropped.inc(packet['seq'] - last_seq - 1)
+                last_seq = packet['seq']
+
+                jpeg = encoder.encode(source, packet, quality, width, height)
+                if jpeg is None:
+                    continue
+
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+                next_frame = max(next_frame + interval, time.time())
+                delay = next_frame - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            except Exception as e:
+                logger.error(f"Error in frame generation: {e}")
+                time.sleep(1)
@@ -0,0 +1,246 @@
+"""Offline comparison of signal controllers on recorded or simulated demand.
+
+Every controller drives the same demand through a plant, deciding once per
+--tick seconds on the reading the live system would see, and the run reports
+total and mean delay, throughput, switching and planning cost per controller.
+
+Plants:
+  queue      point queues with saturation flow and lost time per phase change,
+             fed by a demand trace: per-second arrivals per direction from a
+             CSV file (time,NS,SN), or drawn from a simulator scenario
+             (--scenario, --seed) and optionally saved with --save-demand
+  simulator  the vehicle-level TrafficSimulator with the same scenario and seed
+             for every controller
+
+Usage: python evaluate_signals.py [--demand demand.csv | --scenario rush_hour --seed 0] [--minutes 60]
+                                  [--plant queue] [--controllers heuristic,predictive] [--output results.json]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from signal_control import DIRECTIONS, DEFAULT_PREDICTIVE, make_controller, CONTROLLERS
+from simulator import TrafficSimulator, SCENARIOS
+
+
+def load_demand(path):
+    """(seconds, directions) arrivals from a time,NS,SN CSV, binned to whole seconds"""
+    rows = np.genfromtxt(path, delimiter=',', names=True)
+    seconds = np.floor(rows['time'] - rows['time'].min()).astype(int)
+    demand = np.zeros((seconds.max() + 1, len(DIRECTIONS)))
+    for column, direction in enumerate(DIRECTIONS):
+        np.add.at(demand[:, column], seconds, rows[direction])
+    return demand
+
+
+def save_demand(path, demand):
+    np.savetxt(path, np.column_stack([np.arange(len(demand)), demand]), delimiter=',',
+               header='time,' + ','.join(DIRECTIONS), comments='', fmt='%g')
+
+
+class QueuePlant:
+    """Point queues at the stop line behind a free-flowing approach.
+
+    Arrivals travel the camera's view for travel_time seconds, then queue and
+    discharge at saturation_flow while green, except for lost_time after each
+    phase change. Readings use the live units: avg_speed in pixels per frame
+    over a view_length pixel view.
+    """
+
+    def __init__(self, demand, saturation_flow=0.5, lost_time=4.0, travel_time=10,
+                 view_length=800.0, frame_rate=15.0):
+        self.demand = demand
+        self.saturation_flow = saturation_flow
+        self.lost_time = lost_time
+        self.free_speed = view_length / travel_time / frame_rate
+        self.approach = np.zeros((travel_time, len(DIRECTIONS)))
+        self.queue = np.zeros(len(DIRECTIONS))
+        self.clock = 0
+        self.green = 'NS'
+        self.lost_until = 0
+        self.delay = 0.0
+        self.arrived = 0.0
+        self.served = 0.0
+
+    @property
+    def finished(self):
+        return self.clock >= len(self.demand)
+
+    def set_signal(self, green):
+        if green != self.green:
+            self.green = green
+            self.lost_until = self.clock + self.lost_time
+
+    def advance(self, seconds):
+        for _ in range(int(seconds)):
+            if self.finished:
+                return
+            arrivals = self.demand[self.clock]
+            slot = self.clock % len(self.approach)
+            self.queue += self.approach[slot]
+            self.approach[slot] = arrivals
+            self.arrived += arrivals.sum()
+            if self.clock >= self.lost_until:
+                index = DIRECTIONS.index(self.green)
+                served = min(self.queue[index], self.saturation_flow)
+                self.queue[index] -= served
+                self.served += served
+            self.delay += self.queue.sum()
+            self.clock += 1
+
+    def observe(self):
+        data = {}
+        approaching = self.approach.sum(axis=0)
+        for index, direction in enumerate(DIRECTIONS):
+            count = approaching[index] + self.queue[index]
+            prefix = direction.lower()
+            data[f'{prefix}_queue_length'] = int(round(self.queue[index]))
+            data[f'{prefix}_vehicle_count'] = int(round(count))
+            data[f'{prefix}_avg_speed'] = max(0.1, self.free_speed * approaching[index] / count if count else 1.0)
+        return data
+
+    def result(self):
+        return {'delay': self.delay, 'arrived': self.arrived, 'served': self.served,
+                'in_system': float(self.queue.sum() + self.approach.sum())}
+
+
+class SimulatorPlant:
+    """The vehicle-level simulator; delay is the time vehicles spent stopped or unable to enter"""
+
+    def __init__(self, scenario, seed, seconds):
+        self.simulator = TrafficSimulator(scenario, seed=seed, stream='evaluate')
+        self.end = self.simulator.clock + seconds
+
+    @property
+    def clock(self):
+        return self.simulator.clock
+
+    @property
+    def finished(self):
+        return self.simulator.clock >= self.end - 1e-6
+
+    def set_signal(self, green):
+        self.simulator.set_signal(green)
+
+    def advance(self, seconds):
+        self.simulator.run(min(seconds, self.end - self.simulator.clock))
+
+    def observe(self):
+        data = {}
+        for direction in DIRECTIONS:
+            reading, _ = self.simulator.observe(direction, render=False)
+            prefix = direction.lower()
+            data[f'{prefix}_queue_length'] = reading['queue_length']
+            data[f'{prefix}_vehicle_count'] = reading['vehicle_count']
+            data[f'{prefix}_avg_speed'] = reading['avg_speed']
+        return data
+
+    def result(self):
+        simulator = self.simulator
+        delay = arrived = served = in_system = 0.0
+        for direction in DIRECTIONS:
+            stats = simulator.stats[direction]
+            on_road = [v for lane in simulator.vehicles[direction] for v in lane if not v.crossed]
+            pending = simulator.pending[direction]
+            delay += stats['total_wait'] + sum(v.waited for v in on_road)
+            delay += sum(simulator.clock - v.arrived for v in pending)
+            arrived += stats['arrived'] + len(pending)
+            served += stats['crossed']
+            in_system += len(on_road) + len(pending)
+        return {'delay': delay, 'arrived': arrived, 'served': served, 'in_system': in_system}
+
+
+def evaluate(controller, plant, tick=2.0):
+    """Run one controller on a plant to the end of its demand"""
+    plan_times, greens = [], []
+    while not plant.finished:
+        data = plant.observe()
+        started = time.perf_counter()
+        if controller.update(data, plant.clock):
+            greens.append(plant.clock)
+        plan_times.append(time.perf_counter() - started)
+        plant.set_signal(controller.phase)
+        plant.advance(tick)
+
+    result = plant.result()
+    plan_ms = np.array(plan_times) * 1000
+    return {
+        'controller': controller.name,
+        'total_delay_veh_h': round(result['delay'] / 3600, 2),
+        'mean_delay_s': round(result['delay'] / max(1.0, result['arrived']), 2),
+        'arrived': int(result['arrived']),
+        'served': int(result['served']),
+        'left_in_system': int(result['in_system']),
+        'switches': controller.switches,
+        'mean_green_s': round(float(np.diff(greens).mean()), 1) if len(greens) > 1 else None,
+        'decision_ms_mean': round(float(plan_ms.mean()), 3),
+        'decision_ms_p95': round(float(np.percentile(plan_ms, 95)), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--demand', help='CSV of per-second arrivals: time,NS,SN')
+    parser.add_argument('--scenario', default='rush_hour', choices=sorted(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--minutes', type=float, default=60, help='length of generated demand or simulator runs')
+    parser.add_argument('--save-demand', help='write the generated demand trace to this CSV')
+    parser.add_argument('--plant', choices=('queue', 'simulator'), default='queue')
+    parser.add_argument('--controllers', default='heuristic,predictive',
+                        help=f"comma-separated, from {', '.join(CONTROLLERS)}")
+    parser.add_argument('--tick', type=float, default=2.0, help='seconds between controller decisions')
+    parser.add_argument('--saturation-flow', type=float, default=DEFAULT_PREDICTIVE['saturation_flow'])
+    parser.add_argument('--lost-time', type=float, default=DEFAULT_PREDICTIVE['lost_time'])
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    seconds = args.minutes * 60
+    if args.plant == 'queue':
+        if args.demand:
+            demand = load_demand(args.demand)
+            source = args.demand
+        else:
+            demand = TrafficSimulator(args.scenario, seed=args.seed, stream='demand').demand(seconds)
+            source = f"simulator:{args.scenario}:{args.seed}"
+        if args.save_demand:
+            save_demand(args.save_demand, demand)
+        print(f"demand {source}: {len(demand)} s, {demand.sum(axis=0).astype(int).tolist()} arrivals NS/SN")
+    else:
+        source = f"simulator:{args.scenario}:{args.seed}"
+        print(f"plant {source}: {seconds:.0f} s")
+
+    def plant():
+        if args.plant == 'queue':
+            return QueuePlant(demand, args.saturation_flow, args.lost_time)
+        return SimulatorPlant(args.scenario, args.seed, seconds)
+
+    results = []
+    print(f"\n{'controller':<12} {'delay veh-h':>11} {'mean delay s':>12} {'served':>7} {'left':>6} "
+          f"{'switches':>8} {'mean green':>10} {'decide ms':>9} {'p95 ms':>7}")
+    for name in args.controllers.split(','):
+        options = {'type': name}
+        if name == 'predictive':
+            options.update(saturation_flow=args.saturation_flow, lost_time=args.lost_time)
+        target = plant()
+        result = evaluate(make_controller(options, now=target.clock), target, args.tick)
+        results.append(result)
+        print(f"{name:<12} {result['total_delay_veh_h']:>11.2f} {result['mean_delay_s']:>12.2f} "
+              f"{result['served']:>7} {result['left_in_system']:>6} {result['switches']:>8} "
+              f"{result['mean_green_s'] if result['mean_green_s'] is not None else '-':>10} "
+              f"{result['decision_ms_mean']:>9.3f} {result['decision_ms_p95']:>7.3f}")
+
+    baseline = next((result for result in results if result['controller'] == 'heuristic'), None)
+    if baseline is not None and baseline['total_delay_veh_h'] > 0:
+        for result in results:
+            if result is not baseline:
+                change = result['total_delay_veh_h'] / baseline['total_delay_veh_h'] - 1
+                print(f"{result['controller']}: {change:+.1%} total delay vs heuristic")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'source': source, 'plant': args.plant, 'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+import cv2
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class FrameRingBuffer:
+    """Fixed-size ring of the most recent frame packets shared by all readers"""
+
+    def __init__(self, size=4):
+        self.size = size
+        self._slots = [None] * size
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.readers = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def publish(self, packet):
+        """Store a packet as the newest entry and wake up waiting readers"""
+        with self._cond:
+            self._seq += 1
+            packet['seq'] = self._seq
+            self._slots[self._seq % self.size] = packet
+            self._cond.notify_all()
+        return packet
+
+    def latest(self):
+        with self._cond:
+            if self._seq == 0:
+                return None
+            return self._slots[self._seq % self.size]
+
+    def wait_for(self, after_seq, timeout=1.0):
+        """Block until a packet newer than after_seq is published, return the newest one"""
+        with self._cond:
+            if self._seq <= after_seq:
+                self._cond.wait_for(lambda: self._seq > after_seq, timeout)
+            if self._seq <= after_seq:
+                return None
+            return self._slots[self._seq % self.size]
+
+    @contextmanager
+    def reader(self):
+        """Register an active consumer for the duration of the block"""
+        with self._cond:
+            self.readers += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self.readers -= 1
+
+
+class FrameProducer:
+    """Single background producer that captures, processes and encodes frames once for everyone.
+
+    `source` is a callable returning `(data, frame)`. Each result is published into
+    a FrameRingBuffer together with its JPEG encoding, so any number of stream
+    viewers and the control loop share one capture + inference + encode.
+    """
+
+    def __init__(self, name, source, fps=15, idle_fps=2, jpeg_quality=80,
+                 buffer_size=4, demand=None, encode=True, junction=None):
+        # idle_fps is the rate used while nobody watches; 0 pauses the producer
+        self.name = name
+        self.source = source
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.jpeg_quality = jpeg_quality
+        self.demand = demand
+        self.encode = encode
+        self.buffer = FrameRingBuffer(buffer_size)
+        self.measured_fps = 0
+        self.encode_timer = STAGE_SECONDS.labels('jpeg_encode', junction or '', name)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_demanded(self):
+        """Whether someone is watching the output, so it must run at full rate and be encoded"""
+        if self.buffer.readers > 0:
+            return True
+        return bool(self.demand and self.demand())
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"producer-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"Frame producer {self.name} started")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def latest(self):
+        return self.buffer.latest()
+
+    def produce_once(self):
+        """Run the source once and publish the result"""
+        data, frame = self.source()
+        if frame is None:
+            return None
+        jpeg = None
+        if self.encode and self.buffer.readers > 0:
+            with self.encode_timer.time():
+                ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if ret:
+                jpeg = buffer.tobytes()
+        return self.buffer.publish({
+            'timestamp': time.time(),
+            'data': data,
+            'detections': data.get('detections', []) if data else [],
+            'frame': frame,
+            'jpeg': jpeg
+        })
+
+    def _run(self):
+        frame_count = 0
+        last_time = time.time()
+
+        while not self._stop.is_set():
+            started = time.time()
+            if self.idle_fps == 0 and not self.is_demanded():
+                # Nobody is consuming this output, don't produce at all
+                self._stop.wait(0.2)
+                continue
+            try:
+                if self.produce_once() is not None:
+                    frame_count += 1
+            except Exception as e:
+                logger.error(f"Error in frame producer {self.name}: {e}")
+                self._stop.wait(1)
+                continue
+
+            current_time = time.time()
+            if current_time - last_time >= 1.0:
+                self.measured_fps = frame_count
+                frame_count = 0
+                last_time = current_time
+
+            rate = self.fps if self.is_demanded() else self.idle_fps
+            self._stop.wait(max(0.0, 1.0 / rate - (time.time() - started)))
@@ -0,0 +1,315 @@
+import math
+import os
+import re
+import threading
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Per-junction series; signal_changes is summed when downsampling, the rest averaged
+FIELDS = ('ns_queue_length', 'sn_queue_length', 'ns_avg_speed', 'sn_avg_speed',
+          'ns_vehicle_count', 'sn_vehicle_count', 'green_time', 'signal', 'signal_changes')
+COUNTER_FIELDS = ('signal_changes',)
+# Derived from stored fields at query time
+DERIVED_FIELDS = {'total_queue': ('ns_queue_length', 'sn_queue_length'),
+                  'total_vehicles': ('ns_vehicle_count', 'sn_vehicle_count')}
+
+# (resolution seconds, buckets kept): 1 hour of seconds, 2 days of minutes, 60 days of hours
+TIERS = ((1, 3600), (60, 2880), (3600, 1440))
+
+
+class SeriesRing:
+    """Fixed-memory ring of time buckets for all fields at one resolution.
+
+    Each bucket keeps count, sum, min and max per field, so coarser tiers and
+    downsampled queries can be derived without keeping raw samples.
+    """
+
+    def __init__(self, resolution, capacity, fields=FIELDS):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.fields = fields
+        self.buckets = np.full(capacity, -1, dtype=np.int64)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.sum = np.zeros((capacity, len(fields)))
+        self.min = np.zeros((capacity, len(fields)))
+        self.max = np.zeros((capacity, len(fields)))
+
+    def add(self, timestamp, values, count=1, minimum=None, maximum=None):
+        """Merge one sample, or a pre-aggregated bucket with count/min/max, into its bucket"""
+        bucket = int(timestamp // self.resolution)
+        slot = bucket % self.capacity
+        minimum = values / count if minimum is None else minimum
+        maximum = values / count if maximum is None else maximum
+        if self.buckets[slot] != bucket:
+            if bucket < self.buckets[slot]:
+                # Older than what the ring still holds
+                return
+            self.buckets[slot] = bucket
+            self.count[slot] = count
+            self.sum[slot] = values
+            self.min[slot] = minimum
+            self.max[slot] = maximum
+            return
+        self.count[slot] += count
+        self.sum[slot] += values
+        np.minimum(self.min[slot], minimum, out=self.min[slot])
+        np.maximum(self.max[slot], maximum, out=self.max[slot])
+
+    @property
+    def retention(self):
+        return self.resolution * self.capacity
+
+    def oldest(self):
+        valid = self.buckets[self.buckets >= 0]
+        return float(valid.min() * self.resolution) if len(valid) else None
+
+    def select(self, start, end):
+        """Buckets within [start, end) in time order: bucket ids, count, sum, min, max"""
+        first, last = int(start // self.resolution), int(np.ceil(end / self.resolution))
+        mask = (self.buckets >= first) & (self.buckets < last)
+        order = np.argsort(self.buckets[mask])
+        return (self.buckets[mask][order], self.count[mask][order], self.sum[mask][order],
+                self.min[mask][order], self.max[mask][order])
+
+
+class SegmentStore:
+    """Append-only daily segment files of closed one-minute buckets.
+
+    A record is a flat float64 row: bucket start, count, then the sums, mins
+    and maxes of every field. Files are only ever appended to, so a crash loses
+    at most the record being written.
+    """
+
+    def __init__(self, directory, fields=FIELDS):
+        self.directory = directory
+        self.fields = fields
+        self.width = 2 + 3 * len(fields)
+
+    def path(self, junction_id, timestamp):
+        day = time.strftime('%Y%m%d', time.gmtime(timestamp))
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', str(junction_id))
+        return os.path.join(self.directory, safe, f"{day}.seg")
+
+    def append(self, junction_id, start, count, sums, mins, maxs):
+        path = self.path(junction_id, start)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        row = np.concatenate([[start, count], sums, mins, maxs]).astype(np.float64)
+        with open(path, 'ab') as f:
+            f.write(row.tobytes())
+
+    def read(self, junction_id, start, end):
+        """All stored rows with start <= bucket start < end, as an (N, width) array"""
+        rows = []
+        day = int(start // 86400) * 86400
+        while day < end:
+            path = self.path(junction_id, day)
+            if os.path.exists(path):
+                data = np.fromfile(path, dtype=np.float64)
+                data = data[:len(data) // self.width * self.width].reshape(-1, self.width)
+                rows.append(data[(data[:, 0] >= start) & (data[:, 0] < end)])
+            day += 86400
+        if not rows:
+            return np.empty((0, self.width))
+        return np.concatenate(rows)
+
+
+class JunctionHistory:
+    """All tiers of one junction plus the bookkeeping to flush closed minutes to disk"""
+
+    def __init__(self, junction_id, segments=None, fields=FIELDS):
+        self.junction_id = junction_id
+        self.fields = fields
+        self.tiers = [SeriesRing(resolution, capacity, fields) for resolution, capacity in TIERS]
+        self.segments = segments
+        self.open_minute = None
+        self.last_signal = None
+        self.lock = threading.Lock()
+
+    def record(self, timestamp, values):
+        with self.lock:
+            minute = int(timestamp // 60)
+            if self.segments is not None and self.open_minute is not None and minute != self.open_minute:
+                self.flush_minute(self.open_minute)
+            self.open_minute = minute
+            for tier in self.tiers:
+                tier.add(timestamp, values)
+
+    def flush_minute(self, minute):
+        ring = self.tiers[1]
+        slot = minute % ring.capacity
+        if ring.buckets[slot] != minute:
+            return
+        try:
+            self.segments.append(self.junction_id, minute * 60.0, ring.count[slot],
+                                 ring.sum[slot], ring.min[slot], ring.max[slot])
+        except OSError as e:
+            logger.error(f"Failed to write history segment for {self.junction_id}: {e}")
+
+    def restore(self, since):
+        """Refill the minute and hour tiers from segment files after a restart"""
+        rows = self.segments.read(self.junction_id, since, time.time())
+        n = len(self.fields)
+        for row in rows:
+            for tier in self.tiers[1:]:
+                tier.add(row[0], row[2:2 + n], count=int(row[1]),
+                         minimum=row[2 + n:2 + 2 * n], maximum=row[2 + 2 * n:])
+        return len(rows)
+
+
+class HistoryStore:
+    """Time series of every junction's per-direction metrics.
+
+    Each sample lands in a 1 s, 1 min and 1 h ring of fixed size, which are
+    the automatic rollups; closed minutes are also appended to segment files
+    when a directory is configured. Queries pick the finest tier that covers
+    the range, so long ranges stay cheap, and fall back to the segments for
+    minutes older than the rings hold.
+    """
+
+    def __init__(self, directory=None, fields=FIELDS):
+        self.fields = fields
+        self.index = {name: position for position, name in enumerate(fields)}
+        self.segments = SegmentStore(directory, fields) if directory else None
+        self.junctions = {}
+        self._lock = threading.Lock()
+
+    def junction(self, junction_id):
+        history = self.junctions.get(junction_id)
+        if history is None:
+            with self._lock:
+                history = self.junctions.get(junction_id)
+                if history is None:
+                    history = JunctionHistory(junction_id, self.segments, self.fields)
+                    if self.segments is not None:
+                        restored = history.restore(time.time() - TIERS[2][0] * TIERS[2][1])
+                        if restored:
+                            logger.info(f"Restored {restored} history minutes for {junction_id}")
+                    self.junctions[junction_id] = history
+        return history
+
+    def record(self, junction_id, data, green_time, timestamp=None):
+        """Add one traffic snapshot of a junction"""
+        timestamp = time.time() if timestamp is None else timestamp
+        history = self.junction(junction_id)
+        signal = 0.0 if data['current_signal'] == 'NS' else 1.0
+        changed = history.last_signal is not None and history.last_signal != signal
+        history.last_signal = signal
+        sample = {name: float(data.get(name, 0.0)) for name in self.fields}
+        sample.update(green_time=float(green_time), signal=signal, signal_changes=1.0 if changed else 0.0)
+        history.record(timestamp, np.array([sample[name] for name in self.fields]))
+
+    def mean(self, junction_id, field, window, now=None):
+        """Average of a stored or derived field over the last `window` seconds, None without data"""
+        now = time.time() if now is None else now
+        history = self.junctions.get(junction_id)
+        if history is None:
+            return None
+        tier = next((t for t in history.tiers if t.retention >= window), history.tiers[-1])
+        with history.lock:
+            _, count, sums, _, _ = tier.select(now - window, now)
+        total = count.sum()
+        if total == 0:
+            return None
+        columns = [self.index[name] for name in DERIVED_FIELDS.get(field, (field,))]
+        return float(sums[:, columns].sum() / total)
+
+    def query(self, junction_id, fields=None, start=None, end=None, step=None, max_points=1000):
+        """Downsampled series between start and end (epoch seconds).
+
+        The step defaults to whatever keeps the result under max_points. Each
+        field comes back as mean/min/max lists aligned with `timestamps`; counter
+        fields as a `sum` list and derived fields as `mean` only.
+        """
+        end = time.time() if end is None else end
+        start = end - 3600 if start is None else start
+        for name, value in (('start', start), ('end', end), ('step', step)):
+            if value is not None and not math.isfinite(value):
+                raise ValueError(f"{name} must be a finite number")
+        if step is not None and step <= 0:
+            raise ValueError("step must be positive")
+        fields = list(fields or self.fields)
+        for name in fields:
+            if name not in self.index and name not in DERIVED_FIELDS:
+                raise ValueError(f"unknown field {name}")
+        span = max(1.0, end - start)
+        step = max(float(step or 0), span / max_points)
+
+        history = self.junctions.get(junction_id)
+        if history is None:
+            return {'junction': junction_id, 'start': start, 'end': end, 'step': step,
+                    'resolution': None, 'timestamps': [], 'fields': {name: {} for name in fields}}
+
+        # Coarsest tier that still resolves the step among those covering the start
+        now = time.time()
+        covering = [t for t in history.tiers if start >= now - t.retention - t.resolution] or history.tiers[-1:]
+        tier = covering[0]
+        for candidate in covering:
+            if candidate.resolution <= step:
+                tier = candidate
+        step = max(step, tier.resolution)
+        with history.lock:
+            buckets, count, sums, mins, maxs = tier.select(start, end)
+        if self.segments is not None and tier is not history.tiers[0]:
+            oldest = tier.oldest()
+            if oldest is None or start < oldest:
+                buckets, count, sums, mins, maxs = self._with_segments(
+                    junction_id, tier, start, oldest if oldest is not None else end,
+                    (buckets, count, sums, mins, maxs))
+
+        # Group the tier's buckets into step-sized output points
+        groups = np.floor(buckets * tier.resolution / step).astype(np.int64)
+        points, inverse = np.unique(groups, return_inverse=True)
+        n = len(points)
+        point_count = np.bincount(inverse, weights=count, minlength=n)
+        result = {}
+        for name in fields:
+            columns = [self.index[column] for column in DERIVED_FIELDS.get(name, (name,))]
+            total = sums[:, columns].sum(axis=1)
+            point_sum = np.bincount(inverse, weights=total, minlength=n)
+            if name in COUNTER_FIELDS:
+                result[name] = {'sum': np.round(point_sum, 3).tolist()}
+                continue
+            mean = np.divide(point_sum, point_count, out=np.zeros(n), where=point_count > 0)
+            if name in DERIVED_FIELDS:
+                # The extremes of a sum can't be derived from the parts' extremes
+                result[name] = {'mean': np.round(mean, 3).tolist()}
+                continue
+            low = mins[:, columns[0]]
+            high = maxs[:, columns[0]]
+            point_min = np.full(n, np.inf)
+            point_max = np.full(n, -np.inf)
+            np.minimum.at(point_min, inverse, low)
+            np.maximum.at(point_max, inverse, high)
+            result[name] = {'mean': np.round(mean, 3).tolist(),
+                            'min': np.round(point_min, 3).tolist(),
+                            'max': np.round(point_max, 3).tolist()}
+        return {
+            'junction': junction_id,
+            'start': start,
+            'end': end,
+            'step': step,
+            'resolution': tier.resolution,
+            'timestamps': (points * step).tolist(),
+            'samples': point_count.astype(int).tolist(),
+            'fields': result
+        }
+
+    def _with_segments(self, junction_id, tier, start, end, selected):
+        """Prepend minute rows from disk for the part of the range the rings no longer hold"""
+        rows = self.segments.read(junction_id, start, end)
+        if not len(rows):
+            return selected
+        n = len(self.fields)
+        buckets = (rows[:, 0] // tier.resolution).astype(np.int64)
+        merged = (
+            np.concatenate([buckets, selected[0]]),
+            np.concatenate([rows[:, 1], selected[1]]),
+            np.concatenate([rows[:, 2:2 + n], selected[2]]),
+            np.concatenate([rows[:, 2 + n:2 + 2 * n], selected[3]]),
+            np.concatenate([rows[:, 2 + 2 * n:], selected[4]])
+        )
+        return merged
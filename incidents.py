@@ -0,0 +1,327 @@
+import bisect
+import heapq
+import itertools
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+DIRECTION_NAMES = {'NS': 'North to South', 'SN': 'South to North'}
+
+DEFAULT_INCIDENTS = {
+    # The store keeps at most this many incidents, dropping the oldest first
+    'capacity': 500,
+    # An incident whose condition hasn't been seen for this long clears itself
+    'clear_after': 30.0,
+    # Resolved and cleared incidents stay visible this long before they are dropped
+    'retain_resolved': 600.0,
+    # Stalled vehicle: stopped this long, with its approach green for at least stall_green of it
+    'stall_seconds': 30.0,
+    'stall_green': 15.0,
+    # Queue spike: this far above the smoothed queue, in standard deviations and in vehicles
+    'spike_sigma': 3.0,
+    'spike_min_jump': 5,
+    'spike_min_queue': 8,
+    'spike_smoothing': 0.05,
+    'spike_warmup': 15
+}
+
+# What each detector reports, in the dashboard's incident vocabulary
+INCIDENT_KINDS = {
+    'emergency_vehicle': {
+        'type': 'emergency', 'priority': 'high',
+        'actions': ['Clear traffic signal', 'Alert nearby junctions', 'Contact emergency services']
+    },
+    'stalled_vehicle': {
+        'type': 'accident', 'priority': 'high',
+        'actions': ['Dispatch traffic police', 'Contact nearest hospital']
+    },
+    'queue_spike': {
+        'type': 'congestion', 'priority': 'medium',
+        'actions': ['Dispatch traffic police', 'Acknowledge']
+    }
+}
+
+
+class IncidentStore:
+    """Bounded store of incidents indexed by id, junction, open condition and time.
+
+    Incidents are kept in creation order, so ids and times ascend together and
+    a time range is a bisect over the creation times. Lookup and resolve by id,
+    and finding the open incident for a (junction, direction, kind) condition,
+    are dict lookups. Expiry runs off a heap of deadlines: an open incident
+    whose condition stops being reported clears itself after clear_after, and
+    resolved ones are dropped retain_resolved later. Listeners are called with
+    (event, incident) after every change, outside the lock.
+    """
+
+    def __init__(self, capacity=500, clear_after=30.0, retain_resolved=600.0):
+        self.capacity = capacity
+        self.clear_after = clear_after
+        self.retain_resolved = retain_resolved
+        self.version = 0
+        self._incidents = OrderedDict()
+        self._created = deque()
+        self._created_ids = deque()
+        self._by_junction = {}
+        self._open = {}
+        self._deadlines = []
+        self._next_id = 1
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._incidents)
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, events):
+        for event, incident in events:
+            for listener in self._listeners:
+                listener(event, incident)
+
+    def report(self, junction_id, direction, kind, fields, now=None):
+        """Open an incident for a condition, or refresh the one already open; returns (incident, created)"""
+        now = time.time() if now is None else now
+        key = (junction_id, direction, kind)
+        events = []
+        with self._lock:
+            incident_id = self._open.get(key)
+            if incident_id is not None:
+                incident = self._incidents[incident_id]
+                incident.update(fields, lastSeen=now)
+                self._schedule(incident, now + self.clear_after)
+                created = False
+            else:
+                incident = dict(fields, id=self._next_id, kind=kind, junctionId=junction_id, approach=direction,
+                                time=time.strftime('%H:%M', time.localtime(now)), createdAt=now, lastSeen=now,
+                                resolved=False)
+                self._next_id += 1
+                self._incidents[incident['id']] = incident
+                self._created.append(now)
+                self._created_ids.append(incident['id'])
+                self._by_junction.setdefault(junction_id, OrderedDict())[incident['id']] = None
+                self._open[key] = incident['id']
+                self._schedule(incident, now + self.clear_after)
+                created = True
+                events.append(('created', dict(incident)))
+                while len(self._incidents) > self.capacity:
+                    events.append(('dropped', self._remove(next(iter(self._incidents)))))
+            self.version += 1
+            result = dict(incident)
+        self._notify(events or [('updated', result)])
+        return result, created
+
+    def get(self, incident_id):
+        incident = self._incidents.get(incident_id)
+        return dict(incident) if incident is not None else None
+
+    def resolve(self, incident_id, action, now=None, fields=None):
+        """Mark an incident resolved, with optional extra fields; returns it, or None if there's no such incident"""
+        now = time.time() if now is None else now
+        with self._lock:
+            incident = self._incidents.get(incident_id)
+            if incident is None:
+                return None
+            incident.update(fields or {})
+            self._close(incident, action, now)
+            self.version += 1
+            result = dict(incident)
+        self._notify([('resolved', result)])
+        return result
+
+    def expire(self, now=None):
+        """Clear open incidents that stopped being reported and drop old resolved ones"""
+        now = time.time() if now is None else now
+        events = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, incident_id = heapq.heappop(self._deadlines)
+                incident = self._incidents.get(incident_id)
+                # Refreshed incidents leave stale heap entries behind; skip those
+                if incident is None or incident['expiresAt'] != deadline:
+                    continue
+                if incident['resolved']:
+                    events.append(('dropped', self._remove(incident_id)))
+                else:
+                    self._close(incident, 'Cleared', now)
+                    events.append(('cleared', dict(incident)))
+            if len(self._deadlines) > 4 * len(self._incidents) + 64:
+                self._deadlines = [(item['expiresAt'], key) for key, item in self._incidents.items()]
+                heapq.heapify(self._deadlines)
+            if events:
+                self.version += 1
+        self._notify(events)
+        return len(events)
+
+    def _schedule(self, incident, deadline):
+        incident['expiresAt'] = deadline
+        heapq.heappush(self._deadlines, (deadline, incident['id']))
+
+    def _close(self, incident, action, now):
+        if not incident['resolved']:
+            incident['resolved'] = True
+            incident['resolvedAction'] = action
+            incident['resolvedTime'] = time.strftime('%H:%M', time.localtime(now))
+            key = (incident['junctionId'], incident['approach'], incident['kind'])
+            if self._open.get(key) == incident['id']:
+                del self._open[key]
+        self._schedule(incident, now + self.retain_resolved)
+
+    def _remove(self, incident_id):
+        incident = self._incidents.pop(incident_id)
+        junction = self._by_junction.get(incident['junctionId'])
+        if junction is not None:
+            junction.pop(incident_id, None)
+            if not junction:
+                del self._by_junction[incident['junctionId']]
+        key = (incident['junctionId'], incident['approach'], incident['kind'])
+        if self._open.get(key) == incident_id:
+            del self._open[key]
+        # Removal is mostly oldest first; trim the time index lazily from the front
+        while self._created_ids and self._created_ids[0] not in self._incidents:
+            self._created_ids.popleft()
+            self._created.popleft()
+        # An old incident held open pins the front, so ids expired behind it pile up; rebuild then
+        if len(self._created_ids) > 2 * self.capacity:
+            self._created_ids = deque(self._incidents)
+            self._created = deque(item['createdAt'] for item in self._incidents.values())
+        return incident
+
+    def is_open(self, junction_id, direction, kind):
+        return (junction_id, direction, kind) in self._open
+
+    def query(self, junction_id=None, since=None, active=None, limit=None):
+        """Incidents, newest first, filtered by junction, creation time and whether they're still open"""
+        with self._lock:
+            if junction_id is not None:
+                ids = reversed(list(self._by_junction.get(junction_id, ())))
+            elif since is not None:
+                start = bisect.bisect_left(self._created, since)
+                ids = reversed(list(itertools.islice(self._created_ids, start, None)))
+            else:
+                ids = reversed(list(self._incidents))
+            result = []
+            for incident_id in ids:
+                incident = self._incidents.get(incident_id)
+                if incident is None:
+                    continue
+                if since is not None and incident['createdAt'] < since:
+                    break
+                if active is not None and incident['resolved'] == active:
+                    continue
+                result.append(dict(incident))
+                if limit is not None and len(result) >= limit:
+                    break
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {'incidents': len(self._incidents), 'open': len(self._open), 'capacity': self.capacity,
+                    'next_id': self._next_id}
+
+
+class IncidentDetector:
+    """Turns each junction's readings into incidents in an IncidentStore.
+
+    Called once per junction tick with the per-camera readings. Detects
+    emergency-class vehicles the tracker is following, vehicles that stay
+    stopped while their approach has green, and queues jumping well above
+    their smoothed level. Each condition keeps one open incident that is
+    refreshed while it lasts and clears itself once it stops being seen.
+    """
+
+    def __init__(self, store, names=None, options=None):
+        self.config = dict(DEFAULT_INCIDENTS, **(options or {}))
+        self.store = store
+        self.names = names or {}
+        # (junction, direction) -> [(time, cumulative green seconds)], and EWMA queue mean/variance
+        self.green = {}
+        self.queues = {}
+        self._lock = threading.Lock()
+
+    def green_seconds(self, key, signal, direction, now):
+        """Cumulative green seconds of an approach up to now, and the history to look back in"""
+        history = self.green.setdefault(key, deque(maxlen=1024))
+        total = 0.0
+        if history:
+            last_time, last_total = history[-1]
+            total = last_total + (now - last_time if signal == direction else 0.0)
+        history.append((now, total))
+        return total, history
+
+    def green_since(self, history, total, start):
+        """Green seconds of an approach between start and the latest sample"""
+        times = [sample[0] for sample in history]
+        index = bisect.bisect_left(times, start)
+        if index >= len(history):
+            return 0.0
+        return total - history[index][1]
+
+    def queue_spike(self, key, queue):
+        """Whether a queue length jumps above its smoothed level, then fold it into that level"""
+        cfg = self.config
+        mean, variance, samples = self.queues.get(key, (float(queue), 0.0, 0))
+        excess = queue - mean
+        spike = (samples >= cfg['spike_warmup'] and queue >= cfg['spike_min_queue']
+                 and excess >= max(cfg['spike_sigma'] * variance ** 0.5, cfg['spike_min_jump']))
+        alpha = cfg['spike_smoothing']
+        mean += alpha * excess
+        variance = (1 - alpha) * (variance + alpha * excess * excess)
+        self.queues[key] = (mean, variance, samples + 1)
+        return spike
+
+    def observe(self, junction_id, data, readings, now=None):
+        """Check one junction tick: data is the junction snapshot, readings the per-camera data by direction"""
+        now = time.time() if now is None else now
+        cfg = self.config
+        location = self.names.get(junction_id, junction_id)
+        signal = data.get('current_signal')
+        for direction, reading in readings.items():
+            key = (junction_id, direction)
+            heading = DIRECTION_NAMES.get(direction, direction)
+            with self._lock:
+                total, history = self.green_seconds(key, signal, direction, now)
+                spike = self.queue_spike(key, reading.get('queue_length', 0))
+
+            if reading.get('emergency'):
+                self.raise_incident(junction_id, direction, 'emergency_vehicle', now, {
+                    'location': location,
+                    'message': f"Emergency vehicle approaching, heading {heading.lower()}",
+                    'details': f"Emergency-class vehicle tracked on the {direction} camera.",
+                    'vehicleType': 'Emergency vehicle'
+                })
+
+            stalled = [track for track in reading.get('stopped', ())
+                       if track['seconds'] >= cfg['stall_seconds']
+                       and self.green_since(history, total, now - track['seconds']) >= cfg['stall_green']]
+            if stalled:
+                longest = max(track['seconds'] for track in stalled)
+                self.raise_incident(junction_id, direction, 'stalled_vehicle', now, {
+                    'location': location,
+                    'message': f"Stalled vehicle on the {heading.lower()} approach",
+                    'details': f"{len(stalled)} vehicle(s) stopped through green for up to {longest:.0f} s.",
+                    'stalledVehicles': len(stalled)
+                })
+
+            if spike or (self.store.is_open(junction_id, direction, 'queue_spike')
+                         and reading.get('queue_length', 0) >= cfg['spike_min_queue']):
+                queue = reading.get('queue_length', 0)
+                self.raise_incident(junction_id, direction, 'queue_spike', now, {
+                    'location': location,
+                    'message': f"Sudden queue build-up heading {heading.lower()}",
+                    'details': f"Queue of {queue} vehicles, well above the usual "
+                               f"{self.queues[key][0]:.0f} for this approach.",
+                    'queueLength': queue
+                })
+        self.store.expire(now)
+
+    def raise_incident(self, junction_id, direction, kind, now, fields):
+        fields = dict(INCIDENT_KINDS[kind], direction=DIRECTION_NAMES.get(direction, direction), **fields)
+        incident, created = self.store.report(junction_id, direction, kind, fields, now)
+        if created:
+            logger.warning(f"Incident {incident['id']} at {junction_id}: {incident['message']}")
+        return incident
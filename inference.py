@@ -0,0 +1,205 @@
+import threading
+import queue
+import time
+import logging
+
+import numpy as np
+
+from backends import backend_spec, make_backend
+
+logger = logging.getLogger(__name__)
+
+# COCO ids of car, motorcycle, bus and truck
+VEHICLE_CLASSES = (2, 3, 5, 7)
+
+# Side of the blank frame the model is warmed up on after loading
+WARMUP_SIZE = 640
+
+_engine = None
+# Backend spec the shared engine loads when none is given; see backends.DEFAULT_BACKEND
+_engine_spec = None
+_engine_status = {'state': 'idle', 'weights': None, 'backend': None, 'error': None, 'load_seconds': None,
+                  'warmup_ms': None}
+_engine_lock = threading.Lock()
+# Set once loading has finished, whether it succeeded or not
+_engine_done = threading.Event()
+
+
+class InferenceRequest:
+    __slots__ = ('frame', 'done', 'result', 'error')
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchInferenceEngine:
+    """Runs one shared detector backend over frames collected from every camera.
+
+    Processors call infer() from their own threads. A single worker thread
+    gathers pending frames for up to `max_wait` seconds (or `max_batch` frames),
+    runs them through the model as one batched predict call and hands each
+    result back to the caller that submitted it.
+    """
+
+    def __init__(self, model, max_batch=8, max_wait=0.01, device='cpu'):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.device = device
+        self.batches = 0
+        self.frames = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+        self._thread.start()
+
+    def infer(self, frame, timeout=10.0):
+        """Submit a frame and block until its detection result is ready"""
+        request = InferenceRequest(frame)
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Inference request timed out")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                results = self.model.predict([r.frame for r in batch], device=self.device, verbose=False)
+                for request, result in zip(batch, results):
+                    request.result = result
+                self.batches += 1
+                self.frames += len(batch)
+            except Exception as e:
+                logger.error(f"Batched inference failed for {len(batch)} frames: {e}")
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'frames': self.frames,
+            'avg_batch_size': self.frames / self.batches if self.batches else 0.0
+        }
+
+
+def _as_numpy(values):
+    if hasattr(values, 'cpu'):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+def extract_vehicle_boxes(result, vehicle_classes, min_conf=0.3):
+    """Filter a YOLO result down to vehicle boxes in one vectorized pass.
+
+    Returns an (N, 4) int32 array of x1, y1, x2, y2 boxes and the matching
+    (N,) float32 confidences.
+    """
+    boxes = getattr(result, 'boxes', None)
+    if boxes is None or len(boxes) == 0:
+        return np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.float32)
+
+    cls = _as_numpy(boxes.cls).astype(np.int64).reshape(-1)
+    conf = _as_numpy(boxes.conf).astype(np.float32).reshape(-1)
+    xyxy = _as_numpy(boxes.xyxy).reshape(-1, 4)
+
+    keep = np.isin(cls, vehicle_classes) & (conf > min_conf)
+    return xyxy[keep].astype(np.int32), conf[keep]
+
+
+def _load_engine(spec, warmup):
+    """Load the backend a spec describes and run it once on a blank frame"""
+    global _engine
+    started = time.perf_counter()
+    try:
+        backend = make_backend(spec)
+        engine = BatchInferenceEngine(backend, device=spec['device'])
+        load_seconds = time.perf_counter() - started
+        warmup_ms = None
+        if warmup:
+            # The first predict call sets up the backend; pay for it before real frames arrive
+            warmup_started = time.perf_counter()
+            engine.infer(np.zeros((WARMUP_SIZE, WARMUP_SIZE, 3), dtype=np.uint8), timeout=120.0)
+            warmup_ms = (time.perf_counter() - warmup_started) * 1000
+        with _engine_lock:
+            _engine = engine
+            _engine_status.update(state='ready', backend=backend.describe(), load_seconds=round(load_seconds, 3),
+                                  warmup_ms=round(warmup_ms, 1) if warmup_ms is not None else None)
+        logger.info(f"Loaded shared {spec['backend']} model {spec['weights']} in {load_seconds:.2f} s"
+                    + (f", warm-up {warmup_ms:.0f} ms" if warmup_ms is not None else ''))
+    except Exception as e:
+        logger.error(f"Failed to load YOLO model: {e}")
+        with _engine_lock:
+            _engine_status.update(state='failed', error=str(e))
+    finally:
+        _engine_done.set()
+
+
+def configure_inference_engine(spec):
+    """Set the backend spec (a dict, weights path or backend name) the shared engine loads by default"""
+    global _engine_spec
+    _engine_spec = backend_spec(spec)
+
+
+def start_inference_engine(spec=None, warmup=True):
+    """Start loading the shared model on a background thread, unless it is loading or loaded already"""
+    spec = backend_spec(spec if spec is not None else _engine_spec)
+    with _engine_lock:
+        if _engine_status['state'] != 'idle':
+            return
+        _engine_status.update(state='loading', weights=spec['weights'])
+    threading.Thread(target=_load_engine, args=(spec, warmup), name='model-loader', daemon=True).start()
+
+
+def get_inference_engine(spec=None, wait=True):
+    """Shared engine for all camera processors, or None if the model can't be loaded.
+
+    Without wait, returns None straight away while the model is still loading.
+    """
+    start_inference_engine(spec)
+    if wait:
+        _engine_done.wait()
+    return _engine
+
+
+def inference_status():
+    """Loading state of the shared model: idle, loading, ready or failed, with timings"""
+    with _engine_lock:
+        return dict(_engine_status)
+
+
+def reset_inference_engine():
+    """Rebuild the shared engine in a forked worker, where its batching and loader threads no longer exist.
+
+    The already loaded model is kept, so forked workers don't pay for loading it again.
+    """
+    global _engine, _engine_lock, _engine_done
+    _engine_lock = threading.Lock()
+    _engine_done = threading.Event()
+    if _engine is not None:
+        _engine = BatchInferenceEngine(_engine.model, _engine.max_batch, _engine.max_wait, _engine.device)
+    if _engine_status['state'] == 'loading':
+        # The loader thread didn't survive the fork; this process starts its own
+        _engine_status.update(state='idle')
+    elif _engine_status['state'] != 'idle':
+        _engine_done.set()
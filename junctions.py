@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import camera_config
+from metrics import STAGE_SECONDS, FRAMES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+
+def load_junction_specs(config, default_junctions):
+    """Junction definitions from config, falling back to the built-in dashboard junctions.
+
+    Each spec has an id, name, coordinates, a cameras mapping of direction ->
+    camera config (source, roi, ...) and the signal_controller spec (per
+    junction, else the top-level one). Without a config only the first junction
+    gets the local cameras 0 and 1, the others run simulated.
+    """
+    if config.get('junctions'):
+        specs = []
+        for entry in config['junctions']:
+            defaults = default_junctions.get(entry['id'], {})
+            specs.append({
+                'id': entry['id'],
+                'name': entry.get('name', defaults.get('name', entry['id'])),
+                'coordinates': entry.get('coordinates', defaults.get('coordinates', [0.0, 0.0])),
+                'cameras': entry.get('cameras', {}),
+                'signal_controller': entry.get('signal_controller', config.get('signal_controller'))
+            })
+        return specs
+
+    specs = []
+    for index, (junction_id, junction) in enumerate(default_junctions.items()):
+        if index == 0:
+            cameras = {direction: dict(camera_config(config, direction), source=source)
+                       for direction, source in (('NS', 0), ('SN', 1))}
+        else:
+            cameras = {'NS': {'source': None}, 'SN': {'source': None}}
+        specs.append({
+            'id': junction_id,
+            'name': junction['name'],
+            'coordinates': junction['coordinates'],
+            'cameras': cameras,
+            'signal_controller': config.get('signal_controller')
+        })
+    return specs
+
+
+class Junction:
+    """One junction's traffic system plus its tick timing statistics"""
+
+    def __init__(self, spec, system):
+        self.id = spec['id']
+        self.name = spec['name']
+        self.coordinates = spec['coordinates']
+        self.system = system
+        self.tick_timer = STAGE_SECONDS.labels('junction_tick', self.id, '')
+        self.ticks = 0
+        self.overruns = 0
+        self.failures = 0
+        self.latencies = deque(maxlen=200)
+        self.tick_times = deque(maxlen=200)
+        self.busy = False
+
+    def tick(self):
+        started = time.perf_counter()
+        try:
+            self.system.process_frames()
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Junction {self.id} tick failed: {e}")
+        finally:
+            latency = time.perf_counter() - started
+            self.tick_timer.observe(latency)
+            self.latencies.append(latency)
+            self.tick_times.append(time.time())
+            self.ticks += 1
+            self.busy = False
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        window = self.tick_times[-1] - self.tick_times[0] if len(self.tick_times) > 1 else 0
+        return {
+            'name': self.name,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'failures': self.failures,
+            'ticks_per_second': (len(self.tick_times) - 1) / window if window > 0 else 0.0,
+            'signal': self.system.controller.stats(),
+            'latency_ms': {
+                'last': float(latencies[-1]),
+                'mean': float(latencies.mean()),
+                'p95': float(np.percentile(latencies, 95)),
+                'max': float(latencies.max())
+            }
+        }
+
+
+class JunctionEngine:
+    """Registry of junctions whose control ticks run on a bounded worker pool.
+
+    The pool is sized to the machine's cores. A junction whose previous tick is
+    still running is skipped for that round and counted as an overrun rather
+    than queued, so a slow junction can't build up a backlog. An optional
+    corridor coordinator runs first in every round, on the engine thread.
+    """
+
+    def __init__(self, junctions, tick_interval=2.0, workers=None, coordinator=None):
+        self.junctions = {junction.id: junction for junction in junctions}
+        self.tick_interval = tick_interval
+        self.coordinator = coordinator
+        self.coordinate_timer = STAGE_SECONDS.labels('coordinate', '', '')
+        self.workers = workers or min(32, os.cpu_count() or 1)
+        self.running = False
+        self._pool = None
+        self._thread = None
+
+    def __iter__(self):
+        return iter(self.junctions.values())
+
+    def get(self, junction_id):
+        return self.junctions.get(junction_id)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='junction')
+        for junction in self:
+            junction.system.start()
+        self._thread = threading.Thread(target=self._run, name='junction-engine', daemon=True)
+        self._thread.start()
+        logger.info(f"Junction engine started: {len(self.junctions)} junctions on {self.workers} workers")
+
+    def stop(self):
+        self.running = False
+        for junction in self:
+            junction.system.stop()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def tick_all(self):
+        if self.coordinator is not None:
+            with self.coordinate_timer.time():
+                try:
+                    self.coordinator.update()
+                except Exception as e:
+                    logger.error(f"Corridor coordination failed: {e}")
+        for junction in self:
+            if junction.busy:
+                junction.overruns += 1
+                FRAMES_DROPPED.inc(consumer='junction_tick')
+                continue
+            junction.busy = True
+            self._pool.submit(junction.tick)
+
+    def _run(self):
+        while self.running:
+            started = time.time()
+            self.tick_all()
+            time.sleep(max(0.0, self.tick_interval - (time.time() - started)))
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'tick_interval': self.tick_interval,
+            'junctions': {junction.id: junction.stats() for junction in self}
+        }
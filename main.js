@@ -618,6 +618,13 @@ function resolveIncident(incidentId, action) {
         dashboardState.resolvedIncidents[incidentId] = true;
     }
     
+    // The server's incident store is the source of truth; its update arrives over /events
+    fetch('/resolve_incident', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({incidentId: incidentId, action: action})
+    }).catch(error => console.error('Error resolving incident:', error));
+    
     if (action === 'Contact nearest hospital') {
         alert('📞 Contacted Apollo Hospital Chennai - ETA: 8 minutes');
     } else if (action === 'Dispatch traffic police') {
@@ -680,21 +687,88 @@ function simulateTrafficData() {
     updateDashboard();
 }
 
+// Apply real traffic data from the server (poll or push)
+function applyTrafficData(data) {
+    dashboardState.realTrafficData = data;
+    
+    document.getElementById('traffic-reduction').textContent = 
+        data.traffic_reduction.toFixed(1) + '%';
+}
+
 // New function to fetch real traffic data
 async function fetchRealTrafficData() {
     try {
         const response = await fetch('/traffic_data');
         const data = await response.json();
-        dashboardState.realTrafficData = data;
-        
-        document.getElementById('traffic-reduction').textContent = 
-            data.traffic_reduction.toFixed(1) + '%';
+        applyTrafficData(data);
             
     } catch (error) {
         console.error('Error fetching traffic data:', error);
     }
 }
 
+// Merge a pushed delta into local state; nested objects are merged, everything else replaced.
+// Each level lists the fields it removed under '$deleted'; null is an ordinary value
+function mergeDelta(target, delta) {
+    (delta['$deleted'] || []).forEach(key => delete target[key]);
+    Object.keys(delta).forEach(key => {
+        const value = delta[key];
+        if (key === '$deleted') {
+            return;
+        } else if (typeof value === 'object' && !Array.isArray(value) &&
+                   target[key] && typeof target[key] === 'object' && !Array.isArray(target[key])) {
+            mergeDelta(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    });
+    return target;
+}
+
+// Server-Sent Events push channel, falls back to polling if unavailable
+let pollingIntervals = [];
+let cameraStatusState = {};
+
+function startPolling() {
+    if (pollingIntervals.length > 0) return;
+    pollingIntervals.push(setInterval(fetchRealTrafficData, 2000));
+    pollingIntervals.push(setInterval(checkCameraStatus, 3000));
+}
+
+function stopPolling() {
+    pollingIntervals.forEach(clearInterval);
+    pollingIntervals = [];
+}
+
+function connectEventStream() {
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    
+    const source = new EventSource('/events');
+    let trafficState = {};
+    
+    source.addEventListener('open', stopPolling);
+    source.addEventListener('traffic', function(event) {
+        const message = JSON.parse(event.data);
+        trafficState = message.type === 'snapshot' ? message.data : mergeDelta(trafficState, message.data);
+        applyTrafficData(trafficState);
+    });
+    source.addEventListener('dashboard', function(event) {
+        const message = JSON.parse(event.data);
+        mergeDelta(dashboardState, message.data);
+        updateDashboard();
+    });
+    source.addEventListener('camera', function(event) {
+        const message = JSON.parse(event.data);
+        cameraStatusState = message.type === 'snapshot' ? message.data : mergeDelta(cameraStatusState, message.data);
+        applyCameraStatus(cameraStatusState);
+    });
+    // EventSource reconnects by itself; poll in the meantime
+    source.addEventListener('error', startPolling);
+}
+
 // Camera status and frame rate monitoring
 let frameCount = 0;
 let lastTime = Date.now();
@@ -717,61 +791,65 @@ async function checkCameraStatus() {
     try {
         const response = await fetch('/camera_status');
         const status = await response.json();
-        
-        const cameraStatus = document.getElementById('camera-status');
-        const cameraIndicator = document.getElementById('camera-status-indicator');
-        const cameraHelp = document.getElementById('camera-help');
-        const yoloStatus = document.getElementById('yolo-status');
-        const yoloIndicator = document.getElementById('yolo-status-indicator');
-        
-        if (status.status === 'active') {
-            if (cameraStatus) {
-                cameraStatus.textContent = 'Live';
-                cameraStatus.className = 'text-xs text-green-400';
-            }
-            if (cameraIndicator) {
-                cameraIndicator.className = 'w-2 h-2 bg-green-400 rounded-full animate-pulse';
-            }
-            if (cameraHelp) {
-                cameraHelp.classList.add('hidden');
-            }
-            if (yoloStatus) {
-                yoloStatus.textContent = 'Active';
-                yoloStatus.className = 'text-xs text-green-400';
-            }
-            if (yoloIndicator) {
-                yoloIndicator.className = 'w-2 h-2 bg-green-400 rounded-full animate-pulse';
-            }
-        } else {
-            if (cameraStatus) {
-                cameraStatus.textContent = 'Simulated';
-                cameraStatus.className = 'text-xs text-yellow-400';
-            }
-            if (cameraIndicator) {
-                cameraIndicator.className = 'w-2 h-2 bg-yellow-400 rounded-full animate-pulse';
-            }
-            if (cameraHelp) {
-                cameraHelp.classList.remove('hidden');
-            }
-            if (yoloStatus) {
-                yoloStatus.textContent = 'Simulated';
-                yoloStatus.className = 'text-xs text-yellow-400';
-            }
-            if (yoloIndicator) {
-                yoloIndicator.className = 'w-2 h-2 bg-yellow-400 rounded-full animate-pulse';
-            }
-        }
-        
-        const frameRateElement = document.getElementById('frame-rate');
-        if (frameRateElement) {
-            frameRateElement.textContent = (status.fps || 0) + ' FPS';
-        }
-        
+        applyCameraStatus(status);
     } catch (error) {
         console.error('Error checking camera status:', error);
     }
 }
 
+function applyCameraStatus(status) {
+    const cameraStatus = document.getElementById('camera-status');
+    const cameraIndicator = document.getElementById('camera-status-indicator');
+    const cameraHelp = document.getElementById('camera-help');
+    const yoloStatus = document.getElementById('yolo-status');
+    const yoloIndicator = document.getElementById('yolo-status-indicator');
+    
+    if (status.status === 'active') {
+        if (cameraStatus) {
+            cameraStatus.textContent = 'Live';
+            cameraStatus.className = 'text-xs text-green-400';
+        }
+        if (cameraIndicator) {
+            cameraIndicator.className = 'w-2 h-2 bg-green-400 rounded-full animate-pulse';
+        }
+        if (cameraHelp) {
+            cameraHelp.classList.add('hidden');
+        }
+        if (yoloStatus) {
+            yoloStatus.textContent = 'Active';
+            yoloStatus.className = 'text-xs text-green-400';
+        }
+        if (yoloIndicator) {
+            yoloIndicator.className = 'w-2 h-2 bg-green-400 rounded-full animate-pulse';
+        }
+    } else {
+        // Configured cameras fall back to simulated readings while they (re)connect
+        const labels = {connecting: 'Connecting', reconnecting: 'Reconnecting'};
+        if (cameraStatus) {
+            cameraStatus.textContent = labels[status.status] || 'Simulated';
+            cameraStatus.className = 'text-xs text-yellow-400';
+        }
+        if (cameraIndicator) {
+            cameraIndicator.className = 'w-2 h-2 bg-yellow-400 rounded-full animate-pulse';
+        }
+        if (cameraHelp) {
+            cameraHelp.classList.remove('hidden');
+        }
+        if (yoloStatus) {
+            yoloStatus.textContent = 'Simulated';
+            yoloStatus.className = 'text-xs text-yellow-400';
+        }
+        if (yoloIndicator) {
+            yoloIndicator.className = 'w-2 h-2 bg-yellow-400 rounded-full animate-pulse';
+        }
+    }
+    
+    const frameRateElement = document.getElementById('frame-rate');
+    if (frameRateElement) {
+        frameRateElement.textContent = (status.fps || 0) + ' FPS';
+    }
+}
+
 // Video feed error handling
 document.addEventListener('DOMContentLoaded', function() {
     const videoFeed = document.getElementById('video-feed');
@@ -812,9 +890,10 @@ document.addEventListener('DOMContentLoaded', function() {
     setInterval(updateTime, 1000);
     setInterval(cycleSignalPhases, 1000);
     setInterval(simulateTrafficData, 3000);
-    setInterval(fetchRealTrafficData, 2000);
     setInterval(updateFrameRate, 100);
-    setInterval(checkCameraStatus, 3000);
+    
+    // Live data is pushed over /events, polling is only the fallback
+    connectEventStream();
     
     // Initial status check
     checkCameraStatus();
@@ -0,0 +1,159 @@
+import cv2
+import numpy as np
+import logging
+
+from inference import get_inference_engine, extract_vehicle_boxes, VEHICLE_CLASSES
+from tracker import VehicleTracker, iou_matrix, STOPPED_REPORT_SECONDS
+from scheduler import InferenceScheduler, INFER, TRACK
+from roi import CameraROI
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class DirectionalCameraProcessor:
+    def __init__(self, camera_id, direction_name, engine=None, roi=None, seed=None, junction=None, camera=None,
+                 emergency_classes=None):
+        self.camera_id = camera_id
+        self.direction_name = direction_name
+        self.junction = junction
+        # All processors share one model through the batching engine; it loads in
+        # the background and detections are simulated until it is ready
+        self._engine = engine
+        self.vehicle_classes = list(VEHICLE_CLASSES)
+        # Class ids of a model trained on emergency vehicles; the stock COCO model has none
+        self.emergency_classes = list(emergency_classes or [])
+        self.emergency_tracks = set()
+        self.emergency_boxes = np.empty((0, 4), dtype=np.int32)
+        self.tracker = VehicleTracker()
+        self.scheduler = InferenceScheduler()
+        self.roi = roi if roi is not None else CameraROI()
+        self.last_data = {'queue_length': 0, 'avg_speed': 1.0, 'vehicle_count': 0}
+        self.last_confidences = None
+        # Only drives the simulated detections used without a model
+        self.rng = np.random.default_rng(seed)
+        # junction and camera only label the stage timings
+        self.timers = {stage: STAGE_SECONDS.labels(stage, junction or '', camera or direction_name)
+                       for stage in ('process_frame', 'inference', 'tracker_update')}
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = get_inference_engine(wait=False)
+        return self._engine
+
+    @property
+    def model_loaded(self):
+        return self.engine is not None
+
+    def process_frame(self, frame, annotate=True):
+        with self.timers['process_frame'].time():
+            return self._process_frame(frame, annotate)
+
+    def _process_frame(self, frame, annotate):
+        if frame is None:
+            return self.last_data, frame
+        
+        try:
+            # Only the ROI bounding crop is scheduled and sent to the detector
+            view, offset = self.roi.crop(frame)
+            decision = self.scheduler.decide(view)
+            
+            if decision == INFER:
+                with self.timers['inference'].time():
+                    detections, confidences = self.detect(view)
+                detections, inside = self.roi.to_frame(detections, offset)
+                if confidences is not None:
+                    confidences = confidences[inside]
+                with self.timers['tracker_update'].time():
+                    self.tracker.update(detections)
+                self.mark_emergency_tracks(offset)
+            elif decision == TRACK:
+                # Small motion: carry the tracked boxes forward instead of re-detecting
+                detections = self.tracker.predict_boxes()
+                confidences = None
+                with self.timers['tracker_update'].time():
+                    self.tracker.update(detections)
+            else:
+                # Static scene: the previous detections still hold
+                detections = self.last_data.get('detections', np.empty((0, 4), dtype=np.int32))
+                confidences = self.last_confidences
+            
+            tracked = [track for track in self.tracker.records if track.disappeared == 0]
+            avg_speed = self.tracker.average_speed()
+            
+            self.last_data = {
+                'queue_length': int(self.roi.queued(detections).sum()), 
+                'avg_speed': max(0.1, avg_speed), 
+                'vehicle_count': len(tracked),
+                'lane_counts': self.roi.lane_counts(detections),
+                'detections': detections,
+                'stopped': self.stopped_tracks(),
+                'emergency': any(track.track_id in self.emergency_tracks for track in tracked)
+            }
+            self.last_confidences = confidences
+            
+            # Drawing is only needed when someone is viewing the frame
+            if annotate:
+                self.annotate_frame(frame, detections, confidences, avg_speed)
+            
+            return self.last_data, frame
+            
+        except Exception as e:
+            logger.error(f"Error processing frame: {e}")
+            return self.last_data, frame
+    
+    def stopped_tracks(self, now=None):
+        """Visible tracks that haven't moved for STOPPED_REPORT_SECONDS or more"""
+        ids, seconds, _ = self.tracker.stationary(now, STOPPED_REPORT_SECONDS)
+        return [{'id': track_id, 'seconds': round(elapsed, 1)}
+                for track_id, elapsed in zip(ids.tolist(), seconds.tolist())]
+
+    def mark_emergency_tracks(self, offset):
+        """Remember the tracks the last inference saw as emergency vehicles, for as long as they're tracked"""
+        self.emergency_tracks &= set(self.tracker.ids.tolist())
+        if not len(self.emergency_boxes) or not len(self.tracker.ids):
+            return
+        boxes, _ = self.roi.to_frame(self.emergency_boxes, offset)
+        overlap = iou_matrix(self.tracker.boxes, boxes.astype(np.float32))
+        visible = self.tracker.disappeared == 0
+        matched = visible & (overlap.max(axis=1) > 0.5)
+        self.emergency_tracks.update(self.tracker.ids[matched].tolist())
+
+    def detect(self, frame):
+        """Run the detector on a frame and return (N, 4) boxes and their confidences"""
+        if self.model_loaded:
+            result = self.engine.infer(frame)
+            if self.emergency_classes:
+                self.emergency_boxes, _ = extract_vehicle_boxes(result, self.emergency_classes, min_conf=0.5)
+            return extract_vehicle_boxes(result, self.emergency_classes + self.vehicle_classes, min_conf=0.3)
+        
+        # Simulate detections if model not loaded
+        height, width = frame.shape[:2]
+        count = int(self.rng.integers(0, 6))
+        x1 = self.rng.integers(0, max(1, width-100), count)
+        y1 = self.rng.integers(0, max(1, height-100), count)
+        x2 = x1 + self.rng.integers(50, 150, count)
+        y2 = y1 + self.rng.integers(30, 80, count)
+        return np.stack([x1, y1, x2, y2], axis=1).astype(np.int32), None
+    
+    def annotate_frame(self, frame, detections, confidences, avg_speed):
+        """Draw detection boxes and the direction summary onto the frame"""
+        boxes = np.asarray(detections, dtype=np.int32).reshape(-1, 4).tolist()
+        if confidences is not None:
+            labels = [f'Vehicle {conf:.2f}' for conf in np.asarray(confidences).tolist()]
+        else:
+            labels = ['Vehicle' if self.model_loaded else 'Vehicle Sim'] * len(boxes)
+        
+        for (x1, y1, x2, y2), label in zip(boxes, labels):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, label, (x1, y1-10), 
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        self.roi.draw(frame)
+        
+        # Add info text to frame
+        status_text = "SIMULATED" if not self.model_loaded else "YOLO ACTIVE"
+        cv2.putText(frame, f'{self.direction_name}: {len(boxes)} vehicles ({status_text})', 
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.putText(frame, f'Avg speed: {avg_speed:.1f}', 
+                   (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
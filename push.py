@@ -0,0 +1,180 @@
+import json
+import copy
+import asyncio
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Delta key listing the fields removed at that level; null stays an ordinary value
+DELETED_KEY = '$deleted'
+
+
+def diff_state(old, new):
+    """Fields of `new` that differ from `old`, recursing into nested dicts; removed fields go under DELETED_KEY"""
+    delta = {}
+    for key, value in new.items():
+        if key not in old:
+            delta[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = diff_state(old[key], value)
+            if nested:
+                delta[key] = nested
+        elif old[key] != value:
+            delta[key] = value
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta[DELETED_KEY] = removed
+    return delta
+
+
+class Channel:
+    """One named piece of state (traffic, dashboard, ...) with its current encoding"""
+
+    def __init__(self, name):
+        self.name = name
+        self.version = 0
+        self.state = {}
+        self.body = b'{}'
+        self.source_version = 0
+
+
+class EventHub:
+    """Server-Sent Events fan-out of state deltas.
+
+    publish() diffs the new state against the last published one and encodes
+    the delta exactly once; every subscriber receives the same bytes.
+    """
+
+    def __init__(self, backlog=256, heartbeat=15.0):
+        self.channels = {}
+        self.heartbeat = heartbeat
+        self.subscribers = 0
+        self._listeners = []
+        self._log = deque(maxlen=backlog)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def channel(self, name):
+        with self._cond:
+            if name not in self.channels:
+                self.channels[name] = Channel(name)
+            return self.channels[name]
+
+    def publish(self, name, state):
+        """Publish the current state of a channel, returns True if anything changed"""
+        snapshot = copy.deepcopy(state)
+        return self._publish(name, snapshot, json.dumps(snapshot).encode())
+
+    def publish_snapshot(self, name, snapshot):
+        """Publish a StateStore snapshot, reusing its cached encoding as the channel body"""
+        return self._publish(name, dict(snapshot.data), snapshot.json_bytes(), snapshot.version)
+
+    def _publish(self, name, state, body, source_version=None):
+        channel = self.channel(name)
+        with self._cond:
+            if source_version is not None:
+                # Listeners may race; never let an older version overwrite a newer one
+                if source_version <= channel.source_version:
+                    return False
+                channel.source_version = source_version
+            delta = diff_state(channel.state, state) if channel.version else state
+            if channel.version and not delta:
+                return False
+            channel.version += 1
+            channel.state = state
+            channel.body = body
+            self._seq += 1
+            self._log.append((self._seq, self._message(name, channel.version, 'delta', delta)))
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+        return True
+
+    def _message(self, name, version, kind, data):
+        payload = json.dumps({'type': kind, 'version': version, 'data': data})
+        return f"event: {name}\ndata: {payload}\n\n".encode()
+
+    def _snapshot_messages(self):
+        with self._cond:
+            return self._seq, [self._message(name, channel.version, 'snapshot', channel.state)
+                               for name, channel in self.channels.items() if channel.version]
+
+    def _pending(self, last_seq):
+        """Logged messages after last_seq, and whether some already fell out of the backlog"""
+        pending = [(seq, message) for seq, message in self._log if seq > last_seq]
+        missed = bool(self._log) and self._log[0][0] > last_seq + 1
+        return pending, missed
+
+    def stream(self, running=lambda: True):
+        """Generator of SSE messages: full snapshots first, then shared delta messages"""
+        last_seq, messages = self._snapshot_messages()
+        with self._cond:
+            self.subscribers += 1
+        try:
+            for message in messages:
+                yield message
+            while running():
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > last_seq, self.heartbeat)
+                    pending, missed = self._pending(last_seq)
+                if missed:
+                    # Fell behind the backlog, resynchronize with fresh snapshots
+                    last_seq, messages = self._snapshot_messages()
+                    for message in messages:
+                        yield message
+                    continue
+                if not pending:
+                    yield b': keepalive\n\n'
+                    continue
+                for seq, message in pending:
+                    last_seq = seq
+                    yield message
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    async def stream_async(self, running=lambda: True):
+        """Async twin of stream() for the event-loop server; waiting costs no thread"""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+        last_seq, messages = self._snapshot_messages()
+        with self._cond:
+            self.subscribers += 1
+            self._listeners.append(wake)
+        try:
+            for message in messages:
+                yield message
+            while running():
+                with self._cond:
+                    pending, missed = self._pending(last_seq)
+                if missed:
+                    last_seq, messages = self._snapshot_messages()
+                    for message in messages:
+                        yield message
+                    continue
+                if not pending:
+                    changed.clear()
+                    if self._seq > last_seq:
+                        continue
+                    try:
+                        await asyncio.wait_for(changed.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield b': keepalive\n\n'
+                    continue
+                for seq, message in pending:
+                    last_seq = seq
+                    yield message
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+                self._listeners.remove(wake)
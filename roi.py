@@ -0,0 +1,130 @@
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class CameraROI:
+    """Region of interest, lane masks and stop-line zone for one camera.
+
+    Polygons are given as [[x, y], ...] in fractions of the frame width and
+    height so the same config works at any capture resolution. Masks are
+    rasterized once per frame size and then queried with array lookups.
+    """
+
+    def __init__(self, roi=None, stop_line=None, lanes=None):
+        self.roi = self._polygon(roi)
+        self.stop_line = self._polygon(stop_line)
+        self.lanes = {name: self._polygon(points) for name, points in (lanes or {}).items()}
+        self.lane_names = list(self.lanes)
+        self._shape = None
+        self._roi_mask = None
+        self._queue_mask = None
+        self._lane_map = None
+        self._crop_rect = None
+
+    @classmethod
+    def from_config(cls, config):
+        config = config or {}
+        return cls(config.get('roi'), config.get('stop_line'), config.get('lanes'))
+
+    @property
+    def configured(self):
+        return self.roi is not None or self.stop_line is not None or bool(self.lanes)
+
+    @staticmethod
+    def _polygon(points):
+        if not points:
+            return None
+        polygon = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        if len(polygon) < 3:
+            raise ValueError("ROI polygons need at least 3 points")
+        return polygon
+
+    def _pixels(self, polygon, width, height):
+        return np.round(polygon * (width - 1, height - 1)).astype(np.int32)
+
+    def _prepare(self, shape):
+        """Rasterize the masks for a frame size, cached until the size changes"""
+        if self._shape == shape[:2]:
+            return
+        height, width = shape[:2]
+
+        if self.roi is not None:
+            roi_points = self._pixels(self.roi, width, height)
+            mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(mask, [roi_points], 1)
+            self._roi_mask = mask.astype(bool)
+            x, y, w, h = cv2.boundingRect(roi_points)
+            self._crop_rect = (x, y, x + w, y + h)
+        else:
+            self._roi_mask = np.ones((height, width), dtype=bool)
+            self._crop_rect = (0, 0, width, height)
+
+        if self.stop_line is not None:
+            mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(mask, [self._pixels(self.stop_line, width, height)], 1)
+            self._queue_mask = mask.astype(bool)
+        else:
+            self._queue_mask = self._roi_mask
+
+        # Lane label map: 0 = no lane, i + 1 = lane_names[i]
+        self._lane_map = np.zeros((height, width), dtype=np.uint8)
+        for index, name in enumerate(self.lane_names):
+            cv2.fillPoly(self._lane_map, [self._pixels(self.lanes[name], width, height)], index + 1)
+
+        self._shape = shape[:2]
+
+    def crop(self, frame):
+        """View of the ROI bounding rectangle and its (x, y) offset in the frame"""
+        self._prepare(frame.shape)
+        x1, y1, x2, y2 = self._crop_rect
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def _anchor_points(self, boxes):
+        """Bottom-centre of each box, where the vehicle touches the road"""
+        height, width = self._shape
+        xs = np.clip((boxes[:, 0] + boxes[:, 2]) // 2, 0, width - 1)
+        ys = np.clip(boxes[:, 3], 0, height - 1)
+        return xs, ys
+
+    def to_frame(self, boxes, offset):
+        """Shift crop-relative boxes back into frame coordinates and drop those outside the ROI"""
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        if len(boxes) == 0:
+            return boxes, np.zeros(0, dtype=bool)
+        boxes = boxes + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.int32)
+        xs, ys = self._anchor_points(boxes)
+        inside = self._roi_mask[ys, xs]
+        return boxes[inside], inside
+
+    def queued(self, boxes):
+        """Boolean vector of boxes standing in the stop-line zone"""
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        if len(boxes) == 0 or self._shape is None:
+            return np.zeros(len(boxes), dtype=bool)
+        xs, ys = self._anchor_points(boxes)
+        return self._queue_mask[ys, xs]
+
+    def lane_counts(self, boxes):
+        """Vehicle count per configured lane"""
+        if not self.lane_names:
+            return {}
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        if len(boxes) == 0 or self._shape is None:
+            return {name: 0 for name in self.lane_names}
+        xs, ys = self._anchor_points(boxes)
+        counts = np.bincount(self._lane_map[ys, xs], minlength=len(self.lane_names) + 1)
+        return {name: int(counts[index + 1]) for index, name in enumerate(self.lane_names)}
+
+    def draw(self, frame):
+        """Outline the ROI and stop-line zone on an annotated frame"""
+        if self._shape is None:
+            return
+        height, width = self._shape
+        if self.roi is not None:
+            cv2.polylines(frame, [self._pixels(self.roi, width, height)], True, (255, 200, 0), 1)
+        if self.stop_line is not None:
+            cv2.polylines(frame, [self._pixels(self.stop_line, width, height)], True, (0, 0, 255), 2)
@@ -0,0 +1,85 @@
+import time
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INFER = 'infer'
+TRACK = 'track'
+REUSE = 'reuse'
+
+
+class InferenceScheduler:
+    """Decides per frame whether a camera needs a full YOLO pass.
+
+    Each frame is reduced to a small grayscale thumbnail and compared with the
+    thumbnail of the last inferred frame. A static scene reuses the previous
+    detections, small motion carries the tracked boxes forward, and larger
+    motion runs inference. Inference is always run at least `min_inference_fps`
+    times per second so detections can't go stale.
+    """
+
+    def __init__(self, min_inference_fps=1.0, still_threshold=0.002, motion_threshold=0.02,
+                 pixel_threshold=25, thumbnail_size=(160, 120), enabled=True):
+        self.min_inference_fps = min_inference_fps
+        self.still_threshold = still_threshold
+        self.motion_threshold = motion_threshold
+        self.pixel_threshold = pixel_threshold
+        self.thumbnail_size = thumbnail_size
+        self.enabled = enabled
+        self.reference = None
+        self.last_inference = 0.0
+        self.last_motion = 0.0
+        self.counts = {INFER: 0, TRACK: 0, REUSE: 0}
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def motion_ratio(self, thumb):
+        """Fraction of thumbnail pixels that changed since the last inferred frame"""
+        if self.reference is None or self.reference.shape != thumb.shape:
+            return 1.0
+        diff = cv2.absdiff(thumb, self.reference)
+        return float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+
+    def decide(self, frame, now=None):
+        """Return INFER, TRACK or REUSE for this frame"""
+        now = time.time() if now is None else now
+        if not self.enabled:
+            decision = INFER
+            thumb = None
+        else:
+            thumb = self.thumbnail(frame)
+            self.last_motion = self.motion_ratio(thumb)
+            overdue = now - self.last_inference >= 1.0 / self.min_inference_fps if self.min_inference_fps > 0 else False
+
+            if overdue or self.last_motion >= self.motion_threshold:
+                decision = INFER
+            elif self.last_motion >= self.still_threshold:
+                decision = TRACK
+            else:
+                decision = REUSE
+
+        if decision == INFER:
+            self.reference = thumb
+            self.last_inference = now
+        self.counts[decision] += 1
+        return decision
+
+    def stats(self):
+        total = sum(self.counts.values())
+        skipped = self.counts[TRACK] + self.counts[REUSE]
+        return {
+            'frames': total,
+            'inferred': self.counts[INFER],
+            'tracked': self.counts[TRACK],
+            'reused': self.counts[REUSE],
+            'skipped': skipped,
+            'skip_ratio': skipped / total if total else 0.0,
+            'last_motion': self.last_motion
+        }
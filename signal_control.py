@@ -0,0 +1,330 @@
+import time
+import logging
+
+import numpy as np
+
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ('NS', 'SN')
+
+# Traffic signal constants
+MIN_GREEN_TIME = 10
+MAX_GREEN_TIME = 45
+DEFAULT_GREEN_TIME = 20
+VEHICLE_THRESHOLD = 3
+
+DEFAULT_PREDICTIVE = {
+    # Seconds of traffic every candidate plan is scored over, and the simulation step
+    'horizon': 120.0,
+    'step': 1.0,
+    # Vehicles per second a queue discharges at on green
+    'saturation_flow': 1.0,
+    # Seconds of each phase change in which nobody moves (amber, all-red, start-up)
+    'lost_time': 4.0,
+    # Bounds of every green, the greens considered for the following phases,
+    # and the granularity of ending the current one
+    'min_green': 5.0,
+    'max_green': MAX_GREEN_TIME,
+    'green_choices': [5, 10, 15, 20, 25, 30, 35, 40, 45],
+    'hold_step': 2.0,
+    # Vehicle-seconds by which switching now must beat the best plan that holds
+    'switch_margin': 1.0,
+    # Holt smoothing of the arrival rate level and trend
+    'smoothing': 0.3,
+    'trend_smoothing': 0.05,
+    # Converts vehicle_count * avg_speed (px/frame) into a flow in vehicles per second
+    'view_length': 800.0,
+    'frame_rate': 15.0
+}
+
+
+def optimal_timing(data, phase):
+    """Green time for `phase` proportional to its share of queue / speed demand"""
+    ns_demand = data['ns_queue_length'] / max(0.1, data['ns_avg_speed'])
+    sn_demand = data['sn_queue_length'] / max(0.1, data['sn_avg_speed'])
+    total_demand = ns_demand + sn_demand
+
+    if total_demand > 0:
+        ratio = (ns_demand if phase == 'NS' else sn_demand) / total_demand
+        next_green_time = MIN_GREEN_TIME + (ratio * (MAX_GREEN_TIME - MIN_GREEN_TIME))
+        return max(MIN_GREEN_TIME, min(MAX_GREEN_TIME, next_green_time))
+
+    return DEFAULT_GREEN_TIME
+
+
+class SignalController:
+    """Owns a junction's phase; update() runs once per control tick with the latest reading"""
+
+    name = None
+
+    def __init__(self, options=None, now=None):
+        self.options = options or {}
+        self.phase = 'NS'
+        self.phase_started = time.time() if now is None else now
+        self.green_time = DEFAULT_GREEN_TIME
+        self.switches = 0
+        # Set by the corridor coordinator: a fixed-cycle plan to follow, and an
+        # emergency preemption window {'phase', 'from', 'until'}
+        self.plan = None
+        self.preempt = None
+
+    def elapsed(self, now):
+        return now - self.phase_started
+
+    def remaining(self, now):
+        return max(0, self.green_time - self.elapsed(now))
+
+    def switch(self, now):
+        self.phase = 'SN' if self.phase == 'NS' else 'NS'
+        self.phase_started = now
+        self.switches += 1
+
+    def decide(self, data, now):
+        """Phase for this tick: emergency preemption, then a corridor plan, else the controller's own logic"""
+        preempt = self.preempt
+        if preempt is not None and now > preempt['until']:
+            self.preempt = preempt = None
+        if preempt is not None and now >= preempt['from']:
+            return self.hold(preempt['phase'], preempt['until'], now)
+        if self.plan is not None:
+            return self.follow(self.plan, now)
+        return self.update(data, now)
+
+    def update(self, data, now):
+        """Decide on the phase for this tick, returns whether it switched"""
+        raise NotImplementedError
+
+    def hold(self, phase, until, now):
+        """Give `phase` green right away and keep it until `until`"""
+        switched = self.phase != phase
+        if switched:
+            self.switch(now)
+        self.green_time = max(self.elapsed(now), until - self.phase_started)
+        return switched
+
+    def follow(self, plan, now):
+        """Track a coordinated plan's phase; a green is never cut below MIN_GREEN_TIME to catch up"""
+        phase, remaining = plan.phase_at(now)
+        switched = False
+        if phase != self.phase:
+            if self.elapsed(now) < MIN_GREEN_TIME:
+                self.green_time = MIN_GREEN_TIME
+                return False
+            self.switch(now)
+            switched = True
+        self.green_time = self.elapsed(now) + remaining
+        return switched
+
+    def stats(self):
+        stats = {'controller': self.name, 'phase': self.phase, 'green_time': round(self.green_time, 1),
+                 'switches': self.switches}
+        if self.plan is not None:
+            stats['corridor'] = self.plan.to_dict()
+        if self.preempt is not None:
+            stats['preempt'] = dict(self.preempt)
+        return stats
+
+
+class HeuristicController(SignalController):
+    """Switches as soon as one sample shows the red side busy and the green side quiet.
+
+    The green time is proportional to the instantaneous queue / speed demand.
+    """
+
+    name = 'heuristic'
+
+    def update(self, data, now):
+        ns_busy = data['ns_vehicle_count'] >= VEHICLE_THRESHOLD
+        sn_busy = data['sn_vehicle_count'] >= VEHICLE_THRESHOLD
+        if self.phase == 'NS' and sn_busy and not ns_busy:
+            switch = True
+        elif self.phase == 'SN' and ns_busy and not sn_busy:
+            switch = True
+        else:
+            switch = self.elapsed(now) >= self.green_time
+        if switch:
+            self.switch(now)
+            self.green_time = optimal_timing(data, self.phase)
+        return switch
+
+
+class ArrivalForecaster:
+    """Arrival rate per direction, smoothed with level and trend (Holt's method).
+
+    Each reading gives a flow sample from the fundamental relation flow =
+    density * speed over the camera's view, which is where the arrivals are
+    before they reach the stop line, whatever the signal shows.
+    """
+
+    def __init__(self, smoothing=0.3, trend_smoothing=0.05, view_length=800.0, frame_rate=15.0):
+        self.smoothing = smoothing
+        self.trend_smoothing = trend_smoothing
+        self.view_length = view_length
+        self.frame_rate = frame_rate
+        self.level = None
+        self.trend = np.zeros(len(DIRECTIONS))
+        self.last_time = None
+
+    def flow(self, data):
+        """Vehicles per second entering each approach according to one reading"""
+        return np.array([data[f'{d.lower()}_vehicle_count'] * data[f'{d.lower()}_avg_speed']
+                         * self.frame_rate / self.view_length for d in DIRECTIONS])
+
+    def observe(self, data, now):
+        sample = self.flow(data)
+        if self.level is None:
+            self.level = sample
+            self.last_time = now
+            return
+        dt = now - self.last_time
+        if dt <= 0:
+            return
+        self.last_time = now
+        previous = self.level
+        self.level = self.smoothing * sample + (1 - self.smoothing) * (previous + self.trend * dt)
+        self.trend = self.trend_smoothing * (self.level - previous) / dt + (1 - self.trend_smoothing) * self.trend
+
+    def forecast(self, horizon, step, data=None):
+        """(steps, directions) expected arrivals at the stop line per step over the horizon.
+
+        With the current reading, the vehicles already moving in view replace
+        the forecast for the time they need to reach the stop line.
+        """
+        steps = int(horizon / step)
+        if self.level is None:
+            return np.zeros((steps, len(DIRECTIONS)))
+        ahead = np.arange(1, steps + 1)[:, None] * step
+        arrivals = np.maximum(0.0, self.level + self.trend * ahead) * step
+        if data is not None:
+            for column, direction in enumerate(DIRECTIONS):
+                prefix = direction.lower()
+                count = data[f'{prefix}_vehicle_count']
+                moving = count - data[f'{prefix}_queue_length']
+                if moving <= 0:
+                    continue
+                speed = data[f'{prefix}_avg_speed'] * count / moving * self.frame_rate
+                if speed <= 0:
+                    # Nothing says when they'll arrive; keep the forecast
+                    continue
+                window = int(np.clip(self.view_length / speed / step, 1, steps))
+                arrivals[:window, column] = moving / window
+        return arrivals
+
+
+class PredictiveController(SignalController):
+    """Chooses green splits by simulating candidate plans over a multi-cycle horizon.
+
+    A plan is when to end the current green plus the greens of the following
+    phases, repeated until the horizon. Every tick all plans are scored at once
+    with a vectorized point-queue simulation of the forecast arrivals, and the
+    first step of the cheapest is applied: hold, or switch now. Minimum and
+    maximum greens bound the plans and a switch must beat holding by a margin,
+    so one noisy sample can't flip the phase.
+    """
+
+    name = 'predictive'
+
+    def __init__(self, options=None, now=None):
+        super().__init__(options, now)
+        self.config = dict(DEFAULT_PREDICTIVE, **self.options)
+        self.forecaster = ArrivalForecaster(self.config['smoothing'], self.config['trend_smoothing'],
+                                            self.config['view_length'], self.config['frame_rate'])
+        self.plan_timer = STAGE_SECONDS.labels('signal_plan', self.options.get('junction', ''), '')
+        self.last_plan = {}
+
+    def plans(self, elapsed):
+        """Candidate (hold, next green, green after that) triples for the current elapsed green"""
+        step = self.config['hold_step']
+        earliest = max(0.0, self.config['min_green'] - elapsed)
+        latest = max(earliest, self.config['max_green'] - elapsed)
+        holds = np.arange(earliest, latest + 1e-9, step)
+        if holds[-1] < latest:
+            holds = np.append(holds, latest)
+        greens = np.asarray(self.config['green_choices'], dtype=float)
+        hold, other, own = np.meshgrid(holds, greens, greens, indexing='ij')
+        return hold.ravel(), other.ravel(), own.ravel()
+
+    def serving(self, hold, other, own):
+        """(plans, steps, directions) mask of who discharges when; phase 0 is the current green"""
+        cfg = self.config
+        lost = cfg['lost_time']
+        t = (np.arange(int(cfg['horizon'] / cfg['step'])) * cfg['step'])[None, :]
+        hold, other, own = hold[:, None], other[:, None], own[:, None]
+        period = other + own + 2 * lost
+        cycle = np.mod(t - hold, period)
+        current = (t < hold) | ((t >= hold) & (cycle >= other + 2 * lost))
+        opposite = (t >= hold) & (cycle >= lost) & (cycle < lost + other)
+        mask = np.zeros((len(hold), t.shape[1], 2), dtype=bool)
+        index = DIRECTIONS.index(self.phase)
+        mask[:, :, index] = current
+        mask[:, :, 1 - index] = opposite
+        return mask
+
+    def evaluate(self, queues, arrivals, serving):
+        """Total delay (vehicle-seconds) of every plan plus a penalty for what's left at the end.
+
+        The queue recursion q[t] = max(0, q[t-1] + arrivals - capacity) is solved
+        for all plans and steps at once as a reflected cumulative sum.
+        """
+        cfg = self.config
+        capacity = cfg['saturation_flow'] * cfg['step']
+        walk = np.asarray(queues, dtype=float) + np.cumsum(arrivals[None] - serving * capacity, axis=1)
+        queue = walk - np.minimum(0.0, np.minimum.accumulate(walk, axis=1))
+        delay = queue.sum(axis=(1, 2)) * cfg['step']
+        # Time to clear the residual queue at saturation flow, counted for every vehicle in it
+        residual = (queue[:, -1] ** 2).sum(axis=1) / (2 * cfg['saturation_flow'])
+        return delay + residual
+
+    def update(self, data, now):
+        with self.plan_timer.time():
+            self.forecaster.observe(data, now)
+            elapsed = self.elapsed(now)
+            queues = [data[f'{d.lower()}_queue_length'] for d in DIRECTIONS]
+            hold, other, own = self.plans(elapsed)
+            arrivals = self.forecaster.forecast(self.config['horizon'], self.config['step'], data)
+            cost = self.evaluate(queues, arrivals, self.serving(hold, other, own))
+
+            switching = hold == 0
+            best_hold = np.argmin(np.where(switching, np.inf, cost)) if not switching.all() else None
+            best_switch = np.argmin(np.where(switching, cost, np.inf)) if switching.any() else None
+            switch = best_switch is not None and (
+                best_hold is None or cost[best_switch] < cost[best_hold] - self.config['switch_margin'])
+            chosen = best_switch if switch else best_hold
+
+            self.last_plan = {
+                'plans': int(len(cost)),
+                'hold': round(float(hold[chosen]), 1),
+                'next_green': float(other[chosen]),
+                'delay': round(float(cost[chosen]), 1),
+                'arrival_rate': [round(float(rate), 3) for rate in self.forecaster.level]
+            }
+        if switch:
+            self.switch(now)
+            self.green_time = float(other[chosen])
+        else:
+            self.green_time = elapsed + float(hold[chosen])
+        return switch
+
+    def stats(self):
+        return dict(super().stats(), plan=self.last_plan)
+
+
+CONTROLLERS = {
+    'heuristic': HeuristicController,
+    'predictive': PredictiveController
+}
+
+
+def make_controller(spec=None, junction=None, now=None):
+    """Controller from a name or a dict with 'type' plus its options; heuristic by default"""
+    if isinstance(spec, str):
+        spec = {'type': spec}
+    options = dict(spec or {})
+    kind = options.pop('type', 'heuristic')
+    if kind not in CONTROLLERS:
+        raise ValueError(f"unknown signal controller {kind}")
+    if junction is not None:
+        options['junction'] = junction
+    return CONTROLLERS[kind](options, now)
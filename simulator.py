@@ -0,0 +1,353 @@
+import copy
+import threading
+import time
+import zlib
+import logging
+
+import cv2
+import numpy as np
+
+from buffers import FramePool, simulated_background
+from tracker import STOPPED_REPORT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DIRECTIONS = ('NS', 'SN')
+
+DEFAULT_SCENARIO = {
+    'resolution': [800, 300],
+    # Simulated seconds per wall-clock second when the simulator follows the live clock
+    'speed': 1.0,
+    'start_hour': 8.0,
+    'step': 0.1,
+    # Simulated seconds run up front so a run doesn't start on an empty road
+    'warmup': 60.0,
+    # Mean arrivals per minute at profile multiplier 1.0
+    'arrival_rate': {'NS': 12.0, 'SN': 10.0},
+    # (hour, multiplier) points, linearly interpolated over the day
+    'profile': [[0, 1.0], [24, 1.0]],
+    'platoon_probability': 0.0,
+    'platoon_size': [3, 6],
+    # Emergency vehicles per hour and direction
+    'emergency_rate': 0.0,
+    # Breakdowns per hour and direction: a vehicle on the approach stops for breakdown_duration seconds
+    'breakdown_rate': 0.0,
+    'breakdown_duration': [60.0, 180.0],
+    'road_length': 120.0,
+    'stop_line': 0.75,
+    'lanes': 2,
+    'free_speed': [9.0, 14.0],
+    'vehicle_length': [4.0, 6.5],
+    'min_gap': 2.0,
+    'headway': 1.2,
+    'acceleration': 2.5
+}
+
+RUSH_HOUR_PROFILE = [[0, 0.2], [6, 0.4], [8.5, 2.0], [10, 1.0], [16, 1.0], [17.5, 2.2], [19.5, 0.8], [24, 0.2]]
+
+SCENARIOS = {
+    'steady': {},
+    'rush_hour': {'profile': RUSH_HOUR_PROFILE, 'start_hour': 7.0},
+    'platoons': {'platoon_probability': 0.35},
+    'emergency': {'emergency_rate': 12.0},
+    'breakdowns': {'breakdown_rate': 6.0},
+    'gridlock': {'arrival_rate': {'NS': 40.0, 'SN': 36.0}, 'platoon_probability': 0.2}
+}
+
+
+def load_scenario(spec=None):
+    """Full scenario dict from a preset name or a dict with an optional 'scenario' preset plus overrides"""
+    if isinstance(spec, str):
+        spec = {'scenario': spec}
+    spec = dict(spec or {})
+    name = spec.pop('scenario', 'steady')
+    if name not in SCENARIOS:
+        raise ValueError(f"unknown scenario {name}")
+    scenario = copy.deepcopy(DEFAULT_SCENARIO)
+    for overrides in (SCENARIOS[name], spec):
+        for key, value in overrides.items():
+            if isinstance(value, dict) and isinstance(scenario.get(key), dict):
+                scenario[key] = dict(scenario[key], **value)
+            else:
+                scenario[key] = copy.deepcopy(value)
+    scenario['name'] = name
+    return scenario
+
+
+def stream_seed(seed, *keys):
+    """Independent, reproducible seed for one consumer (junction, camera) of a run seed"""
+    if seed is None:
+        return None
+    return [int(seed)] + [zlib.crc32(str(key).encode()) for key in keys]
+
+
+class SimVehicle:
+    __slots__ = ('id', 'lane', 'position', 'speed', 'desired_speed', 'length', 'color',
+                 'emergency', 'arrived', 'waited', 'crossed', 'stopped_at', 'broken_until')
+
+    def __init__(self, vehicle_id, lane, desired_speed, length, color, emergency, arrived):
+        self.id = vehicle_id
+        self.lane = lane
+        self.position = 0.0
+        self.speed = desired_speed
+        self.desired_speed = desired_speed
+        self.length = length
+        self.color = color
+        self.emergency = emergency
+        self.arrived = arrived
+        self.waited = 0.0
+        self.crossed = False
+        self.stopped_at = None
+        self.broken_until = None
+
+
+class TrafficSimulator:
+    """Seeded, vehicle-level simulation of one junction's NS and SN approaches.
+
+    Vehicles arrive as a Poisson process shaped by the scenario's daily
+    profile, optionally in platoons, follow their leader and stop at the stop
+    line while their direction is red. Emergency vehicles run the red light.
+    All randomness comes from one generator and is drawn only while stepping,
+    so the same seed and the same signal sequence always give the same run,
+    however often frames are rendered. step() runs as fast as the CPU allows;
+    sync() follows the wall clock at the scenario's speed for live serving.
+    """
+
+    def __init__(self, scenario=None, seed=None, stream=None):
+        self.scenario = load_scenario(scenario)
+        self.seed = seed
+        self.rng = np.random.default_rng(stream_seed(seed, stream) if stream is not None else seed)
+        self.width, self.height = self.scenario['resolution']
+        self.clock = 0.0
+        self.green = 'NS'
+        self.vehicles = {direction: [[] for _ in range(self.scenario['lanes'])] for direction in DIRECTIONS}
+        self.pending = {direction: [] for direction in DIRECTIONS}
+        self.stats = {direction: {'arrived': 0, 'crossed': 0, 'emergencies': 0, 'total_wait': 0.0}
+                      for direction in DIRECTIONS}
+        self.pools = {direction: FramePool((self.height, self.width, 3), count=16) for direction in DIRECTIONS}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._wall_start = None
+        self._clock_start = 0.0
+        if self.scenario['warmup']:
+            self.run(self.scenario['warmup'])
+
+    @property
+    def hour(self):
+        return (self.scenario['start_hour'] + self.clock / 3600.0) % 24
+
+    def set_signal(self, green):
+        self.green = green
+
+    def arrival_rate(self, direction):
+        """Current mean arrivals per second for a direction"""
+        profile = np.asarray(self.scenario['profile'], dtype=float)
+        multiplier = np.interp(self.hour, profile[:, 0], profile[:, 1])
+        return self.scenario['arrival_rate'].get(direction, 0.0) / 60.0 * multiplier
+
+    def step(self, dt=None):
+        dt = dt or self.scenario['step']
+        with self._lock:
+            self._step(dt)
+
+    def run(self, seconds):
+        """Advance the simulation by `seconds` of simulated time, faster than real time"""
+        step = self.scenario['step']
+        with self._lock:
+            for _ in range(int(round(seconds / step))):
+                self._step(step)
+
+    def sync(self, max_catchup=60.0):
+        """Advance to the wall clock scaled by the scenario speed"""
+        now = time.time()
+        with self._lock:
+            if self._wall_start is None:
+                self._wall_start, self._clock_start = now, self.clock
+            target = self._clock_start + (now - self._wall_start) * self.scenario['speed']
+            if target - self.clock > max_catchup:
+                # Don't replay a long pause step by step, jump over it
+                self.clock = target - max_catchup
+            step = self.scenario['step']
+            while self.clock + step <= target:
+                self._step(step)
+
+    def demand(self, seconds, step=1.0):
+        """(steps, directions) arrival counts over the next `seconds` from the scenario's arrival process.
+
+        Only draws arrivals and advances the clock; nothing enters the road, so
+        the result is a demand trace to replay elsewhere.
+        """
+        counts = np.zeros((int(round(seconds / step)), len(DIRECTIONS)))
+        with self._lock:
+            for index in range(len(counts)):
+                for column, direction in enumerate(DIRECTIONS):
+                    pending, self.pending[direction] = self.pending[direction], []
+                    self._arrivals(direction, step)
+                    counts[index, column] = len(self.pending[direction])
+                    self.pending[direction] = pending
+                self.clock += step
+        return counts
+
+    def _step(self, dt):
+        for direction in DIRECTIONS:
+            self._arrivals(direction, dt)
+            self._enter(direction)
+            red = self.green != direction
+            for lane in self.vehicles[direction]:
+                self._move_lane(direction, lane, red, dt)
+        self.clock += dt
+
+    def _arrivals(self, direction, dt):
+        scenario = self.scenario
+        arrivals = self.rng.poisson(self.arrival_rate(direction) * dt)
+        for _ in range(arrivals):
+            size = 1
+            if self.rng.random() < scenario['platoon_probability']:
+                low, high = scenario['platoon_size']
+                size = int(self.rng.integers(low, high + 1))
+            for _ in range(size):
+                self.pending[direction].append(self._new_vehicle(emergency=False))
+
+        if scenario['emergency_rate'] > 0 and self.rng.random() < scenario['emergency_rate'] / 3600.0 * dt:
+            # Emergency vehicles jump the entry queue
+            self.pending[direction].insert(0, self._new_vehicle(emergency=True))
+            self.stats[direction]['emergencies'] += 1
+
+        if scenario['breakdown_rate'] > 0 and self.rng.random() < scenario['breakdown_rate'] / 3600.0 * dt:
+            on_road = [v for lane in self.vehicles[direction] for v in lane if not v.crossed]
+            if on_road:
+                vehicle = on_road[int(self.rng.integers(0, len(on_road)))]
+                vehicle.broken_until = self.clock + float(self.rng.uniform(*scenario['breakdown_duration']))
+
+    def _new_vehicle(self, emergency):
+        scenario = self.scenario
+        speed = float(self.rng.uniform(*scenario['free_speed']))
+        length = float(self.rng.uniform(*scenario['vehicle_length']))
+        color = tuple(int(c) for c in self.rng.integers(90, 256, 3))
+        lane = int(self.rng.integers(0, scenario['lanes']))
+        self._next_id += 1
+        if emergency:
+            speed *= 1.3
+            color = (0, 0, 255)
+        return SimVehicle(self._next_id, lane, speed, length, color, emergency, self.clock)
+
+    def _enter(self, direction):
+        """Move pending arrivals onto the road while their lane's entry has room"""
+        pending = self.pending[direction]
+        while pending:
+            vehicle = pending[0]
+            lane = self.vehicles[direction][vehicle.lane]
+            if lane and lane[-1].position - lane[-1].length < self.scenario['min_gap']:
+                break
+            pending.pop(0)
+            lane.append(vehicle)
+            self.stats[direction]['arrived'] += 1
+
+    def _move_lane(self, direction, lane, red, dt):
+        scenario = self.scenario
+        stop_at = scenario['road_length'] * scenario['stop_line']
+        stats = self.stats[direction]
+        leader = None
+        for vehicle in lane:
+            gap = float('inf')
+            if leader is not None:
+                gap = leader.position - leader.length - scenario['min_gap'] - vehicle.position
+            if red and not vehicle.crossed and not vehicle.emergency:
+                gap = min(gap, stop_at - vehicle.position)
+            if vehicle.broken_until is not None:
+                if vehicle.broken_until > self.clock:
+                    gap = 0.0
+                else:
+                    vehicle.broken_until = None
+            target = min(vehicle.desired_speed, max(0.0, gap) / scenario['headway'])
+            vehicle.speed = min(target, vehicle.speed + scenario['acceleration'] * dt)
+            vehicle.position += min(vehicle.speed * dt, max(0.0, gap))
+            if vehicle.speed < 0.5:
+                if vehicle.stopped_at is None:
+                    vehicle.stopped_at = self.clock
+                if not vehicle.crossed:
+                    vehicle.waited += dt
+            else:
+                vehicle.stopped_at = None
+            if not vehicle.crossed and vehicle.position >= stop_at:
+                vehicle.crossed = True
+                stats['crossed'] += 1
+                stats['total_wait'] += vehicle.waited
+            leader = vehicle
+        while lane and lane[0].position - lane[0].length > scenario['road_length']:
+            lane.pop(0)
+
+    def ground_truth(self, direction):
+        """(N, 4) int32 boxes of the vehicles visible on an approach, plus the vehicles themselves"""
+        scale = self.width / self.scenario['road_length']
+        top, bottom = self.height // 3, 2 * self.height // 3
+        lane_height = (bottom - top) / self.scenario['lanes']
+        boxes, visible = [], []
+        for index, lane in enumerate(self.vehicles[direction]):
+            y1 = int(top + index * lane_height + lane_height * 0.15)
+            y2 = int(top + (index + 1) * lane_height - lane_height * 0.15)
+            for vehicle in lane:
+                x2 = min(self.width - 1, int(vehicle.position * scale))
+                x1 = max(0, int((vehicle.position - vehicle.length) * scale))
+                if x2 > x1:
+                    boxes.append((x1, y1, x2, y2))
+                    visible.append(vehicle)
+        return np.array(boxes, dtype=np.int32).reshape(-1, 4), visible
+
+    def observe(self, direction, render=True):
+        """Ground-truth reading of an approach in DirectionalCameraProcessor's format, and its frame.
+
+        avg_speed is in pixels per frame at 15 fps, the tracker's unit. The
+        frame comes from a pool and is only drawn when render is set; otherwise
+        it is just the empty road, so a recycled buffer never shows stale or
+        uninitialized pixels.
+        """
+        with self._lock:
+            boxes, visible = self.ground_truth(direction)
+            stop_at = self.scenario['road_length'] * self.scenario['stop_line']
+            queued = sum(1 for v in visible if v.speed < 1.0 and v.position <= stop_at)
+            speeds = [v.speed for v in visible]
+            scale = self.width / self.scenario['road_length']
+            data = {
+                'queue_length': queued,
+                'avg_speed': max(0.1, float(np.mean(speeds)) * scale / 15.0 if speeds else 1.0),
+                'vehicle_count': len(visible),
+                'lane_counts': {f'lane{index}': len(lane) for index, lane in enumerate(self.vehicles[direction])},
+                'detections': boxes,
+                'stopped': [{'id': v.id, 'seconds': round(self.clock - v.stopped_at, 1)} for v in visible
+                            if v.stopped_at is not None and self.clock - v.stopped_at >= STOPPED_REPORT_SECONDS],
+                'emergency': any(v.emergency for v in visible)
+            }
+            frame = self.pools[direction].next()
+            if render:
+                self.render(frame, direction, boxes, visible)
+            else:
+                np.copyto(frame, simulated_background(self.width, self.height))
+        return data, frame
+
+    def render(self, frame, direction, boxes, visible):
+        np.copyto(frame, simulated_background(self.width, self.height))
+        stop_x = int(self.width * self.scenario['stop_line'])
+        light = (0, 255, 0) if self.green == direction else (0, 0, 255)
+        cv2.line(frame, (stop_x, self.height // 3), (stop_x, 2 * self.height // 3), light, 3)
+        for (x1, y1, x2, y2), vehicle in zip(boxes.tolist(), visible):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), vehicle.color, -1)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 0), 2)
+            if vehicle.emergency:
+                cv2.rectangle(frame, (x1, y1), (x2, y1 + 4), (255, 0, 0), -1)
+
+        cv2.putText(frame, f"Vehicles detected: {len(visible)}", (self.width//4, 70),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        cv2.putText(frame, f"{direction} {self.scenario['name']} {self.hour:05.2f}h", (10, self.height - 45),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    def summary(self):
+        """Throughput and mean wait per direction since the start of the run"""
+        result = {'clock': self.clock, 'hour': self.hour}
+        for direction, stats in self.stats.items():
+            waiting = sum(len(lane) for lane in self.vehicles[direction]) + len(self.pending[direction])
+            result[direction] = dict(
+                stats,
+                in_system=waiting,
+                mean_wait=stats['total_wait'] / stats['crossed'] if stats['crossed'] else 0.0)
+        return result
@@ -0,0 +1,105 @@
+import copy
+import json
+import threading
+import logging
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Immutable, versioned view of the state at one point in time.
+
+    The JSON encoding is produced at most once per snapshot and then shared by
+    every request that serves it.
+    """
+    __slots__ = ('version', '_data', '_json', '_lock')
+
+    def __init__(self, version, data):
+        self.version = version
+        self._data = data
+        self._json = None
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        return MappingProxyType(self._data)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def to_dict(self):
+        """Deep copy that the caller may modify freely"""
+        return copy.deepcopy(self._data)
+
+    def json_bytes(self):
+        if self._json is None:
+            with self._lock:
+                if self._json is None:
+                    self._json = json.dumps(self._data).encode()
+        return self._json
+
+
+class StateStore:
+    """Copy-on-write state store.
+
+    Readers grab the current Snapshot with a plain attribute read and never
+    hold a lock. Writers are serialized; each write builds a new dict and
+    swaps it in atomically, so a reader always sees one whole version.
+    """
+
+    def __init__(self, initial):
+        self._snapshot = Snapshot(1, copy.deepcopy(initial))
+        self._write_lock = threading.Lock()
+        self._listeners = []
+
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def get(self, key, default=None):
+        return self._snapshot.get(key, default)
+
+    def subscribe(self, listener):
+        """Call listener(snapshot) after every new version"""
+        self._listeners.append(listener)
+
+    def update(self, fields):
+        """Replace top-level fields. Values must not be mutated after they are handed over."""
+        with self._write_lock:
+            current = self._snapshot
+            if all(key in current._data and current._data[key] == value for key, value in fields.items()):
+                return current
+            data = dict(current._data)
+            data.update(fields)
+            snapshot = self._swap(current, data)
+        self._notify(snapshot)
+        return snapshot
+
+    def modify(self, mutator):
+        """Apply mutator(draft) to a deep copy of the state, for nested edits"""
+        with self._write_lock:
+            current = self._snapshot
+            draft = copy.deepcopy(current._data)
+            mutator(draft)
+            snapshot = self._swap(current, draft)
+        self._notify(snapshot)
+        return snapshot
+
+    def _swap(self, current, data):
+        snapshot = Snapshot(current.version + 1, data)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _notify(self, snapshot):
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"State listener failed: {e}")
@@ -0,0 +1,123 @@
+"""Local MJPEG-over-HTTP camera stand-in for testing stream sources without an IP camera.
+
+Serves a video file, an image directory or the traffic simulator at
+http://<host>:<port>/stream.mjpg, paced to --fps and looping recordings.
+Point a junction camera's "source" at that URL.
+
+Usage: python stream_server.py [--source clip.mp4 | --source frames_dir/] [--port 8554] [--fps 15]
+"""
+import argparse
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from capture import open_capture
+from simulator import TrafficSimulator
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSource:
+    """Newest JPEG of a looping recording or of the simulator, shared by all clients"""
+
+    def __init__(self, source=None, fps=15, quality=80, seed=0):
+        self.source = source
+        self.fps = fps
+        self.quality = quality
+        self.simulator = TrafficSimulator('rush_hour', seed=seed) if source is None else None
+        self.jpeg = None
+        self.seq = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='stream-source', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def frames(self):
+        if self.simulator is not None:
+            while True:
+                self.simulator.run(1.0 / self.fps)
+                yield self.simulator.observe('NS')[1]
+        while True:
+            capture = open_capture(self.source)
+            if capture is None:
+                raise SystemExit(f"cannot open {self.source}")
+            while True:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                yield frame
+            capture.release()
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        for frame in self.frames():
+            started = time.time()
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ret:
+                with self._cond:
+                    self.jpeg = buffer.tobytes()
+                    self.seq += 1
+                    self._cond.notify_all()
+            time.sleep(max(0.0, interval - (time.time() - started)))
+
+    def wait_for(self, after_seq, timeout=2.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > after_seq, timeout)
+            return self.seq, self.jpeg
+
+
+def make_handler(source):
+    class StreamHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/stream.mjpg':
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            seq = 0
+            try:
+                while True:
+                    seq, jpeg = source.wait_for(seq)
+                    if jpeg is None:
+                        continue
+                    self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n'
+                                     b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            logger.info(format % args)
+
+    return StreamHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', help='video file or image directory; the simulator when omitted')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8554)
+    parser.add_argument('--fps', type=float, default=15)
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    source = FrameSource(args.source, args.fps, args.quality, args.seed).start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(source))
+    server.daemon_threads = True
+    logger.info(f"Serving {args.source or 'simulator'} at http://{args.host}:{args.port}/stream.mjpg")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
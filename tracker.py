@@ -0,0 +1,234 @@
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Cost given to pairs that must never be matched
+INVALID_COST = 1e6
+
+# Tracks stopped at least this long are listed in a reading's 'stopped' field
+STOPPED_REPORT_SECONDS = 5.0
+
+
+class TrackRecord:
+    """Lightweight view of one track, refreshed from the tracker arrays on every update"""
+    __slots__ = ('track_id', 'centroid', 'box', 'speed', 'disappeared', 'age')
+
+    def __init__(self, track_id):
+        self.track_id = track_id
+        self.centroid = (0, 0)
+        self.box = (0, 0, 0, 0)
+        self.speed = 0.0
+        self.disappeared = 0
+        self.age = 0
+
+    def __getitem__(self, key):
+        # Keeps the old dict-style access (track['speed']) working
+        return getattr(self, key)
+
+
+def box_centroids(boxes):
+    """(N, 4) x1, y1, x2, y2 boxes -> (N, 2) float centroids"""
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) * 0.5, (boxes[:, 1] + boxes[:, 3]) * 0.5], axis=1)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (M, 4) and (N, 4) boxes"""
+    w = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    h = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    np.clip(w, 0, None, out=w)
+    np.clip(h, 0, None, out=h)
+    inter = w
+    inter *= h
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    np.maximum(union, 1e-9, out=union)
+    inter /= union
+    return inter
+
+
+def greedy_assignment(cost):
+    """Match lowest-cost pairs first, each row and column used at most once"""
+    rows, cols = np.nonzero(cost < INVALID_COST)
+    order = np.argsort(cost[rows, cols], kind='stable')
+    used_rows = np.zeros(cost.shape[0], dtype=bool)
+    used_cols = np.zeros(cost.shape[1], dtype=bool)
+    matched_rows, matched_cols = [], []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if used_rows[r] or used_cols[c]:
+            continue
+        used_rows[r] = True
+        used_cols[c] = True
+        matched_rows.append(r)
+        matched_cols.append(c)
+    return np.array(matched_rows, dtype=np.intp), np.array(matched_cols, dtype=np.intp)
+
+
+_linear_sum_assignment = None
+
+
+def optimal_solver():
+    """scipy's Hungarian solver, or None without scipy; imported on first use since scipy is slow to import"""
+    global _linear_sum_assignment
+    if _linear_sum_assignment is None:
+        try:
+            from scipy.optimize import linear_sum_assignment
+        except ImportError:
+            linear_sum_assignment = False
+        _linear_sum_assignment = linear_sum_assignment
+    return _linear_sum_assignment or None
+
+
+def solve_assignment(cost, optimal_limit=300):
+    """Optimal (Hungarian) assignment for small problems, greedy above the size limit"""
+    if cost.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    linear_sum_assignment = optimal_solver() if max(cost.shape) <= optimal_limit else None
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(cost)
+        valid = cost[rows, cols] < INVALID_COST
+        return rows[valid], cols[valid]
+    return greedy_assignment(cost)
+
+
+class VehicleTracker:
+    """Centroid/IoU tracker with array-backed track state.
+
+    Track geometry, speeds and ages live in parallel NumPy arrays so that the
+    cost matrix, the assignment bookkeeping and every speed are computed in a
+    handful of vector operations per frame.
+    """
+
+    def __init__(self, max_disappeared=5, max_distance=80.0, iou_weight=0.5,
+                 optimal_limit=300, fps=30, pixels_per_unit=100.0, still_distance=2.0):
+        self.max_disappeared = max_disappeared
+        self.max_distance = max_distance
+        self.iou_weight = iou_weight
+        self.optimal_limit = optimal_limit
+        self.fps = fps
+        self.pixels_per_unit = pixels_per_unit
+        # A matched track moving less than this many pixels per update counts as stationary
+        self.still_distance = still_distance
+        self.next_id = 0
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.centroids = np.empty((0, 2), dtype=np.float32)
+        self.velocities = np.empty((0, 2), dtype=np.float32)
+        self.speeds = np.empty(0, dtype=np.float32)
+        self.disappeared = np.empty(0, dtype=np.int32)
+        self.ages = np.empty(0, dtype=np.int32)
+        # Wall-clock time each track stopped moving, NaN while it moves
+        self.still_since = np.empty(0, dtype=np.float64)
+        self.records = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def tracks(self):
+        return {record.track_id: record for record in self.records}
+
+    def cost_matrix(self, boxes, centroids):
+        """Blend of normalized centroid distance and 1 - IoU, gated by max_distance"""
+        dx = self.centroids[:, None, 0] - centroids[None, :, 0]
+        dy = self.centroids[:, None, 1] - centroids[None, :, 1]
+        distance = np.hypot(dx, dy)
+        iou = iou_matrix(self.boxes, boxes)
+        gated = (distance > self.max_distance) & (iou <= 0)
+        cost = distance
+        cost *= (1 - self.iou_weight) / self.max_distance
+        cost += self.iou_weight * (1 - iou)
+        cost[gated] = INVALID_COST
+        return cost
+
+    def update(self, detections, now=None):
+        now = time.time() if now is None else now
+        boxes = np.asarray(detections, dtype=np.float32).reshape(-1, 4)
+        centroids = box_centroids(boxes)
+
+        track_idx, det_idx = solve_assignment(self.cost_matrix(boxes, centroids), self.optimal_limit)
+
+        # Matched tracks: all speeds in one vector operation
+        self.velocities[track_idx] = centroids[det_idx] - self.centroids[track_idx]
+        displacement = np.sqrt((self.velocities[track_idx] ** 2).sum(axis=1))
+        self.speeds[track_idx] = displacement * self.fps / self.pixels_per_unit
+        self.boxes[track_idx] = boxes[det_idx]
+        self.centroids[track_idx] = centroids[det_idx]
+        self.ages[track_idx] += 1
+        still = displacement <= self.still_distance
+        since = self.still_since[track_idx]
+        self.still_since[track_idx] = np.where(still, np.where(np.isnan(since), now, since), np.nan)
+
+        unmatched = np.ones(len(self.ids), dtype=bool)
+        unmatched[track_idx] = False
+        self.disappeared[track_idx] = 0
+        self.disappeared[unmatched] += 1
+        self.speeds[unmatched] = 0.0
+
+        keep = self.disappeared <= self.max_disappeared
+        if not keep.all():
+            self._compact(keep)
+
+        new = np.ones(len(boxes), dtype=bool)
+        new[det_idx] = False
+        if new.any():
+            self._add(boxes[new], centroids[new])
+
+        self._refresh_records()
+        return [record for record in self.records if record.disappeared == 0]
+
+    def predict_boxes(self):
+        """Visible track boxes moved forward by their last per-frame velocity"""
+        visible = self.disappeared == 0
+        shift = np.tile(self.velocities[visible], 2)
+        return (self.boxes[visible] + shift).astype(np.int32)
+
+    def stationary(self, now=None, min_seconds=0.0):
+        """(track ids, seconds stationary, boxes) of visible tracks stopped for at least min_seconds"""
+        now = time.time() if now is None else now
+        seconds = now - self.still_since
+        keep = (self.disappeared == 0) & (seconds >= min_seconds)
+        return self.ids[keep], seconds[keep], self.boxes[keep]
+
+    def average_speed(self, default=1.0):
+        moving = self.speeds[(self.disappeared == 0) & (self.speeds > 0)]
+        return float(moving.mean()) if len(moving) else default
+
+    def _compact(self, keep):
+        self.ids = self.ids[keep]
+        self.boxes = self.boxes[keep]
+        self.centroids = self.centroids[keep]
+        self.velocities = self.velocities[keep]
+        self.speeds = self.speeds[keep]
+        self.disappeared = self.disappeared[keep]
+        self.ages = self.ages[keep]
+        self.still_since = self.still_since[keep]
+        self.records = [record for record, k in zip(self.records, keep.tolist()) if k]
+
+    def _add(self, boxes, centroids):
+        count = len(boxes)
+        new_ids = np.arange(self.next_id, self.next_id + count, dtype=np.int64)
+        self.next_id += count
+        self.ids = np.concatenate([self.ids, new_ids])
+        self.boxes = np.concatenate([self.boxes, boxes])
+        self.centroids = np.concatenate([self.centroids, centroids])
+        self.velocities = np.concatenate([self.velocities, np.zeros((count, 2), dtype=np.float32)])
+        self.speeds = np.concatenate([self.speeds, np.zeros(count, dtype=np.float32)])
+        self.disappeared = np.concatenate([self.disappeared, np.zeros(count, dtype=np.int32)])
+        self.ages = np.concatenate([self.ages, np.ones(count, dtype=np.int32)])
+        self.still_since = np.concatenate([self.still_since, np.full(count, np.nan)])
+        self.records.extend(TrackRecord(track_id) for track_id in new_ids.tolist())
+
+    def _refresh_records(self):
+        rows = zip(self.records, self.centroids.tolist(), self.boxes.tolist(),
+                   self.speeds.tolist(), self.disappeared.tolist(), self.ages.tolist())
+        for record, centroid, box, speed, disappeared, age in rows:
+            record.centroid = (int(centroid[0]), int(centroid[1]))
+            record.box = box
+            record.speed = speed
+            record.disappeared = disappeared
+            record.age = age
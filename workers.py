@@ -0,0 +1,216 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+import logging
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from frame_pipeline import FrameRingBuffer
+from buffers import FramePool
+from capture import open_capture
+
+logger = logging.getLogger(__name__)
+
+FRAME_SHAPE = (480, 640, 3)
+
+
+def default_start_method():
+    # Workers start once the server already runs threads (Flask, the junction and
+    # decoder pools, the model loader), and a forked child can inherit one of their
+    # locks held. forkserver and spawn start clean, at the price of re-importing the
+    # main module in each worker, which is why app.py only starts services from
+    # create_app() and its __main__ block.
+    return 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+
+
+def camera_worker(name, source, camera_cfg, shm_name, shape, slots, records, annotate, stop_event, fps,
+                  inference=None):
+    """Capture + process_frame loop running in its own process.
+
+    Processed frames are written into a slot of the shared-memory ring, and only
+    the slot number and a small detection record go back over the queue.
+    inference is the parent's backend spec, which a spawned worker doesn't inherit.
+    """
+    from inference import configure_inference_engine, reset_inference_engine
+    from processor import DirectionalCameraProcessor
+    from roi import CameraROI
+
+    reset_inference_engine()
+    if inference is not None:
+        configure_inference_engine(inference)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=shm.buf)
+    processor = DirectionalCameraProcessor(0, name, roi=CameraROI.from_config(camera_cfg),
+                                           emergency_classes=camera_cfg.get('emergency_classes'))
+    capture = None
+    seq = 0
+    backoff = 1.0
+
+    try:
+        while not stop_event.is_set():
+            started = time.time()
+            if capture is None or not capture.isOpened():
+                capture = open_capture(source, shape[1], shape[0], fps)
+                if capture is None:
+                    records.put({'status': 'failed'})
+                    stop_event.wait(backoff)
+                    backoff = min(30.0, backoff * 2)
+                    continue
+                backoff = 1.0
+                records.put({'status': 'active'})
+
+            ret, frame = capture.read()
+            if not ret or frame is None:
+                capture.release()
+                capture = None
+                continue
+
+            if frame.shape != tuple(shape):
+                frame = cv2.resize(frame, (shape[1], shape[0]))
+            data, frame = processor.process_frame(frame, annotate=bool(annotate.value))
+
+            slot = seq % slots
+            ring[slot] = frame
+            record = {
+                'seq': seq,
+                'slot': slot,
+                'timestamp': time.time(),
+                'data': {
+                    'queue_length': data['queue_length'],
+                    'avg_speed': data['avg_speed'],
+                    'vehicle_count': data['vehicle_count'],
+                    'lane_counts': data.get('lane_counts', {}),
+                    'detections': np.asarray(data.get('detections', []), dtype=np.int32).reshape(-1, 4).tolist(),
+                    'stopped': data.get('stopped', []),
+                    'emergency': data.get('emergency', False)
+                },
+                'inference': processor.scheduler.stats()
+            }
+            try:
+                records.put_nowait(record)
+                seq += 1
+            except queue.Full:
+                # The main process is behind; drop this frame rather than queue it
+                pass
+
+            stop_event.wait(max(0.0, 1.0 / fps - (time.time() - started)))
+    finally:
+        if capture is not None:
+            capture.release()
+        del ring
+        shm.close()
+
+
+class ProcessFrameProducer:
+    """FrameProducer equivalent whose capture and inference run in a worker process.
+
+    Exposes the same start/stop/latest/buffer interface as FrameProducer. The
+    record queue is kept shorter than the shared-memory ring, so a slot is still
+    intact when its record is read; it is copied into a pooled frame right
+    then, since slow consumers (encoders, the compositor, latest() readers) may
+    hold a frame for longer than the worker takes to come round to the slot.
+    """
+
+    def __init__(self, name, source, camera_cfg=None, fps=15, slots=8, shape=FRAME_SHAPE,
+                 demand=None, start_method=None, inference=None):
+        self.name = name
+        self.source = source
+        self.camera_cfg = camera_cfg or {}
+        self.fps = fps
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.demand = demand
+        self.inference = inference
+        self.status = 'starting'
+        self.measured_fps = 0
+        # The worker's latest InferenceScheduler stats
+        self.inference_stats = None
+        self.buffer = FrameRingBuffer()
+
+        # Shared memory and the process are only created on start(), so building
+        # a producer (e.g. while a worker re-imports the main module) has no side effects
+        self._ctx = mp.get_context(start_method or default_start_method())
+        self._shm = None
+        self._ring = None
+        self._process = None
+        self._frames = FramePool(self.shape, count=16)
+        self._thread = None
+
+    def is_demanded(self):
+        return self.buffer.readers > 0 or bool(self.demand and self.demand())
+
+    def start(self):
+        if self._process is not None and self._process.is_alive():
+            return
+        ctx = self._ctx
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * self.slots)
+            self._ring = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._records = ctx.Queue(maxsize=max(1, self.slots - 2))
+        self._annotate = ctx.Value('b', 0)
+        self._stop = ctx.Event()
+        self._process = ctx.Process(
+            target=camera_worker, name=f"camera-{self.name}", daemon=True,
+            args=(self.name, self.source, self.camera_cfg, self._shm.name, self.shape, self.slots,
+                  self._records, self._annotate, self._stop, self.fps, self.inference))
+        self._process.start()
+        self._thread = threading.Thread(target=self._read_records, name=f"records-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"Camera worker process {self.name} started (pid {self._process.pid})")
+
+    def stop(self):
+        if self._process is None:
+            return
+        self._stop.set()
+        if self._process.is_alive():
+            self._process.join(timeout=2)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._process = None
+        self._ring = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def latest(self):
+        return self.buffer.latest()
+
+    def _read_records(self):
+        frame_count = 0
+        last_time = time.time()
+
+        while not self._stop.is_set():
+            self._annotate.value = 1 if self.is_demanded() else 0
+            try:
+                record = self._records.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if 'status' in record:
+                self.status = record['status']
+                continue
+
+            self.inference_stats = record['inference']
+            data = record['data']
+            data['detections'] = np.asarray(data['detections'], dtype=np.int32).reshape(-1, 4)
+            frame = self._frames.next()
+            np.copyto(frame, self._ring[record['slot']])
+            self.buffer.publish({
+                'timestamp': record['timestamp'],
+                'data': data,
+                'detections': data['detections'],
+                'frame': frame,
+                'jpeg': None
+            })
+
+            frame_count += 1
+            current_time = time.time()
+            if current_time - last_time >= 1.0:
+                self.measured_fps = frame_count
+                frame_count = 0
+                last_time = current_time